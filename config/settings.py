@@ -89,6 +89,8 @@ if OP_ON_GAE == 0:
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'rest_api.compression.CompressionMiddleware', # gzip/brotli compression of the responses
+    'rest_api.profiling.ProfilingMiddleware', # see OP_PROFILING_RATE
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware', # <= Added for test
     'django.middleware.common.CommonMiddleware',
@@ -159,6 +161,29 @@ else:
     }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+# Local memory cache by default (per process), or file-based cache shared between the
+# processes (and invalidated by the imports) when OP_CACHE_DIR is set.
+if os.getenv('OP_CACHE_DIR', None):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ['OP_CACHE_DIR'],
+            'OPTIONS': { 'MAX_ENTRIES': 5000 }
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'omicspred',
+            'OPTIONS': { 'MAX_ENTRIES': 1000 }
+        }
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -218,6 +243,16 @@ COMPRESS_PRECOMPILERS = (
 )
 
 
+#-------------------#
+#  Import Settings  #
+#-------------------#
+
+# On-disk cache of the DOI => PMID => GCST ID lookups (see imports/parsers/resolver.py)
+OP_RESOLVER_CACHE = os.getenv('OP_RESOLVER_CACHE', os.path.join(BASE_DIR, 'import_cache/resolver.json'))
+# Only use the cached lookups (no network access)
+OP_RESOLVER_OFFLINE = os.getenv('OP_RESOLVER_OFFLINE', 'False') == 'True'
+
+
 #---------------------#
 #  REST API Settings  #
 #---------------------#
@@ -229,6 +264,29 @@ REST_BLACKLIST_IPS = [
     #'127.0.0.1'
 ]
 
+# Directory of the precomputed REST table payloads (see "build_table_snapshots" command)
+OP_SNAPSHOT_DIR = os.getenv('OP_SNAPSHOT_DIR', os.path.join(BASE_DIR, 'snapshots/'))
+
+# REST responses cache (see rest_api/cache.py)
+OP_CACHE_ALIAS = 'default'
+# Timeout in seconds (Seconds * Minutes * Hours), by route name. A timeout of 0 disables the cache.
+OP_CACHE_TTL = {
+    'default': 60 * 60,
+    # Data only updated by the imports/releases
+    'getAllCohorts': 60 * 60 * 24,
+    'getAllPlatforms': 60 * 60 * 24,
+    'searchMetaboliteTables': 60 * 60 * 24,
+    'searchProteinTables': 60 * 60 * 24,
+    'searchEnsemblTables': 60 * 60 * 24,
+    'searchPlots': 60 * 60 * 24
+}
+# Delay (in seconds) before a process sees the data changed by another process (e.g. import), see get_data_stamp in rest_api/cache.py
+OP_DATA_VERSION_TTL = int(os.getenv('OP_DATA_VERSION_TTL', '60'))
+
+# Profiling of the REST requests (see rest_api/profiling.py): fraction of the requests profiled (0 to disable, 1 for all)
+OP_PROFILING_RATE = float(os.getenv('OP_PROFILING_RATE', '0'))
+OP_PROFILING_PATH = '/rest/'
+
 REST_FRAMEWORK = {
     # Use Django's standard `django.contrib.auth` permissions,
     # or allow read-only access for unauthenticated users.
@@ -239,8 +297,7 @@ REST_FRAMEWORK = {
     ],
     'TEST_REQUEST_DEFAULT_FORMAT': 'json',
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
-        'rest_framework.renderers.BrowsableAPIRenderer',
+        'rest_api.renderers.FastJSONRenderer',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_api.pagination.CustomPagination',
     'PAGE_SIZE': 250,
@@ -255,6 +312,28 @@ REST_FRAMEWORK = {
     }
 }
 
+# Browsable API (HTML pages) only on the development sites, so the content negotiation always picks JSON in production
+if DEBUG == True:
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'].append('rest_framework.renderers.BrowsableAPIRenderer')
+
+#-----------------#
+#  Logging        #
+#-----------------#
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        # Structured profiling logs: one JSON object per line
+        'message': { 'format': '{message}', 'style': '{' }
+    },
+    'handlers': {
+        'profiling': { 'class': 'logging.StreamHandler', 'formatter': 'message' }
+    },
+    'loggers': {
+        'rest_api.profiling': { 'handlers': ['profiling'], 'level': 'INFO', 'propagate': False }
+    }
+}
+
 
 #-----------------#
 #  CORS Settings  #
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+from imports.models.matrix import ScoreMetricMatrixData
+from omicspred.models import Platform
+
+
+class Command(BaseCommand):
+    help = 'Regenerate the denormalised cohort/metric estimates of the Scores (ScoreMetricMatrix)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--platform', action='append', help='Platform name to rebuild (default: all)')
+
+    def handle(self, *args, **options):
+        if options['platform']:
+            platforms = []
+            for platform_name in options['platform']:
+                try:
+                    platforms.append(Platform.objects.get(name__iexact=platform_name))
+                except Platform.DoesNotExist:
+                    raise CommandError(f'Platform "{platform_name}" not found')
+        else:
+            platforms = [None]
+        count = 0
+        for platform in platforms:
+            count += ScoreMetricMatrixData(platform=platform).create_models()
+        self.stdout.write(self.style.SUCCESS(f'{count} ScoreMetricMatrix entries generated'))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from imports.synthetic import SyntheticDataGenerator
+from omicspred.models import Score
+from rest_api.cache import invalidate_cache
+from rest_api.snapshots import table_snapshots
+
+
+class Command(BaseCommand):
+    help = 'Generate a synthetic OmicsPred database (Publications, Platforms, Cohorts, Samples, omics entities, Scores, Performances and Metrics), for benchmarks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scores', type=int, default=1000, help='Number of Scores per platform (default: 1000)')
+        parser.add_argument('--platforms', type=int, default=5, help='Number of platforms (default: 5)')
+        parser.add_argument('--publications', type=int, default=1, help='Number of publications (default: 1)')
+        parser.add_argument('--extra-cohorts', type=int, default=0, help='Number of evaluation cohorts added to each platform (default: 0)')
+        parser.add_argument('--seed', type=int, default=42, help='Seed of the random values (default: 42)')
+        parser.add_argument('--force', action='store_true', help='Add the synthetic data to a database which already has Scores')
+
+    def handle(self, *args, **options):
+        if Score.objects.exists() and not options['force']:
+            raise CommandError('The database already has Scores: use --force to add the synthetic data anyway')
+        generator = SyntheticDataGenerator(
+            scores_per_platform=options['scores'], platforms=options['platforms'], publications=options['publications'],
+            extra_cohorts=options['extra_cohorts'], seed=options['seed'], verbose=options['verbosity'] > 1
+        )
+        counts = generator.generate()
+        table_snapshots.rebuild()
+        invalidate_cache()
+        for model_name, count in counts.items():
+            self.stdout.write(f'{model_name}: {count}')
+        self.stdout.write(self.style.SUCCESS(f'Synthetic data generated ({options["platforms"]} platforms x {options["scores"]} Scores)'))
@@ -1,5 +1,6 @@
 from django.db import IntegrityError, transaction
 from imports.models.generic import GenericData
+from imports.models.identity_map import get_identity_map
 from omicspred.models import Cohort
 
 
@@ -21,6 +22,10 @@ class CohortData(GenericData):
         Check if a Cohort model already exists.
         Return type: Cohort model
         '''
+        identity_map = get_identity_map()
+        if identity_map:
+            self.check_cohort_identity_map(identity_map)
+            return
         try:
             cohort = Cohort.objects.get(name_short__iexact=self.name, name_full__iexact=self.name_long)
             self.model = cohort
@@ -43,6 +48,21 @@ class CohortData(GenericData):
             print(f'ERROR with cohort {self.name} ({self.name_long}) duplicated!')
 
 
+    def check_cohort_identity_map(self, identity_map):
+        ''' Same as "check_cohort", using the identity map of the import session. '''
+        cohort_map = identity_map.get_map(Cohort)
+        self.model = cohort_map.get(name_short=self.name, name_full=self.name_long)
+        if not self.model:
+            cohort = cohort_map.get(name_short=self.name)
+            if not cohort:
+                print(f'New cohort "{self.name}".')
+            # Short name = long name
+            elif self.name == self.name_long:
+                self.model = cohort
+            else:
+                print(f'A existing cohort has been found in the DB with the ID "{self.name}" ({self.name_long}). However the long name differs.')
+
+
     @transaction.atomic
     def create_model(self):
         '''
@@ -57,7 +77,7 @@ class CohortData(GenericData):
                     self.model.name_short=self.name
                     self.model.name_full=self.name_long
                     self.model.url=self.url
-                    self.model.save()
+                    self.save_model()
         except IntegrityError as e:
             self.model = None
             print('Error with the creation of the Cohort')
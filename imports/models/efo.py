@@ -1,5 +1,6 @@
 from django.db import IntegrityError, transaction
 from imports.models.generic import GenericData
+from imports.models.identity_map import get_identity_map
 from omicspred.models import EFO
 
 
@@ -15,6 +16,10 @@ class EFOData(GenericData):
         Check if a EFO model already exists.
         Return type: EFO model
         '''
+        identity_map = get_identity_map()
+        if identity_map:
+            self.model = identity_map.get_map(EFO).get(id=self.data['id'])
+            return
         try:
             efo = EFO.objects.get(id=self.data['id'])
             self.model = efo
@@ -36,7 +41,7 @@ class EFOData(GenericData):
                     self.model = EFO()
                     for field, val in self.data.items():
                         setattr(self.model, field, val)
-                    self.model.save()
+                    self.save_model()
         except IntegrityError as e:
             self.model = None
             print('Error with the creation of the EFO')
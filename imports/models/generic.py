@@ -1,3 +1,6 @@
+from django.db import IntegrityError, transaction
+from imports.models.identity_map import get_identity_map
+
 
 class GenericData():
 
@@ -30,6 +33,14 @@ class GenericData():
         self.data[field] = value
 
 
+    def save_model(self):
+        ''' Save the model, and index it in the identity map of the current import session (if any). '''
+        self.model.save()
+        identity_map = get_identity_map()
+        if identity_map:
+            identity_map.index(self.model)
+
+
     def next_id_number(self, model):
         ''' Fetch the new primary key value. '''
         assigned = 1
@@ -74,4 +85,60 @@ class GenericData():
         Store the reported import error.
         - msg: import error message
         """
-        self.add_parsing_report('import', 'error', msg)
+        self.add_parsing_report('import', msg)
+
+
+class ModelBuffer():
+    """
+    Write buffer of model instances: the instances are accumulated (e.g. across the rows of a study)
+    and written with "bulk_create", by batch, each batch within its own savepoint.
+    The primary keys are set on the instances once written.
+    The errors are stored in the report of the data object (GenericData) of each instance of the failed batch.
+    """
+
+    def __init__(self, model, batch_size=1000, ignore_errors=True):
+        '''
+        - model: model class (e.g. Metric)
+        - batch_size: number of instances written per query
+        - ignore_errors: if False, the IntegrityError is raised after being reported
+        '''
+        self.model = model
+        self.batch_size = batch_size
+        self.ignore_errors = ignore_errors
+        # List of tuples (model instance, data object)
+        self.items = []
+
+
+    def __len__(self):
+        return len(self.items)
+
+
+    def add(self, instance, data=None):
+        ''' Add an (unsaved) model instance, with the GenericData object reporting its errors. '''
+        self.items.append((instance, data))
+
+
+    def flush(self):
+        '''
+        Write the buffered instances in the database.
+        Return type: list of the model instances created (with their primary key)
+        '''
+        items = self.items
+        self.items = []
+        created = []
+        for start in range(0, len(items), self.batch_size):
+            batch = items[start:start+self.batch_size]
+            try:
+                with transaction.atomic():
+                    self.model.objects.bulk_create([instance for instance, _ in batch])
+            except IntegrityError as e:
+                print(f'Error with the creation of the {self.model.__name__}(s): {e}')
+                for _, data in batch:
+                    if data:
+                        data.model = None
+                        data.parsing_report_error_import(str(e))
+                if not self.ignore_errors:
+                    raise
+                continue
+            created.extend([instance for instance, _ in batch])
+        return created
@@ -0,0 +1,173 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from imports.parsers.utils import is_empty
+from omicspred.models import Cohort, EFO, Gene, Protein, Metabolite, Pathway
+
+
+class EntityMap():
+    """
+    In-memory index of the rows of a model, by normalised (case insensitive) values of its key fields:
+    by each key field and by the combination of all the key fields.
+    The whole table is loaded with a single query. The new entities are registered ("add") and written in bulk ("flush"),
+    or indexed after being saved by the import models (see GenericData.save_model).
+    """
+
+    def __init__(self, model, key_fields, fallback=None):
+        '''
+        - model: model class (e.g. Gene)
+        - key_fields: fields identifying an entity (e.g. ('name','external_id'))
+        - fallback: key field used to search the entity when the combination of key fields is not found
+        '''
+        self.model = model
+        self.key_fields = tuple(key_fields)
+        self.fallback = fallback
+        self.indexes = { (field,): {} for field in self.key_fields }
+        self.indexes[self.key_fields] = {}
+        self.new_models = []
+        self.updated_models = []
+        for entity in model.objects.all().order_by('pk'):
+            self.index(entity)
+
+
+    @staticmethod
+    def normalise(value):
+        if is_empty(value):
+            return None
+        return str(value).strip().upper()
+
+
+    def index(self, entity):
+        ''' Index an entity by its key fields values (the first entity indexed for a given key is kept). '''
+        values = [self.normalise(getattr(entity, field)) for field in self.key_fields]
+        for field, value in zip(self.key_fields, values):
+            if value:
+                self.indexes[(field,)].setdefault((value,), entity)
+        if all(values):
+            self.indexes[self.key_fields].setdefault(tuple(values), entity)
+
+
+    def get(self, **values):
+        '''
+        Retrieve an entity by the values of some of its key fields, e.g. get(name='APOE').
+        Return type: model instance or None
+        '''
+        fields = tuple([field for field in self.key_fields if field in values])
+        key = tuple([self.normalise(values[field]) for field in fields])
+        if fields not in self.indexes or not all(key):
+            return None
+        return self.indexes[fields].get(key)
+
+
+    def find(self, **values):
+        '''
+        Search an entity by all the non empty key fields values provided,
+        then by the fallback field (same rules as the "check_<model>" methods of the import models).
+        Return type: model instance or None
+        '''
+        values = { field: value for field, value in values.items() if not is_empty(value) }
+        entity = None
+        if values:
+            entity = self.get(**values)
+        if not entity and self.fallback in values:
+            entity = self.get(**{ self.fallback: values[self.fallback] })
+        return entity
+
+
+    def add(self, entity):
+        ''' Register a new (unsaved) entity, written in the database by "flush". '''
+        self.new_models.append(entity)
+        self.index(entity)
+        return entity
+
+
+    def update(self, entity):
+        ''' Register an existing entity which needs to be updated (e.g. new external ID). '''
+        if entity.pk and entity not in self.updated_models:
+            self.updated_models.append(entity)
+        self.index(entity)
+
+
+    def flush(self, update_fields=None, batch_size=1000):
+        ''' Write the new/updated entities in the database, in bulk. '''
+        if self.new_models:
+            self.model.objects.bulk_create(self.new_models, batch_size=batch_size)
+            print(f"  > {len(self.new_models)} new {self.model.__name__} entries")
+        if self.updated_models and update_fields:
+            self.model.objects.bulk_update(self.updated_models, update_fields, batch_size=batch_size)
+            print(f"  > {len(self.updated_models)} updated {self.model.__name__} entries")
+        self.new_models = []
+        self.updated_models = []
+
+
+class IdentityMap():
+    """
+    Identity map of an import session: one EntityMap per model, loaded on first use,
+    so each entity is only retrieved once from the database during the import of several studies.
+    """
+
+    # Model => key fields and fallback field
+    models_keys = {
+        EFO: (('id',), None),
+        Cohort: (('name_short', 'name_full'), None),
+        Pathway: (('name', 'external_id'), 'name'),
+        Gene: (('name', 'external_id'), 'name'),
+        Protein: (('name', 'external_id'), 'external_id'),
+        Metabolite: (('name', 'external_id'), 'name')
+    }
+
+    def __init__(self):
+        self.maps = {}
+
+
+    def get_map(self, model):
+        ''' Return type: EntityMap of the model '''
+        if model not in self.maps:
+            key_fields, fallback = self.models_keys[model]
+            self.maps[model] = EntityMap(model, key_fields, fallback)
+        return self.maps[model]
+
+
+    def index(self, entity):
+        ''' Index a new/updated entity, if its model has already been loaded. '''
+        if type(entity) in self.maps:
+            self.maps[type(entity)].index(entity)
+
+
+    def flush(self, batch_size=1000):
+        ''' Write the new entities of all the models (in the order of their dependencies). '''
+        for model in self.models_keys.keys():
+            if model in self.maps:
+                self.maps[model].flush(batch_size=batch_size)
+
+
+    def clear(self):
+        ''' Forget the loaded entities (e.g. after a rollback). '''
+        self.maps = {}
+
+
+current_identity_map = ContextVar('import_identity_map', default=None)
+
+
+def get_identity_map():
+    ''' Return type: IdentityMap of the current import session, or None '''
+    return current_identity_map.get()
+
+
+@contextmanager
+def import_session():
+    '''
+    Import session: the import models ("check_<model>" methods) and the parsers share the same identity map.
+    The new entities are written in the database at the end of the session.
+    '''
+    identity_map = get_identity_map()
+    if identity_map:
+        # Nested session
+        yield identity_map
+        return
+    identity_map = IdentityMap()
+    token = current_identity_map.set(identity_map)
+    try:
+        yield identity_map
+        identity_map.flush()
+    finally:
+        current_identity_map.reset(token)
@@ -0,0 +1,77 @@
+from imports.models.generic import GenericData
+from omicspred.models import ImportRun
+
+
+class ImportRunData(GenericData):
+
+    def __init__(self,study,filepath,rows_count,batch_size):
+        GenericData.__init__(self)
+        self.data = {
+            'study': study,
+            'filepath': filepath,
+            'rows_count': rows_count,
+            'batch_size': batch_size
+        }
+
+
+    def check_import_run(self):
+        '''
+        Check if an import of the same study file can be resumed (last import run of the study, with the same number of rows).
+        Return type: ImportRun model
+        '''
+        run = ImportRun.objects.filter(study=self.data['study']).order_by('-id').first()
+        if run and run.filepath == self.data['filepath'] and run.rows_count == self.data['rows_count']:
+            self.model = run
+        else:
+            if run:
+                print(f"  > The file of the study has changed since the last import: the import restarts from the first row")
+            self.model = None
+
+
+    def create_model(self,resume=False):
+        '''
+        Retrieve the import run to resume, or create a new one.
+        - resume: resume the last import run of the study (skip the rows already committed)
+        Return type: ImportRun model
+        '''
+        self.model = None
+        if resume:
+            self.check_import_run()
+        if self.model:
+            if self.model.status != 'C':
+                print(f"  > Resume the import from row {self.model.last_row+1}")
+                self.model.status = 'R'
+                self.model.error = None
+                self.model.save()
+        else:
+            self.model = ImportRun.objects.create(**self.data)
+        return self.model
+
+
+    @property
+    def last_row(self):
+        return self.model.last_row
+
+
+    def is_completed(self):
+        return self.model.status == 'C'
+
+
+    def checkpoint(self,last_row):
+        '''
+        Record the number of rows committed (to be called in the transaction of the batch).
+        '''
+        self.model.last_row = last_row
+        self.model.save(update_fields=['last_row','date_updated'])
+
+
+    def complete(self):
+        self.model.status = 'C'
+        self.model.save(update_fields=['status','date_updated'])
+
+
+    def fail(self,error):
+        self.model.status = 'F'
+        self.model.error = str(error)
+        self.model.save(update_fields=['status','error','date_updated'])
+        self.parsing_report_error_import(str(error))
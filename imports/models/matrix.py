@@ -0,0 +1,75 @@
+from django.db import IntegrityError, transaction
+from imports.models.generic import GenericData
+from omicspred.models import Score, Metric, ScoreMetricMatrix
+
+
+class ScoreMetricMatrixData(GenericData):
+
+    def __init__(self,platform=None,score_ids=None):
+        GenericData.__init__(self)
+        self.platform = platform
+        self.score_ids = score_ids
+        self.matrix = {}
+
+
+    def fetch_metrics(self):
+        '''
+        Collect the cohort/metric estimates of the Scores, using a single flat query.
+        Return type: dictionary of lists of entries, by Score primary key
+        '''
+        queryset = Metric.objects.all()
+        if self.platform:
+            queryset = queryset.filter(performance__platform=self.platform)
+        if self.score_ids is not None:
+            queryset = queryset.filter(performance__score_id__in=self.score_ids)
+        rows = queryset.values_list(
+            'id', 'performance__score_id', 'performance__cohort_label', 'performance__sample__cohorts__name_short', 'name_short', 'estimate'
+        ).order_by('performance_id', 'id', 'performance__sample__cohorts__id')
+
+        metric_ids = set()
+        for metric_id, score_id, cohort_label, cohort_name, metric_name, estimate in rows.iterator(chunk_size=5000):
+            # Samples with several cohorts: only the first cohort is kept
+            if metric_id in metric_ids:
+                continue
+            metric_ids.add(metric_id)
+            if score_id not in self.matrix:
+                self.matrix[score_id] = []
+            self.matrix[score_id].append({
+                'cohort': cohort_name,
+                'cohort_label': cohort_label,
+                'metric': metric_name,
+                'estimate': Metric.display_value(estimate)
+            })
+        return self.matrix
+
+
+    @transaction.atomic
+    def create_models(self,batch_size=1000):
+        '''
+        Create/Replace the instances of the ScoreMetricMatrix model.
+        Return type: number of ScoreMetricMatrix models created
+        '''
+        self.fetch_metrics()
+        # Scores without Performance metrics
+        scores = Score.objects.all()
+        if self.platform:
+            scores = scores.filter(platform=self.platform)
+        if self.score_ids is not None:
+            scores = scores.filter(num__in=self.score_ids)
+        for score_id in scores.values_list('num', flat=True):
+            if score_id not in self.matrix:
+                self.matrix[score_id] = []
+        try:
+            with transaction.atomic():
+                matrix_models = ScoreMetricMatrix.objects.all()
+                if self.platform:
+                    matrix_models = matrix_models.filter(score__platform=self.platform)
+                if self.score_ids is not None:
+                    matrix_models = matrix_models.filter(score_id__in=self.score_ids)
+                matrix_models.delete()
+                models = [ScoreMetricMatrix(score_id=score_id, metrics=entries) for score_id, entries in self.matrix.items()]
+                ScoreMetricMatrix.objects.bulk_create(models, batch_size=batch_size)
+        except IntegrityError as e:
+            models = []
+            print(f'Error with the creation of the ScoreMetricMatrix: {e}')
+        return len(models)
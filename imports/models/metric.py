@@ -54,17 +54,27 @@ class MetricData(GenericData):
             self.add_data('name_short', self.name)
 
 
+    def build_model(self,performance=None):
+        '''
+        Build an (unsaved) instance of the Metric model, e.g. to be written with a ModelBuffer.
+        Return type: Metric model
+        '''
+        self.set_names()
+        self.model = Metric(**self.data)
+        if performance:
+            self.model.performance = performance
+        return self.model
+
+
     @transaction.atomic
     def create_model(self,performance):
         '''
         Create an instance of the Metric model.
         Return type: Metric model
         '''
-        self.set_names()
         try:
             with transaction.atomic():
-                self.model = Metric(**self.data)
-                self.model.performance = performance
+                self.build_model(performance)
                 self.model.save()
         except IntegrityError as e:
             print('Error with the creation of the Metric')
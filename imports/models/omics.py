@@ -1,6 +1,7 @@
 import numpy as np
 from django.db import IntegrityError, transaction
 from imports.models.generic import GenericData
+from imports.models.identity_map import get_identity_map
 from omicspred.models import Gene, Protein, Metabolite, Pathway
 
 
@@ -16,6 +17,10 @@ class GeneData(GenericData):
         Check if a Gene model already exists.
         Return type: Gene model
         '''
+        identity_map = get_identity_map()
+        if identity_map:
+            self.model = identity_map.get_map(Gene).find(name=self.name, external_id=self.external_id)
+            return
         try:
             gene = None
             if self.name and self.name not in [None,np.nan,'nan',''] and self.external_id:
@@ -43,7 +48,7 @@ class GeneData(GenericData):
         '''
         self.model.external_id = self.external_id
         self.model.external_id_source = 'Ensembl'
-        self.model.save()
+        self.save_model()
 
 
     @transaction.atomic
@@ -63,7 +68,7 @@ class GeneData(GenericData):
                         self.model.external_id=self.external_id
                         if self.external_id.startswith('ENSG'):
                             self.model.external_id_source = 'Ensembl'
-                    self.model.save()
+                    self.save_model()
                 elif not self.model.external_id and self.external_id:
                     self.update_gene()
         except IntegrityError as e:
@@ -87,6 +92,10 @@ class ProteinData(GenericData):
         Check if a Protein model already exists.
         Return type: Protein model
         '''
+        identity_map = get_identity_map()
+        if identity_map:
+            self.model = identity_map.get_map(Protein).find(name=self.name, external_id=self.external_id)
+            return
         try:
             protein = None
             if self.name and self.name not in [None,np.nan,'nan',''] and self.external_id:
@@ -122,7 +131,7 @@ class ProteinData(GenericData):
                         self.model.gene=self.gene
                     self.model.external_id=self.external_id
                     self.model.external_id_source = 'UniProt'
-                    self.model.save()
+                    self.save_model()
         except IntegrityError as e:
             self.model = None
             print(f'Error with the creation of the Protein: {e}')
@@ -152,6 +161,10 @@ class MetaboliteData(GenericData):
         Check if a Metabolite model already exists.
         Return type: Metabolite model
         '''
+        identity_map = get_identity_map()
+        if identity_map:
+            self.model = identity_map.get_map(Metabolite).find(name=self.name, external_id=self.external_id)
+            return
         try:
             metabolite = None
             if self.name not in [None,np.nan,'nan',''] and self.external_id:
@@ -186,7 +199,7 @@ class MetaboliteData(GenericData):
                     self.model =  Metabolite()
                     for field, val in self.data.items():
                         setattr(self.model, field, val)
-                    self.model.save()
+                    self.save_model()
         except IntegrityError as e:
             self.model = None
             print('Error with the creation of the Metabolite')
@@ -207,6 +220,10 @@ class PathwayData(GenericData):
         Check if a Pathway model already exists.
         Return type: Pathway model
         '''
+        identity_map = get_identity_map()
+        if identity_map:
+            self.model = identity_map.get_map(Pathway).find(name=self.name, external_id=self.external_id)
+            return
         try:
             pathway = None
             if self.name not in [None,np.nan,'nan',''] and self.external_id:
@@ -244,7 +261,7 @@ class PathwayData(GenericData):
                             self.model.name=self.name
                         if self.external_id:
                             self.model.external_id=self.external_id
-                        self.model.save()
+                        self.save_model()
         except IntegrityError as e:
             self.model = None
             print('Error with the creation of the Pathway')
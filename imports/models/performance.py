@@ -1,8 +1,7 @@
 import numpy as np
-from django.db import IntegrityError, transaction
-from imports.models.generic import GenericData
+from imports.models.generic import GenericData, ModelBuffer
 from imports.models.metric import MetricData
-from omicspred.models import Performance
+from omicspred.models import Performance, Metric
 
 class PerformanceData(GenericData):
 
@@ -13,17 +12,22 @@ class PerformanceData(GenericData):
     }
 
     def __init__(self,score,publication,sample,platform,efo,type,gwas_info,extra=None):
+        '''
+        - score: Score model, or None for the Performance data shared by the Scores of a cohort (see cohort_template)
+        '''
         GenericData.__init__(self)
         self.metrics = []
         # self.metric_models = []
-        self.data = {
-            'score': score,
+        self.data = {}
+        if score is not None:
+            self.data['score'] = score
+        self.data.update({
             'publication': publication,
             'sample': sample,
             'platform': platform,
             'efo': efo,
             'eval_type': type
-        }
+        })
         if gwas_info:
             if 'gcst_id' in gwas_info.keys():
                 self.data['source_gwas_catalog'] = gwas_info['gcst_id']
@@ -35,6 +39,18 @@ class PerformanceData(GenericData):
             self.data['performance_additional'] = extra
 
 
+    @classmethod
+    def cohort_template(cls,publication,sample,platform,efo,type,gwas_info,extra=None):
+        '''
+        Performance data of a cohort, without Score: template of the Performance models of all the Scores of a study,
+        with the cohort label set.
+        Return type: PerformanceData object
+        '''
+        performance_data = cls(None,publication,sample,platform,efo,type,gwas_info,extra)
+        performance_data.get_cohort_label()
+        return performance_data
+
+
     def add_metric(self,metric_values):
         '''
         Method creating MetricData objects and add them to the metrics array.
@@ -66,24 +82,67 @@ class PerformanceData(GenericData):
 
 
 
-    @transaction.atomic
     def create_model(self):
         '''
-        Create an instance of the Performance model.
+        Create an instance of the Performance model, and its associated Metric models.
         Return type: Performance model
         '''
-        try:
-            with transaction.atomic():
-                self.model = Performance(**self.data)
-                self.model.save()
+        performance_buffer = PerformanceBuffer()
+        performance_buffer.add(self)
+        performance_buffer.flush()
+        return self.model
 
-            # Create associated Metric objects
-            for metric in self.metrics:
-                metric_model = metric.create_model(self.model)
 
-        except IntegrityError as e:
-            self.model = None
-            self.parsing_report_error_import(e)
-            print('Error with the creation of the Performance(s) and/or the Metric(s)')
+class PerformanceBuffer():
+    """
+    Write buffer of the Performance models and their Metric models, accumulated across the rows
+    of a study and written with "bulk_create" (flushed automatically every "batch_size" Performances).
+    The Performance primary keys are set before the Metric models are linked to them.
+    The errors are reported in the PerformanceData objects (GenericData.report).
+    """
 
-        return self.model
+    def __init__(self, batch_size=1000, ignore_errors=True):
+        self.batch_size = batch_size
+        self.performances = ModelBuffer(Performance, batch_size, ignore_errors)
+        self.metrics = ModelBuffer(Metric, batch_size, ignore_errors)
+        # List of tuples (Performance model, list of MetricData objects)
+        self.pending = []
+        self.performances_count = 0
+        self.metrics_count = 0
+
+
+    def add(self, performance_data):
+        ''' Add the Performance (and its metrics) of a PerformanceData object. '''
+        performance_data.model = Performance(**performance_data.data)
+        self.add_model(performance_data.model, performance_data.metrics, performance_data)
+
+
+    def add_model(self, performance, metrics, data=None):
+        '''
+        Add an (unsaved) Performance model and its metrics.
+        - performance: Performance model
+        - metrics: list of MetricData objects
+        - data: GenericData object reporting the errors (e.g. the PerformanceData shared by the rows of a cohort)
+        '''
+        self.performances.add(performance, data)
+        self.pending.append((performance, metrics))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+
+    def flush(self):
+        '''
+        Write the buffered Performance models, then their Metric models.
+        Return type: list of the Performance models created (with their primary key)
+        '''
+        pending = self.pending
+        self.pending = []
+        performances = self.performances.flush()
+        created = set([id(x) for x in performances])
+        for performance, metrics in pending:
+            if id(performance) in created:
+                for metric_data in metrics:
+                    self.metrics.add(metric_data.build_model(performance), metric_data)
+        self.metrics_count += len(self.metrics.flush())
+        self.performances_count += len(performances)
+        return performances
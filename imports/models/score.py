@@ -5,11 +5,13 @@ from omicspred.models import Score
 
 class ScoreData(GenericData):
 
+    # Fields updated when the Score already exists (upsert keyed on the Score number/ID)
+    upsert_fields = ['id', 'name', 'variants_number', 'publication', 'platform', 'method_name', 'variants_genomebuild']
+
     def __init__(self,score_id,variants_number,publication,platform,genomebuild,method_name,score_name=None):
         GenericData.__init__(self)
-        num = score_id.replace('OPGS','').lstrip('0')
         self.data = {
-            'num': int(num),
+            'num': self.get_num(score_id),
             'id': score_id,
             'variants_number': variants_number,
             'publication': publication,
@@ -21,6 +23,12 @@ class ScoreData(GenericData):
             self.data['name'] = score_name
 
 
+    @staticmethod
+    def get_num(score_id):
+        ''' Score number from the OmicsPred ID (e.g. OPGS000012 => 12). '''
+        return int(score_id.replace('OPGS','').lstrip('0'))
+
+
     @transaction.atomic
     def create_model(self):
         '''
@@ -0,0 +1,352 @@
+import hashlib
+import time
+import numpy as np
+import pandas as pd
+from django.db import transaction
+from imports.models.score import ScoreData
+from imports.models.performance import PerformanceData, PerformanceBuffer
+from imports.models.metric import MetricData
+from imports.models.efo import EFOData
+from imports.models.matrix import ScoreMetricMatrixData
+from imports.models.identity_map import IdentityMap, get_identity_map
+from imports.models.import_run import ImportRunData
+from imports.parsers.utils import is_empty
+from omicspred.models import Score, ScoreFingerprint, Performance
+
+
+def split_column(series, sep):
+    ''' Split the values of a column into lists (empty list for the missing values). '''
+    return series.fillna('').astype(str).str.strip().map(lambda x: x.split(sep) if x else [])
+
+
+class BulkStudyParser():
+    """
+    Generic class to import a study data file in bulk:
+     - the file is read by chunks of rows (batch_size), only with the columns used by the parser and with explicit types,
+       so the memory usage doesn't depend on the size of the file
+     - the omics entities are resolved once per distinct value, using the identity map of the import session
+       (or of the study, outside of an import session)
+     - the Score and Score/omics entities links are written with "bulk_create", by chunk of rows,
+       and the Performance and Metric models through a write buffer (PerformanceBuffer)
+     - each chunk of rows is committed with a checkpoint of the import run (ImportRun),
+       so a failed import can be resumed from the last committed batch ("resume").
+       The Scores are upserted (keyed on the Score number/ID): a batch can be imported again.
+     - the fingerprint (hash) of each row is stored with its Score, so a "delta" import only imports the new/changed rows
+       and deletes the Scores removed from the file.
+    """
+
+    batch_size = 2000
+    # Create the Performance even if it has no Metric
+    keep_empty_performances = True
+    # Columns to be read as string (e.g. IDs)
+    text_columns = ['OMICSPRED ID']
+    # Columns with a few distinct values repeated across the rows (e.g. pathways), read as categorical
+    category_columns = []
+    # Columns of the omics entities (read by "resolve_entities")
+    entity_columns = []
+    # Types of metrics, with their column suffix
+    training_metrics = ['R2', 'R2_pvalue', 'Rho', 'Rho_pvalue']
+    validation_metrics = ['R2', 'R2_pvalue', 'Rho', 'Rho_pvalue', 'MissingRate']
+
+    def __init__(self, data_info:dict):
+        self.study = data_info['name']
+        self.study_info = data_info['study_info']
+        self.gwas_data = data_info['gwas_data']
+        self.filepath = data_info['filepath']
+        self.platform = data_info['platform']
+        self.omicstype = data_info['type']
+        self.samples = data_info['samples_info']
+        self.publication = data_info['publication']
+        self.genomebuild = data_info['genomebuild']
+        self.resume = data_info.get('resume', False)
+        self.delta = data_info.get('delta', False)
+        self.identity_map = get_identity_map() or IdentityMap()
+
+
+    def get_metric_columns(self):
+        ''' List the metric columns of all the cohorts of the study. '''
+        columns = []
+        for cohort in self.study_info['sample_cohort_info'].keys():
+            columns.extend(self.get_cohort_metric_columns(cohort).values())
+        return columns
+
+
+    def get_column_types(self):
+        '''
+        Types of the columns read by the parser.
+        The metrics are read as float64: float32 would alter the estimates (e.g. 0.448123 => 0.44812301)
+        and round the smallest p-values to 0.
+        Return type: dictionary of types, by column name
+        '''
+        dtypes = { column: 'float64' for column in self.get_metric_columns() }
+        dtypes.update({ column: 'category' for column in self.category_columns })
+        dtypes.update({ column: str for column in self.text_columns })
+        return dtypes
+
+
+    def read_data(self, chunksize=None, skiprows=0):
+        '''
+        Load the study file, only with the columns used by the parser.
+        - chunksize: number of rows per chunk
+        - skiprows: number of data rows to skip (e.g. rows already imported)
+        Return type: DataFrame, or iterator of DataFrames if chunksize is set
+        '''
+        dtypes = self.get_column_types()
+        columns = set(['OMICSPRED ID', '#SNP'] + self.entity_columns + list(dtypes.keys()))
+        return pd.read_csv(
+            self.filepath, usecols=lambda column: column in columns, dtype=dtypes,
+            chunksize=chunksize, skiprows=range(1, skiprows+1)
+        )
+
+
+    def read_score_ids(self):
+        ''' Load the Score IDs column of the study file. '''
+        return pd.read_csv(self.filepath, usecols=['OMICSPRED ID'], dtype=str)['OMICSPRED ID']
+
+
+    def get_fingerprints(self, df):
+        '''
+        Fingerprint of each row of the study file: hash of all the values read by the parser (columns sorted by name).
+        Return type: list of fingerprints (MD5 hexadecimal digests)
+        '''
+        columns = [df[column].astype(object).fillna('').astype(str) for column in sorted(df.columns)]
+        return [hashlib.md5('\x1f'.join(row).encode()).hexdigest() for row in zip(*columns)]
+
+
+    def get_changed_rows(self, df, fingerprints, stored_fingerprints):
+        '''
+        Compare the row fingerprints with the ones stored by the previous imports of the study.
+        Return type: list of booleans flagging the new/changed rows
+        '''
+        score_nums = [ScoreData.get_num(x) for x in df['OMICSPRED ID']]
+        return [stored_fingerprints.get(score_num) != fingerprint for score_num, fingerprint in zip(score_nums, fingerprints)]
+
+
+    def save_fingerprints(self, score_nums, fingerprints):
+        ''' Create/Update the row fingerprints of a batch of Scores. '''
+        ScoreFingerprint.objects.bulk_create(
+            [ScoreFingerprint(score_id=score_num, study=self.study, fingerprint=fingerprint) for score_num, fingerprint in zip(score_nums, fingerprints)],
+            batch_size=self.batch_size, update_conflicts=True, unique_fields=['score'], update_fields=['study', 'fingerprint']
+        )
+
+
+    def resolve_entities(self, df):
+        '''
+        Retrieve/Create the omics entities of the study (to be implemented by each parser).
+        Return type: dictionary of lists of entity primary keys (one list per row), by Score field (e.g. 'genes')
+        '''
+        raise NotImplementedError
+
+
+    def get_score_names(self, df):
+        ''' Score names column (optional). '''
+        return None
+
+
+    def get_gwas_info(self, cohort_name):
+        ''' Retrieve the GWAS information of a cohort for the current platform. '''
+        gwas_info = {}
+        platform_name = self.platform.name
+        gwas_data = self.gwas_data.data
+        if platform_name in gwas_data.keys():
+            if cohort_name in gwas_data[platform_name].keys():
+                gwas_info = gwas_data[platform_name][cohort_name]
+        return gwas_info
+
+
+    def get_cohort_metric_columns(self, cohort):
+        ''' List the metric columns of a cohort, by metric type. '''
+        if cohort == self.study_info['internal_cohort']:
+            label = self.study_info['internal_label']
+            metric_types = self.training_metrics
+        else:
+            label = cohort
+            metric_types = self.validation_metrics
+        return { metric_type: f'{label}_{metric_type}' for metric_type in metric_types }
+
+
+    def get_performance_templates(self, efo, **gwas_options):
+        '''
+        Build the Performance data shared by all the Scores, for each cohort of the study.
+        - gwas_options: extra arguments of "get_gwas_info"
+        Return type: list of dictionaries with the Performance data and the metric columns
+        '''
+        templates = []
+        for cohort, cohort_data in self.study_info['sample_cohort_info'].items():
+            sample = None
+            extra = None
+            for sample_info in self.samples:
+                if sample_info['cohort'] == cohort_data['name'] and sample_info['ancestry'] == cohort_data['ancestry']:
+                    sample = sample_info['sample']
+                    extra = sample_info['entities_count']+' genes'
+            if not sample:
+                continue
+            gwas_info = self.get_gwas_info(cohort_data['name'], **gwas_options)
+            performance_data = PerformanceData.cohort_template(self.publication,sample,self.platform,efo,cohort_data['vtype'],gwas_info,extra)
+            templates.append({
+                'data': performance_data.data,
+                'performance_data': performance_data,
+                'metric_columns': self.get_cohort_metric_columns(cohort)
+            })
+        return templates
+
+
+    def create_scores(self, df, entities):
+        '''
+        Create (or update) the Score models of a batch of rows and link them to their omics entities.
+        The Performances and omics entities links of the existing Scores are replaced.
+        Return type: list of Score primary keys
+        '''
+        method_name = self.study_info['method_name']
+        score_names = self.get_score_names(df)
+        if score_names is None:
+            score_names = [None] * len(df.index)
+        scores = []
+        for score_id, variants_number, score_name in zip(df['OMICSPRED ID'], df['#SNP'], score_names):
+            if is_empty(score_name):
+                score_name = None
+            score_data = ScoreData(score_id,int(variants_number),self.publication,self.platform,self.genomebuild,method_name,score_name)
+            scores.append(Score(**score_data.data))
+        score_nums = [x.num for x in scores]
+        existing_nums = list(Score.objects.filter(num__in=score_nums).values_list('num', flat=True))
+        Score.objects.bulk_create(
+            scores, batch_size=self.batch_size,
+            update_conflicts=True, unique_fields=['num'], update_fields=ScoreData.upsert_fields
+        )
+        if existing_nums:
+            # Scores imported by a previous run
+            Performance.objects.filter(score_id__in=existing_nums).delete()
+            print(f"  > {len(existing_nums)} existing scores updated")
+
+        # Score <=> omics entities links
+        for field_name, entity_ids in entities.items():
+            field = Score._meta.get_field(field_name)
+            through = field.remote_field.through
+            score_col = f'{field.m2m_field_name()}_id'
+            entity_col = f'{field.m2m_reverse_field_name()}_id'
+            if existing_nums:
+                through.objects.filter(**{ f'{score_col}__in': existing_nums }).delete()
+            links = []
+            for score_num, ids in zip(score_nums, entity_ids):
+                for entity_id in dict.fromkeys(ids):
+                    links.append(through(**{ score_col: score_num, entity_col: entity_id }))
+            through.objects.bulk_create(links, batch_size=self.batch_size)
+        return score_nums
+
+
+    def create_performances(self, df, score_nums, templates, performance_buffer):
+        '''
+        Add the Performance and Metric models of a batch of rows to the write buffer, one Performance per Score and cohort.
+        Return type: number of Performance models added
+        '''
+        count = 0
+        for template in templates:
+            # Metric values of the cohort, as arrays (NaN for the missing values)
+            values = {}
+            for metric_type, column in template['metric_columns'].items():
+                values[metric_type] = pd.to_numeric(df[column], errors='coerce').to_numpy(dtype=float)
+            metric_types = [x for x in values.keys() if 'pvalue' not in x]
+            has_metric = np.zeros(len(score_nums), dtype=bool)
+            for metric_type in metric_types:
+                has_metric |= ~np.isnan(values[metric_type])
+
+            for idx, score_num in enumerate(score_nums):
+                if not has_metric[idx] and not self.keep_empty_performances:
+                    continue
+                metrics = []
+                for metric_type in metric_types:
+                    estimate = values[metric_type][idx]
+                    if np.isnan(estimate):
+                        continue
+                    pvalue = None
+                    pval_type = f'{metric_type}_pvalue'
+                    if pval_type in values and not np.isnan(values[pval_type][idx]):
+                        pvalue = float(values[pval_type][idx])
+                    metrics.append(MetricData(metric_type,float(estimate),pvalue))
+                performance = Performance(score_id=score_num, **template['data'])
+                performance_buffer.add_model(performance, metrics, template['performance_data'])
+                count += 1
+        return count
+
+
+    def prepare_shared_entities(self):
+        '''
+        Retrieve/Create the entities which can be shared with other studies (EFO and omics entities),
+        e.g. before importing several studies in parallel.
+        '''
+        with transaction.atomic():
+            EFOData(self.study_info['tissue']).create_model()
+            for df in self.read_data(chunksize=self.batch_size):
+                self.resolve_entities(df)
+
+
+    def parse_data(self):
+        start_time = time.time()
+        score_nums = [ScoreData.get_num(x) for x in self.read_score_ids()]
+        print(f"  > {len(score_nums)} rows in {self.filepath}")
+
+        deleted_nums = []
+        stored_fingerprints = None
+        if self.delta:
+            stored_fingerprints = dict(ScoreFingerprint.objects.filter(study=self.study).values_list('score_id', 'fingerprint'))
+            deleted_nums = sorted(set(stored_fingerprints.keys()) - set(score_nums))
+
+        # A delta import is not resumed: the rows committed by a failed delta import are unchanged rows for the next one
+        import_run = ImportRunData(self.study, self.filepath, len(score_nums), self.batch_size)
+        import_run.create_model(self.resume and not self.delta)
+        if import_run.is_completed():
+            print(f"  > Study already imported: skipped")
+            return
+
+        imported_nums = []
+        try:
+            with transaction.atomic():
+                # Scores removed from the study file (with their Performances, Metrics and fingerprints)
+                if deleted_nums:
+                    Score.objects.filter(num__in=deleted_nums).delete()
+
+                # EFO model
+                efo_data = EFOData(self.study_info['tissue'])
+                efo_model = efo_data.create_model()
+
+            # Omics entities, Score, Performance & Metric models, by chunk of rows (one transaction per chunk)
+            templates = self.get_performance_templates(efo_model)
+            performance_buffer = PerformanceBuffer(self.batch_size, ignore_errors=False)
+            start = import_run.last_row
+            for df in self.read_data(chunksize=self.batch_size, skiprows=start):
+                end = start + len(df.index)
+                fingerprints = self.get_fingerprints(df)
+                if self.delta:
+                    # Only keep the new/changed rows
+                    changed = self.get_changed_rows(df, fingerprints, stored_fingerprints)
+                    df = df[changed].reset_index(drop=True)
+                    fingerprints = [fingerprint for fingerprint, is_changed in zip(fingerprints, changed) if is_changed]
+                chunk_nums = []
+                perf_count = 0
+                with transaction.atomic():
+                    if len(df.index):
+                        entities = self.resolve_entities(df)
+                        chunk_nums = self.create_scores(df, entities)
+                        perf_count = self.create_performances(df, chunk_nums, templates, performance_buffer)
+                        performance_buffer.flush()
+                        self.save_fingerprints(chunk_nums, fingerprints)
+                    import_run.checkpoint(end)
+                imported_nums.extend(chunk_nums)
+                print(f"  > Rows {start+1}-{end}: {len(chunk_nums)} scores, {perf_count} performances")
+                start = end
+            print(f"  > {performance_buffer.performances_count} performances and {performance_buffer.metrics_count} metrics written")
+        except Exception as e:
+            # The entities created in a rolled back transaction are not in the database
+            self.identity_map.clear()
+            import_run.fail(e)
+            raise
+
+        # Denormalised cohort/metric estimates of the Scores
+        if self.delta:
+            print(f"  > Delta import: {len(imported_nums)} new/changed rows, {len(deleted_nums)} removed scores")
+            if imported_nums:
+                ScoreMetricMatrixData(platform=self.platform, score_ids=imported_nums).create_models()
+        else:
+            ScoreMetricMatrixData(platform=self.platform).create_models()
+        import_run.complete()
+        print(f"  > Study imported in {round(time.time()-start_time,1)}s")
@@ -1,13 +1,15 @@
 import pandas as pd
 import numpy as np
-import requests
+from imports.parsers.resolver import PublicationResolver
+from imports.parsers.utils import is_empty
 
 
 class GWASParser():
 
-    def __init__(self, filepaths):
+    def __init__(self, filepaths, resolver=None):
         self.filepaths = filepaths
         self.data = {}
+        self.resolver = resolver if resolver else PublicationResolver()
 
 
     def parse_files(self):
@@ -15,9 +17,6 @@ class GWASParser():
             df = pd.read_csv(filepath)
             print(f"  > FILE: {filepath}")
             for index, row in df.iterrows():
-                gcst_id = None
-                pmid = None
-
                 # Platform info
                 platform = row['Platform']
                 if platform not in self.data.keys():
@@ -33,47 +32,30 @@ class GWASParser():
                 if covariates and covariates not in [None,np.nan,'nan','']:
                     self.data[platform][cohort]['covariates'] = covariates
                 # DOI -> PMID
-                doi = row['Reference (DOI)'].split('\n')[0]
+                if is_empty(row['Reference (DOI)']):
+                    continue
+                doi = row['Reference (DOI)'].split('\n')[0].strip()
                 if doi == 'current manuscript' or doi == 'Current manuscript':
                     doi = '10.1038/s41586-023-05844-9'
                 else:
                     doi = doi.replace('https://doi.org/','')
                 self.data[platform][cohort]['doi'] = doi
 
-                # PMID -> GCST ID
-                pmid = self.get_pmid_from_epmc(doi)
-                if pmid:
-                    gcst_id = self.get_gcst_id(pmid)
-                if gcst_id:
-                    self.data[platform][cohort]['gcst_id'] = gcst_id
-                # print(f"\nCohort: {cohort} | Platform {platform} | DOI: {doi} | PMID: {pmid} | GCST: {gcst_id}")
+                # print(f"\nCohort: {cohort} | Platform {platform} | DOI: {doi}")
                 # print(f"  > Covariates {self.data[platform][cohort]['covariates']}")
 
-
+        # DOI -> PMID -> GCST ID, resolved once per DOI
+        dois = [cohort_data.get('doi') for platform_data in self.data.values() for cohort_data in platform_data.values()]
+        publications = self.resolver.resolve(dois)
+        for platform_data in self.data.values():
+            for cohort_data in platform_data.values():
+                gcst_id = publications.get(cohort_data.get('doi'), {}).get('gcst_id')
+                if gcst_id:
+                    cohort_data['gcst_id'] = gcst_id
 
 
     def get_pmid_from_epmc(self, doi):
-        payload = {'format': 'json'}
-        query = f'doi:{doi}'
-        payload['query'] = query
-        result = requests.get('https://www.ebi.ac.uk/europepmc/webservices/rest/search', params=payload)
-        result = result.json()
-        results_list = result['resultList']['result']
-        if results_list:
-            result = results_list[0]
-            if result['pubType'] != 'preprint':
-                if 'pmid' in result:
-                    return result['pmid']
-        else:
-            return None
+        return self.resolver.resolve_pmids([doi]).get(doi)
 
     def get_gcst_id(self,pmid):
-        result = requests.get(f'https://www.ebi.ac.uk/gwas/rest/api/studies/search/findByPublicationIdPubmedId?pubmedId={pmid}')
-        result = result.json()
-        results_list = result['_embedded']['studies']
-        if results_list:
-            result = results_list[0]
-            if result['accessionId']:
-                return result['accessionId']
-        else:
-            return None
+        return self.resolver.resolve_gcst_ids([pmid]).get(str(pmid))
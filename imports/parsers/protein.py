@@ -1,173 +1,130 @@
-import pandas as pd
-import numpy as np
-from imports.models.score import ScoreData
-from imports.models.performance import PerformanceData
-from imports.models.omics import GeneData, ProteinData
-from imports.models.efo import EFOData
-from omicspred.models import Platform
+from imports.parsers.bulk import BulkStudyParser, split_column
+from omicspred.models import Gene, Protein
 
 
 
-class ProteinParser():
+class ProteinParser(BulkStudyParser):
 
     olink_neur_label = 'Olink (NEUR)'
     olink_other_label = 'Olink (INF-1, CVD-2, CVD-3)'
+    text_columns = ['OMICSPRED ID', 'SOMAscan ID', 'UniProt ID', 'Protein', 'Gene']
+    # SOMAscan ID: Score name (Somalogic only)
+    entity_columns = ['UniProt ID', 'Protein', 'Gene', 'SOMAscan ID']
 
     def __init__(self, data_info:dict):
-        self.study = data_info['name']
-        self.study_info = data_info['study_info']
-        self.gwas_data = data_info['gwas_data']
-        self.filepath = data_info['filepath']
-        self.platform = data_info['platform']
-        self.protein_platform = data_info['protein_platform'][self.olink_neur_label]
-        self.omicstype = data_info['type']
-        self.samples = data_info['samples_info']
-        self.publication = data_info['publication']
-        self.genomebuild = data_info['genomebuild']
+        BulkStudyParser.__init__(self, data_info)
+        # UniProt IDs of the proteins of the Olink NEUR panel
+        self.protein_platform = set(data_info['protein_platform'][self.olink_neur_label])
         self.sep = ';' # Olink
         if self.platform.name == 'Somalogic':
             self.sep = '|'
 
 
-    def parse_performance_metric(self,score,efo,data_values,cohort_data,in_olink_neur):
-        ''' Parse performance and metric data '''
-        sample = None
-        extra = None
-        performance_model = None
-
-        cohort_name = cohort_data['name']
-        ancestry = cohort_data['ancestry']
-        type = cohort_data['vtype']
-
-        for sample_info in self.samples:
-            if sample_info['cohort'] == cohort_name and sample_info['ancestry'] == ancestry:
-                sample = sample_info['sample']
-                extra = sample_info['entities_count']+' genes'
-        if sample:
-            gwas_info = {}
-            platform_name = self.platform.name
-            gwas_data = self.gwas_data.data
-            # print(f'+ {platform_name} / {cohort_name}')
-            for platform_label in gwas_data.keys():
-                if platform_name == 'Olink':
-                    if self.olink_neur_label:
-                        platform_name == self.olink_neur_label
-                    else:
-                        platform_name = self.olink_other_label
-                    if cohort_name in gwas_data[platform_name].keys():
-                        gwas_info = gwas_data[platform_name][cohort_name]
-                        break
-                elif platform_name == platform_label:
-                    if cohort_name in gwas_data[platform_name].keys():
-                        gwas_info = gwas_data[platform_name][cohort_name]
-                        break
-
-
-            performance_data = PerformanceData(score,self.publication,sample,self.platform,efo,type,gwas_info,extra)
-            performance_data.add_metric(data_values)
-            performance_model = performance_data.create_model()
-
-        return performance_model
-
-
-    def parse_data(self):
-        df = pd.read_csv(self.filepath)
-
-        protein_platform = []
-
-
-        for index, row in df.iterrows():
-            # Protein info
-            protein_names = []
-            protein_ids = []
-            protein_name_entry = row['Protein']
-            protein_id_entry = row['UniProt ID']
-            if protein_name_entry and protein_name_entry not in [None,np.nan,'nan','']:
-                protein_names = protein_name_entry.split(self.sep)
-            if protein_id_entry and protein_id_entry not in [None,np.nan,'nan','']:
-                protein_ids = protein_id_entry.split(self.sep)
-
-            # Gene info
-            gene_names = []
-            gene_name_entry = row['Gene']
-            if gene_name_entry and gene_name_entry not in [None,np.nan,'nan','']:
-                gene_names = gene_name_entry.split(self.sep)
-
-            # Score info
-            score_id = row['OMICSPRED ID']
-            score_name = None
-            if 'SOMAscan ID' in row:
-                score_name = row['SOMAscan ID']
-            variants_number = row['#SNP']
-
-            print(f"- {score_id} | {','.join(protein_ids)} | {','.join(gene_names)}")
-
-            # Gene model
-            gene_models = []
-            for gene_name in gene_names:
-                gene_data = GeneData(name=gene_name)
-                gene_model = gene_data.create_model()
-                gene_models.append(gene_model)
-
-            # Protein model
-            protein_models = []
-            in_olink_neur = False
+    def get_gwas_info(self, cohort_name, olink_neur=False):
+        '''
+        Retrieve the GWAS information of a cohort for the current platform.
+        - olink_neur: for the Olink platform, use the GWAS data of the NEUR panel instead of the other panels
+        '''
+        gwas_info = {}
+        platform_name = self.platform.name
+        if platform_name == 'Olink':
+            if olink_neur:
+                platform_name = self.olink_neur_label
+            else:
+                platform_name = self.olink_other_label
+        gwas_data = self.gwas_data.data
+        if platform_name in gwas_data.keys():
+            if cohort_name in gwas_data[platform_name].keys():
+                gwas_info = gwas_data[platform_name][cohort_name]
+        return gwas_info
+
+
+    def get_performance_templates(self, efo):
+        '''
+        Build the Performance data shared by all the Scores, for each cohort of the study.
+        Olink: one list of Performance data per panel (NEUR or others), as their GWAS data differ.
+        Return type: list of dictionaries with the Performance data and the metric columns
+                     (Olink: dictionary of lists, by panel - True for the NEUR panel)
+        '''
+        if self.platform.name != 'Olink':
+            return BulkStudyParser.get_performance_templates(self, efo)
+        return { olink_neur: BulkStudyParser.get_performance_templates(self, efo, olink_neur=olink_neur) for olink_neur in (True, False) }
+
+
+    def create_performances(self, df, score_nums, templates, performance_buffer):
+        '''
+        Add the Performance and Metric models of a batch of rows to the write buffer.
+        Olink: the Scores with a protein of the NEUR panel use the Performance data of this panel.
+        Return type: number of Performance models added
+        '''
+        if self.platform.name != 'Olink':
+            return BulkStudyParser.create_performances(self, df, score_nums, templates, performance_buffer)
+        in_olink_neur = split_column(df['UniProt ID'], self.sep).map(lambda ids: any(x in self.protein_platform for x in ids)).to_numpy(dtype=bool)
+        count = 0
+        for olink_neur, rows in ((True, in_olink_neur), (False, ~in_olink_neur)):
+            if rows.any():
+                rows_nums = [score_num for score_num, in_rows in zip(score_nums, rows) if in_rows]
+                count += BulkStudyParser.create_performances(self, df[rows].reset_index(drop=True), rows_nums, templates[olink_neur], performance_buffer)
+        return count
+
+
+    def get_cohort_metric_columns(self, cohort):
+        metric_columns = BulkStudyParser.get_cohort_metric_columns(self, cohort)
+        # Specific case for ORCADES which is missing the Rho_pvalue data
+        if cohort == 'ORCADES':
+            del metric_columns['Rho_pvalue']
+        return metric_columns
+
+
+    def get_score_names(self, df):
+        if 'SOMAscan ID' in df.columns:
+            return df['SOMAscan ID']
+        return None
+
+
+    def resolve_entities(self, df):
+        ''' Retrieve/Create the Gene and Protein models, once per distinct gene/protein. '''
+        protein_names_list = split_column(df['Protein'], self.sep)
+        protein_ids_list = split_column(df['UniProt ID'], self.sep)
+        gene_names_list = split_column(df['Gene'], self.sep)
+
+        # Protein (name, UniProt ID) pairs of each row
+        rows_proteins = []
+        for protein_names, protein_ids in zip(protein_names_list, protein_ids_list):
             if protein_ids:
-                for index,protein_id in enumerate(protein_ids):
+                proteins = []
+                for index, protein_id in enumerate(protein_ids):
                     idx = 0
                     if len(protein_ids) == len(protein_names):
                         idx = index
-                    protein_data = ProteinData(name=protein_names[idx], external_id=protein_id)
-                    protein_model = protein_data.create_model()
-                    protein_models.append(protein_model)
-                    if protein_id in self.protein_platform:
-                        in_olink_neur = True
+                    proteins.append((protein_names[idx] if protein_names else None, protein_id))
+                rows_proteins.append(proteins)
+            elif protein_names:
+                rows_proteins.append([(protein_names[0], None)])
             else:
-                protein_data = ProteinData(name=protein_names[0])
-                protein_model = protein_data.create_model()
-                protein_models.append(protein_model)
-
-            # EFO model
-            efo_data = EFOData(self.study_info['tissue'])
-            efo_model = efo_data.create_model()
-
-            # Score model
-            method_name = self.study_info['method_name']
-            score_data = ScoreData(score_id,variants_number,self.publication,self.platform,self.genomebuild,method_name,score_name)
-            score_model = score_data.create_model()
-            score_model.save()
-
-            for gene_model in gene_models:
-                score_model.genes.add(gene_model)
-            for protein_model in protein_models:
-                score_model.proteins.add(protein_model)
-            # score_model.efos.add(efo_model)
-            score_model.save()
-
-            # Performance & Metric models
-            # - Training
-            cohort_internal_label = self.study_info['internal_label']
-            cohort_internal = self.study_info['internal_cohort']
-            training_values = {
-                'R2': row[f'{cohort_internal_label}_R2'],
-                'R2_pvalue': row[f'{cohort_internal_label}_R2_pvalue'],
-                'Rho': row[f'{cohort_internal_label}_Rho'],
-                'Rho_pvalue': row[f'{cohort_internal_label}_Rho_pvalue']
-            }
-            cohort_entry = self.study_info['sample_cohort_info'][cohort_internal]
-            self.parse_performance_metric(score_model,efo_model,training_values,cohort_entry,in_olink_neur)
-
-            # - Validations
-            for cohort in self.study_info['sample_cohort_info'].keys():
-                if cohort != cohort_internal:
-                    validation_values = {
-                        'R2': row[f'{cohort}_R2'],
-                        'R2_pvalue': row[f'{cohort}_R2_pvalue'],
-                        'Rho': row[f'{cohort}_Rho'],
-                        'MissingRate': row[f'{cohort}_MissingRate']
-                    }
-                    # Specific case for ORCADES which is missing the Rho_pvalue data
-                    if cohort != 'ORCADES':
-                        validation_values['Rho_pvalue'] = row[f'{cohort}_Rho_pvalue']
-                    cohort_entry = self.study_info['sample_cohort_info'][cohort]
-                    self.parse_performance_metric(score_model,efo_model,validation_values,cohort_entry,in_olink_neur)
+                rows_proteins.append([])
+
+        # Gene models
+        gene_map = self.identity_map.get_map(Gene)
+        genes = {}
+        for gene_name in dict.fromkeys([x for gene_names in gene_names_list for x in gene_names]):
+            gene_model = gene_map.find(name=gene_name)
+            if not gene_model:
+                gene_model = gene_map.add(Gene(name=gene_name))
+            genes[gene_name] = gene_model
+        gene_map.flush()
+
+        # Protein models
+        protein_map = self.identity_map.get_map(Protein)
+        proteins = {}
+        for protein_name, protein_id in dict.fromkeys([x for row_proteins in rows_proteins for x in row_proteins]):
+            protein_model = protein_map.find(name=protein_name, external_id=protein_id)
+            if not protein_model:
+                protein_model = protein_map.add(Protein(name=protein_name, external_id=protein_id, external_id_source='UniProt'))
+            proteins[(protein_name, protein_id)] = protein_model
+        protein_map.flush()
+
+        return {
+            'genes': [[genes[x].pk for x in gene_names] for gene_names in gene_names_list],
+            'proteins': [[proteins[x].pk for x in row_proteins] for row_proteins in rows_proteins]
+        }
@@ -0,0 +1,169 @@
+import json
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from imports.parsers.utils import is_empty
+
+
+class PublicationResolver():
+    """
+    Resolve the publication identifiers used by the GWAS parser:
+     - DOI => PubMed ID, using the Europe PMC REST API
+     - PubMed ID => GWAS Catalog study ID (GCST), using the GWAS Catalog REST API
+    The lookups are cached on disk (including the "not found" results), each identifier is only
+    requested once and the remaining lookups are run concurrently, using a pooled HTTP session.
+    In offline mode, only the cached lookups are used.
+    """
+
+    epmc_url = 'https://www.ebi.ac.uk/europepmc/webservices/rest/search'
+    gwas_url = 'https://www.ebi.ac.uk/gwas/rest/api/studies/search/findByPublicationIdPubmedId'
+    cache_types = ('doi', 'pmid')
+
+    def __init__(self, cache_path=None, offline=None, workers=8, timeout=30, epmc_url=None, gwas_url=None):
+        '''
+        - cache_path: JSON file of the cached lookups (default: OP_RESOLVER_CACHE setting, None to disable the cache file)
+        - offline: only read the cached lookups (default: OP_RESOLVER_OFFLINE setting)
+        - workers: maximum number of concurrent requests
+        - timeout: timeout of each request, in seconds
+        - epmc_url/gwas_url: alternative API endpoints (e.g. local stand-in services)
+        '''
+        self.cache_path = cache_path if cache_path is not None else getattr(settings, 'OP_RESOLVER_CACHE', None)
+        self.offline = offline if offline is not None else getattr(settings, 'OP_RESOLVER_OFFLINE', False)
+        self.workers = workers
+        self.timeout = timeout
+        if epmc_url:
+            self.epmc_url = epmc_url
+        if gwas_url:
+            self.gwas_url = gwas_url
+        self.session = None
+        self.lock = threading.Lock()
+        self.cache = self.load_cache()
+
+
+    def __getstate__(self):
+        ''' The HTTP session and the lock are not shared with other processes (e.g. parallel import). '''
+        state = self.__dict__.copy()
+        state['session'] = None
+        del state['lock']
+        return state
+
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+
+    def load_cache(self):
+        cache = { cache_type: {} for cache_type in self.cache_types }
+        if self.cache_path:
+            try:
+                with open(self.cache_path) as f:
+                    content = json.load(f)
+                for cache_type in self.cache_types:
+                    cache[cache_type].update(content.get(cache_type, {}))
+            except (FileNotFoundError, ValueError):
+                pass
+        return cache
+
+
+    def save_cache(self):
+        ''' Write the cache file atomically. '''
+        if not self.cache_path:
+            return
+        directory = os.path.dirname(os.path.abspath(self.cache_path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(self.cache, f, indent=1, sort_keys=True)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, self.cache_path)
+
+
+    def get_session(self):
+        if not self.session:
+            self.session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=self.workers, pool_maxsize=self.workers, max_retries=3)
+            self.session.mount('https://', adapter)
+            self.session.mount('http://', adapter)
+        return self.session
+
+
+    def fetch_pmid(self, doi):
+        ''' Query Europe PMC to retrieve the PubMed ID of a DOI (None for the preprints). '''
+        payload = { 'format': 'json', 'query': f'doi:{doi}' }
+        response = self.get_session().get(self.epmc_url, params=payload, timeout=self.timeout)
+        response.raise_for_status()
+        results_list = response.json()['resultList']['result']
+        if results_list:
+            result = results_list[0]
+            if result['pubType'] != 'preprint' and 'pmid' in result:
+                return result['pmid']
+        return None
+
+
+    def fetch_gcst_id(self, pmid):
+        ''' Query the GWAS Catalog to retrieve the first study ID of a publication. '''
+        response = self.get_session().get(self.gwas_url, params={ 'pubmedId': pmid }, timeout=self.timeout)
+        response.raise_for_status()
+        results_list = response.json()['_embedded']['studies']
+        if results_list and results_list[0]['accessionId']:
+            return results_list[0]['accessionId']
+        return None
+
+
+    def lookup(self, cache_type, fetch_function, identifiers):
+        '''
+        Resolve a list of identifiers, from the cache or concurrently from the remote API.
+        The missing identifiers (None, NaN or empty string) are not looked up.
+        The failed requests are not cached, so they are retried on the next run.
+        Return type: dictionary of resolved values (or None), by identifier
+        '''
+        cache = self.cache[cache_type]
+        # De-duplication of the identifiers, keeping their order (the missing identifiers, e.g. NaN or empty, are skipped)
+        identifiers = list(dict.fromkeys([str(x).strip() for x in identifiers if not is_empty(x)]))
+        missing = [x for x in identifiers if x not in cache]
+        if missing and self.offline:
+            print(f"  > Offline mode: {len(missing)} {cache_type} lookup(s) not found in the cache")
+        elif missing:
+            def fetch(identifier):
+                try:
+                    value = fetch_function(identifier)
+                except (requests.RequestException, ValueError, KeyError) as e:
+                    print(f"  > Error with the {cache_type} lookup of '{identifier}': {e}")
+                    return
+                with self.lock:
+                    cache[identifier] = value
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                list(executor.map(fetch, missing))
+            self.save_cache()
+        return { x: cache.get(x) for x in identifiers }
+
+
+    def resolve_pmids(self, dois):
+        ''' Return type: dictionary of PubMed IDs, by DOI '''
+        return self.lookup('doi', self.fetch_pmid, dois)
+
+
+    def resolve_gcst_ids(self, pmids):
+        ''' Return type: dictionary of GCST IDs, by PubMed ID '''
+        return self.lookup('pmid', self.fetch_gcst_id, pmids)
+
+
+    def resolve(self, dois):
+        '''
+        Resolve the PubMed ID and GWAS Catalog study ID of a list of DOIs.
+        Return type: dictionary of dictionaries ('pmid' and 'gcst_id'), by DOI
+        '''
+        pmids = self.resolve_pmids(dois)
+        gcst_ids = self.resolve_gcst_ids(pmids.values())
+        results = {}
+        for doi, pmid in pmids.items():
+            results[doi] = {
+                'pmid': pmid,
+                'gcst_id': gcst_ids.get(str(pmid)) if pmid else None
+            }
+        return results
@@ -0,0 +1,10 @@
+import numpy as np
+
+
+def is_empty(value):
+    ''' Check if a value read from the study file is missing (None, NaN or empty string). '''
+    if value is None:
+        return True
+    if isinstance(value, float) and np.isnan(value):
+        return True
+    return str(value).strip() in ['', 'nan']
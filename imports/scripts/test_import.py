@@ -1,13 +1,22 @@
+import time
+import django
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from django.db import connections
 from imports.parsers.gwas import GWASParser
+from imports.parsers.resolver import PublicationResolver
 from imports.parsers.summary import SummaryParser
 from imports.parsers.rnaseq import RNAseqParser
 from imports.parsers.protein import ProteinParser
 from imports.parsers.metabolite import MetaboliteParser
 from imports.parsers.data_content import *
+from imports.models.identity_map import import_session
 from omicspred.models import Publication, Platform
+from rest_api.snapshots import rebuild_table_snapshots
+from rest_api.cache import invalidate_cache
 
 
 genomebuild = 'GRCh37'
+default_workers = 4
 
 def add_publication():
 
@@ -43,52 +52,168 @@ def add_platform(platform_name,platform_type,extra_data):
         platform.save()
     return platform
 
-def run():
+def get_study_parser(study, data_info):
+    if study.startswith('Transcriptomics'):
+        return RNAseqParser(data_info)
+    elif study.startswith('Proteomics'):
+        return ProteinParser(data_info)
+    elif study.startswith('Metabolomics'):
+        return MetaboliteParser(data_info)
+    return None
+
+
+def prepare_study(study, path, gwas_data, publication, resume=False, delta=False):
+    '''
+    Import the summary of the study (cohorts & samples) and retrieve/create its platform.
+    Return type: dictionary of the study information used by the data parsers
+    '''
+    # Summary
+    summary_info = { 'name': study, 'filepath': f'{path}/{study}/sumarry.json'}
+    summary = SummaryParser(summary_info, studies[study]['sample_cohort_info'])
+    summary.parse_summary_file()
+    samples_info = summary.import_to_database()
+
+    # Data
+    platform = study.split('_',1)[1]
+    filename = study.split('_')[-1]
+    type = study.split('_')[0]
+    platform_model = add_platform(platform.replace('_',' '),type, studies[study])
+    return {
+        'name': study,
+        'study_info': studies[study],
+        'gwas_data': gwas_data,
+        'type': type,
+        'platform': platform_model,
+        'protein_platform': protein_platform,
+        'filepath': f'{path}/paper_data/{filename}.csv',
+        'samples_info': samples_info,
+        'publication': publication,
+        'genomebuild': genomebuild,
+        'resume': resume,
+        'delta': delta
+    }
+
+
+def import_study(study, data_info):
+    '''
+    Import the data of a study (Scores, Performances and Metrics).
+    Also used as task by the worker processes of the parallel import.
+    Return type: tuple (study name, duration in seconds)
+    '''
+    start_time = time.time()
+    parser = get_study_parser(study, data_info)
+    if parser:
+        parser.parse_data()
+    return study, time.time()-start_time
+
+
+def import_studies_parallel(studies_info, workers):
+    '''
+    Import the studies in parallel, one study per worker process (in the current process with a single worker).
+    The shared entities (Publication, Platform, Cohort, Sample, EFO and omics entities) must be created beforehand.
+    Return type: dictionary of import durations (None if the import failed), by study
+    '''
+    timings = {}
+    if connections['default'].vendor == 'sqlite' and workers > 1:
+        # SQLite doesn't support concurrent writes
+        print("  > SQLite database: studies imported one at a time")
+        workers = 1
+
+    def report(study, get_result):
+        try:
+            study, duration = get_result()
+            timings[study] = duration
+            print(f"  > {study} imported in {round(duration,1)}s")
+        except Exception as e:
+            timings[study] = None
+            print(f"  > Error with the import of {study}: {e}")
+
+    if workers == 1:
+        for study, data_info in studies_info.items():
+            report(study, lambda: import_study(study, data_info))
+        return timings
+
+    # The worker processes must open their own database connection
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as executor:
+        futures = { executor.submit(import_study, study, data_info): study for study, data_info in studies_info.items() }
+        for future in as_completed(futures):
+            report(futures[future], future.result)
+    return timings
+
+
+def refresh_rest_data(timings):
+    '''
+    Regenerate the precomputed REST tables and clear the cached REST responses, unless the import of a study failed
+    (the REST tables and responses are not rebuilt from partial data).
+    Return type: list of the studies which failed to import
+    '''
+    failed = [study for study, duration in timings.items() if duration is None]
+    if failed:
+        print(f"\n# Import failed for {', '.join(failed)}: table snapshots and cached REST responses not refreshed")
+    else:
+        rebuild_table_snapshots()
+        invalidate_cache()
+    return failed
+
+
+def run(*args):
+    '''
+    Script arguments (runscript --script-args):
+     - parallel: import the studies in parallel, in separate processes
+     - workers=<N>: number of worker processes for the parallel import (default: 4)
+     - offline: only use the cached DOI/PMID/GCST lookups (no network access)
+     - resume: resume the last import of each study from its last committed batch (the imported studies are skipped)
+     - delta: only import the new/changed rows of each study file (compared with the row fingerprints of the previous import),
+       and delete the Scores removed from the files
+    '''
+    parallel = 'parallel' in args
+    resume = 'resume' in args
+    delta = 'delta' in args
+    offline = True if 'offline' in args else None
+    workers = default_workers
+    for arg in args:
+        if arg.startswith('workers='):
+            workers = int(arg.split('=',1)[1])
 
     path = '/Users/lg10/Workspace/git/clone/OmicsPred/src/data'
+    start_time = time.time()
 
     print("# Fetch GWAS data")
     gwas_files = [f'{path}/paper_data/supplementary_tables_gwas.csv',f'{path}/paper_data/supplementary_tables_qc.csv']
-    gwas_data = GWASParser(gwas_files)
+    gwas_data = GWASParser(gwas_files, resolver=PublicationResolver(offline=offline))
     gwas_data.parse_files()
     #
     # print(f">> GWAS DATA:\n{gwas_data.data}")
 
 
-    publication = add_publication()
+    # Identity map of the entities (Cohort, EFO, omics entities...) shared by the studies
+    with import_session():
+        publication = add_publication()
+
+        timings = {}
+        if parallel:
+            # Shared entities, created sequentially
+            studies_info = {}
+            for study in studies.keys():
+                print(f'\n\n##### {study} - Shared entities #####\n')
+                studies_info[study] = prepare_study(study, path, gwas_data, publication, resume, delta)
+                get_study_parser(study, studies_info[study]).prepare_shared_entities()
+
+            print(f'\n\n##### Parallel import of {len(studies_info)} studies ({workers} workers) #####\n')
+            timings = import_studies_parallel(studies_info, workers)
+        else:
+            for study in studies.keys():
+                print(f'\n\n##### {study} #####\n')
+                data_info = prepare_study(study, path, gwas_data, publication, resume, delta)
+                study, duration = import_study(study, data_info)
+                timings[study] = duration
+
+    # Regenerate the precomputed REST tables and clear the cached REST responses
+    refresh_rest_data(timings)
 
+    print("\n# Import timings")
     for study in studies.keys():
-        print(f'\n\n##### {study} #####\n')
-        # Summary
-        summary_info = { 'name': study, 'filepath': f'{path}/{study}/sumarry.json'}
-        summary = SummaryParser(summary_info, studies[study]['sample_cohort_info'])
-        summary.parse_summary_file()
-        samples_info = summary.import_to_database()
-        # continue
-        
-        # Data
-        platform = study.split('_',1)[1]
-        filename = study.split('_')[-1]
-        type = study.split('_')[0]
-        platform_model = add_platform(platform.replace('_',' '),type, studies[study])
-        data_info = {
-            'name': study,
-            'study_info': studies[study],
-            'gwas_data': gwas_data,
-            'type': type,
-            'platform': platform_model,
-            'protein_platform': protein_platform,
-            'filepath': f'{path}/paper_data/{filename}.csv',
-            'samples_info': samples_info,
-            'publication': publication,
-            'genomebuild': genomebuild
-        }
-        if study.startswith('Transcriptomics'):
-            rnaseq = RNAseqParser(data_info)
-            rnaseq.parse_data()
-        elif study.startswith('Proteomics'):
-            protein = ProteinParser(data_info)
-            protein.parse_data()
-        elif study.startswith('Metabolomics'):
-            metabolite = MetaboliteParser(data_info)
-            metabolite.parse_data()
+        duration = timings.get(study)
+        print(f"  - {study}: {'failed' if duration is None else str(round(duration,1))+'s'}")
+    print(f"  Total: {round(time.time()-start_time,1)}s")
@@ -1,4 +1,5 @@
 from omicspred.models import Performance, Sample, Cohort
+from imports.models.matrix import ScoreMetricMatrixData
 
 
 def run():
@@ -21,3 +22,6 @@ def run():
         perf.cohort_label = cohort_label
         perf.save()
         print(f"PERF {perf.id}: {cohort_label} / {perf.cohort_label}")
+
+    # Update the denormalised cohort/metric estimates
+    ScoreMetricMatrixData().create_models()
@@ -0,0 +1,174 @@
+import random
+import time
+from django.db import transaction
+from django.db.models import Max
+from imports.models.metric import MetricData
+from imports.models.matrix import ScoreMetricMatrixData
+from omicspred.models import *
+
+
+class SyntheticDataGenerator():
+    """
+    Generate a synthetic OmicsPred database, with the same structure as the imported studies
+    (5 platforms, with their omics entities, Scores, Performances and Metrics), for tests and benchmarks.
+    The data are reproducible for a given seed and written with "bulk_create".
+    Beyond the 5 platforms templates, the platforms are repeated with a suffix (e.g. "Somalogic 2"),
+    and the extra cohorts ("COHORT1", "COHORT2", ...) are added to the evaluation cohorts of every platform.
+    """
+
+    # Platform name, type, full name, omics entity type and cohorts (the first one is the training cohort)
+    platforms = [
+        ('Metabolon', 'Metabolomics', 'Metabolon HD4', 'metabolite', ['INTERVAL','ORCADES','UKB']),
+        ('Nightingale', 'Metabolomics', 'Nightingale Health NMR', 'metabolite', ['INTERVAL','UKB','MEC']),
+        ('Olink', 'Proteomics', 'Olink Target', 'protein', ['INTERVAL','ORCADES']),
+        ('Somalogic', 'Proteomics', 'SomaScan v4', 'protein', ['INTERVAL','FENLAND','MEC']),
+        ('Illumina RNAseq', 'Transcriptomics', 'Illumina NovaSeq 6000', 'gene', ['INTERVAL','FENLAND'])
+    ]
+    pathways = {
+        'Lipid': ['Fatty Acid Metabolism', 'Sphingolipid Metabolism', 'Lysophospholipid'],
+        'Amino Acid': ['Tryptophan Metabolism', 'Urea cycle', 'Glutamate Metabolism'],
+        'Lipoprotein subclasses': ['Very large HDL', 'Small LDL']
+    }
+    tissue = { 'id': 'UBERON_0001969', 'label': 'blood plasma', 'url': 'http://purl.obolibrary.org/obo/UBERON_0001969' }
+
+    def __init__(self, scores_per_platform=1000, publications=1, platforms=5, extra_cohorts=0, seed=42, batch_size=2000, verbose=False):
+        self.scores_per_platform = scores_per_platform
+        self.publications_count = publications
+        self.platforms_count = platforms
+        self.extra_cohorts = [f'COHORT{i+1}' for i in range(extra_cohorts)]
+        self.random = random.Random(seed)
+        self.batch_size = batch_size
+        self.verbose = verbose
+        self.counts = {}
+        self.pathway_models = None
+
+
+    def log(self, msg):
+        if self.verbose:
+            print(msg)
+
+
+    def bulk_create(self, model, objects):
+        model.objects.bulk_create(objects, batch_size=self.batch_size)
+        self.counts[model.__name__] = self.counts.get(model.__name__, 0) + len(objects)
+        return objects
+
+
+    def create_references(self):
+        ''' Publications, EFO, Cohorts and Samples shared by the platforms. '''
+        self.publications = []
+        for i in range(self.publications_count):
+            publication, _ = Publication.objects.get_or_create(pmid=99999999-i, defaults={
+                'doi': f'10.0000/synthetic.{i}', 'journal': 'Synthetic Journal', 'firstauthor': 'Synthetic A', 'authors': 'Synthetic A, Synthetic B',
+                'title': f'Synthetic OmicsPred dataset {i+1}', 'date_publication': '2023-01-01', 'date_released': '2023-01-01'
+            })
+            self.publications.append(publication)
+        self.efo, _ = EFO.objects.get_or_create(id=self.tissue['id'], defaults={ 'label': self.tissue['label'], 'url': self.tissue['url'] })
+        self.samples = {}
+        cohort_names = dict.fromkeys([cohort for platform in self.platforms for cohort in platform[4]] + self.extra_cohorts)
+        for cohort_name in cohort_names:
+            cohort, _ = Cohort.objects.get_or_create(name_short=cohort_name, defaults={ 'name_full': cohort_name })
+            sample = Sample.objects.create(sample_number=self.random.randint(500, 50000), ancestry_broad='European')
+            sample.cohorts.set([cohort])
+            self.samples[cohort_name] = sample
+
+
+    def create_entities(self, entity_type, platform_name, count, suffix=''):
+        '''
+        Create the omics entities of a platform.
+        Return type: dictionary of lists of entity IDs, by Score field
+        '''
+        prefix = ''.join([x for x in platform_name if x.isalnum()]).upper()[:4] + suffix
+        if entity_type == 'gene':
+            genes = self.bulk_create(Gene, [Gene(name=f'{prefix}G{i}', external_id=f'ENSG{i:011d}', external_id_source='Ensembl') for i in range(count)])
+            return { 'genes': [[x.id] for x in genes] }
+        elif entity_type == 'protein':
+            genes = self.bulk_create(Gene, [Gene(name=f'{prefix}G{i}') for i in range(count)])
+            proteins = self.bulk_create(Protein, [Protein(name=f'{prefix} protein {i}', external_id=f'{prefix[0]}{i:05d}', external_id_source='UniProt', gene_id=gene.id) for i, gene in enumerate(genes)])
+            return { 'proteins': [[x.id] for x in proteins], 'genes': [[x.id] for x in genes] }
+        else:
+            # Pathways shared by the metabolomics platforms
+            if not self.pathway_models:
+                self.pathway_models = {}
+                for group, subgroups in self.pathways.items():
+                    self.pathway_models[group] = [Pathway(name=group)] + [Pathway(name=x) for x in subgroups]
+                self.bulk_create(Pathway, [x for group in self.pathway_models.values() for x in group])
+            pathways = self.pathway_models
+            metabolites = []
+            for i in range(count):
+                group = pathways[self.random.choice(list(pathways.keys()))]
+                metabolites.append(Metabolite(
+                    name=f'{prefix} metabolite {i}', external_id=f'{prefix}{i}', external_id_source=platform_name,
+                    pathway_group_id=group[0].id, pathway_subgroup_id=self.random.choice(group[1:]).id
+                ))
+            self.bulk_create(Metabolite, metabolites)
+            return { 'metabolites': [[x.id] for x in metabolites] }
+
+
+    def create_metrics(self, performance, training):
+        metrics = []
+        for metric_type in ('R2', 'Rho'):
+            estimate = round(self.random.uniform(0.01, 0.9), 6)
+            pvalue = None if training else self.random.uniform(1e-50, 0.05)
+            metric_data = MetricData(metric_type, estimate, pvalue)
+            metric_data.set_names()
+            metrics.append(Metric(performance_id=performance.id, **metric_data.data))
+        return metrics
+
+
+    def create_platform(self, platform_name, platform_type, full_name, entity_type, cohorts, first_num, suffix=''):
+        platform = Platform.objects.create(name=f'{platform_name} {suffix}'.strip(), full_name=full_name, version='1.0', technic=platform_type, type=platform_type)
+        entities = self.create_entities(entity_type, platform_name, self.scores_per_platform, suffix)
+
+        scores = []
+        for i in range(self.scores_per_platform):
+            score = Score(
+                trait_reported=f'{platform.name} trait {i}', method_name='Bayesian Ridge', variants_number=self.random.randint(1, 5000),
+                variants_genomebuild='GRCh37', date_released='2023-01-01', publication=self.publications[i % len(self.publications)], platform=platform
+            )
+            score.set_score_ids(first_num+i)
+            scores.append(score)
+        self.bulk_create(Score, scores)
+
+        for field_name, entity_ids in entities.items():
+            field = Score._meta.get_field(field_name)
+            through = field.remote_field.through
+            score_col = f'{field.m2m_field_name()}_id'
+            entity_col = f'{field.m2m_reverse_field_name()}_id'
+            links = [through(**{ score_col: score.num, entity_col: entity_id }) for score, ids in zip(scores, entity_ids) for entity_id in ids]
+            through.objects.bulk_create(links, batch_size=self.batch_size)
+
+        performances = []
+        for score in scores:
+            for index, cohort in enumerate(cohorts):
+                performances.append(Performance(
+                    score_id=score.num, publication_id=score.publication_id, sample=self.samples[cohort], platform=platform, efo=self.efo,
+                    eval_type='T' if index == 0 else 'EV', cohort_label=cohort
+                ))
+        self.bulk_create(Performance, performances)
+        metrics = []
+        for performance in performances:
+            metrics.extend(self.create_metrics(performance, performance.eval_type == 'T'))
+        self.bulk_create(Metric, metrics)
+
+        ScoreMetricMatrixData(platform=platform).create_models()
+        return platform
+
+
+    @transaction.atomic
+    def generate(self):
+        '''
+        Create the synthetic data.
+        Return type: dictionary of the number of models created, by model name
+        '''
+        start_time = time.time()
+        self.create_references()
+        first_num = (Score.objects.aggregate(max_num=Max('num'))['max_num'] or 0) + 1
+        for i in range(self.platforms_count):
+            platform_name, platform_type, full_name, entity_type, cohorts = self.platforms[i % len(self.platforms)]
+            suffix = str(i // len(self.platforms) + 1) if i >= len(self.platforms) else ''
+            platform = self.create_platform(platform_name, platform_type, full_name, entity_type, cohorts+self.extra_cohorts, first_num, suffix)
+            first_num += self.scores_per_platform
+            self.log(f'  > {platform.name}: {self.scores_per_platform} scores')
+        self.log(f'  > Generated in {round(time.time()-start_time,1)}s: {self.counts}')
+        return self.counts
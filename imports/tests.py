@@ -1,3 +1,623 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+from unittest import mock
+import numpy as np
+import pandas as pd
+import requests
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from imports.models.identity_map import import_session
+from imports.models.metric import MetricData
+from imports.models.omics import GeneData
+from imports.models.performance import PerformanceBuffer, PerformanceData
+from imports.parsers.data_content import method_name, internal_label, studies
+from imports.parsers.rnaseq import RNAseqParser
+from imports.parsers.protein import ProteinParser
+from imports.parsers.metabolite import MetaboliteParser
+from imports.parsers.gwas import GWASParser
+from imports.parsers.resolver import PublicationResolver
+from imports.scripts.test_import import import_studies_parallel, refresh_rest_data
+from omicspred.models import *
+from rest_api.cache import invalidate_cache
+from rest_api.entity_index import entity_score_index
 
-# Create your tests here.
+
+class GWASData():
+    """ GWAS data of the studies, by platform and cohort (see GWASParser), without the DOI/PMID/GCST lookups """
+
+    def __init__(self, data=None):
+        self.data = data if data else {}
+
+
+class StudyImportTestCase(TestCase):
+    """
+    Import of small study files, written in a temporary directory, with the bulk parsers.
+    The studies have one training cohort (INTERVAL) and one validation cohort (ORCADES).
+    """
+
+    sample_cohort_info = {
+        'INTERVAL': { 'name': 'INTERVAL', 'ancestry': 'European', 'vtype': 'T' },
+        'ORCADES':  { 'name': 'ORCADES', 'ancestry': 'European', 'vtype': 'EV' }
+    }
+    olink_neur_proteins = ['Q9BZZ2', 'Q8TD46']
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.publication = Publication.objects.create(pmid=36991119, doi='10.1038/s41586-023-05844-9', journal='Nature', firstauthor='Xu Y', authors='Xu Y', title='Title', date_publication='2023-03-29')
+        cls.samples_info = []
+        for cohort_info in cls.sample_cohort_info.values():
+            cohort = Cohort.objects.create(name_short=cohort_info['name'], name_full=cohort_info['name'], url='')
+            sample = Sample.objects.create(sample_number=1000, ancestry_broad=cohort_info['ancestry'])
+            sample.cohorts.set([cohort])
+            cls.samples_info.append({ 'cohort': cohort_info['name'], 'ancestry': cohort_info['ancestry'], 'sample': sample, 'entities_count': '100' })
+
+
+    def setUp(self):
+        data_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(data_dir.cleanup)
+        self.data_dir = data_dir.name
+
+
+    @staticmethod
+    def study_row(score_num, internal=(0.5, 0.4), validation=(0.3, 0.2, 0.01), **columns):
+        '''
+        Row of a study file.
+        - internal: R2 and Rho estimates of the training cohort
+        - validation: R2, Rho and MissingRate estimates of the validation cohort (ORCADES)
+        - columns: omics entities columns
+        '''
+        row = { 'OMICSPRED ID': f'OPGS{score_num:06d}', '#SNP': 100+score_num, **columns }
+        for label, values in ((internal_label, internal), ('ORCADES', validation)):
+            row[f'{label}_R2'] = values[0]
+            row[f'{label}_R2_pvalue'] = 1e-10
+            row[f'{label}_Rho'] = values[1]
+            row[f'{label}_Rho_pvalue'] = 1e-8
+            if len(values) > 2:
+                row[f'{label}_MissingRate'] = values[2]
+        return row
+
+
+    def write_study(self, filename, rows):
+        ''' Write the rows of a study file. Return type: path of the file '''
+        filepath = os.path.join(self.data_dir, f'{filename}.csv')
+        pd.DataFrame(rows).to_csv(filepath, index=False)
+        return filepath
+
+
+    def get_data_info(self, study, filepath, gwas_data=None, **kwargs):
+        ''' Study information used by the parsers (see prepare_study in imports/scripts/test_import.py). '''
+        type, platform_name = study.split('_', 1)
+        platform, _ = Platform.objects.get_or_create(name=platform_name.replace('_',' '), type=type)
+        study_info = {
+            'tissue': studies[study]['tissue'],
+            'method_name': method_name,
+            'internal_cohort': 'INTERVAL',
+            'internal_label': internal_label,
+            'sample_cohort_info': self.sample_cohort_info
+        }
+        return {
+            'name': study,
+            'study_info': study_info,
+            'gwas_data': GWASData(gwas_data),
+            'type': type,
+            'platform': platform,
+            'protein_platform': { ProteinParser.olink_neur_label: self.olink_neur_proteins },
+            'filepath': filepath,
+            'samples_info': self.samples_info,
+            'publication': self.publication,
+            'genomebuild': 'GRCh37',
+            **kwargs
+        }
+
+
+    def import_study(self, parser_class, study, rows, filename=None, **kwargs):
+        filepath = self.write_study(filename if filename else study, rows)
+        parser = parser_class(self.get_data_info(study, filepath, **kwargs))
+        parser.parse_data()
+        return parser
+
+
+    @staticmethod
+    def get_metrics(score_id):
+        '''
+        Metrics of a Score, by cohort label and metric short name.
+        Return type: dictionary of (estimate, pvalue), by cohort label and metric name
+        '''
+        metrics = {}
+        for performance in Performance.objects.filter(score__id=score_id).prefetch_related('performance_metric'):
+            metrics[performance.cohort_label] = { x.name_short: (x.estimate, x.pvalue) for x in performance.performance_metric.all() }
+        return metrics
+
+
+class BulkStudyParserTest(StudyImportTestCase):
+    """ Score, Performance and Metric models imported by the bulk parsers, with the missing (NaN) and zero metrics """
+
+    def test_rnaseq(self):
+        rows = [
+            self.study_row(1, **{ 'Ensembl ID': 'ENSG00000130203', 'Gene': 'APOE' }),
+            # Metric equal to 0 kept, validation metrics missing: empty Performance kept (RNAseq)
+            self.study_row(2, internal=(0, 0.1), validation=(np.nan, np.nan, np.nan), **{ 'Ensembl ID': 'ENSG00000084674', 'Gene': 'APOB' }),
+            # Same gene as the first row
+            self.study_row(3, internal=(np.nan, 0.2), **{ 'Ensembl ID': 'ENSG00000130203', 'Gene': 'APOE' })
+        ]
+        self.import_study(RNAseqParser, 'Transcriptomics_Illumina_RNAseq', rows)
+
+        self.assertEqual(Score.objects.count(), 3)
+        self.assertEqual(Gene.objects.count(), 2)
+        score = Score.objects.get(id='OPGS000003')
+        self.assertEqual(score.variants_number, 103)
+        self.assertEqual(score.platform.name, 'Illumina RNAseq')
+        self.assertEqual([(x.name, x.external_id_source) for x in score.genes.all()], [('APOE', 'Ensembl')])
+        self.assertEqual(Performance.objects.count(), 6)
+
+        metrics = self.get_metrics('OPGS000001')
+        self.assertEqual(metrics['INTERVAL'], { 'R2': (0.5, 1e-10), 'Rho': (0.4, 1e-8) })
+        self.assertEqual(metrics['ORCADES'], { 'R2': (0.3, 1e-10), 'Rho': (0.2, 1e-8), 'Missing Rate': (0.01, None) })
+        metrics = self.get_metrics('OPGS000002')
+        self.assertEqual(metrics['INTERVAL'], { 'R2': (0, 1e-10), 'Rho': (0.1, 1e-8) })
+        self.assertEqual(metrics['ORCADES'], {})
+        metrics = self.get_metrics('OPGS000003')
+        self.assertEqual(metrics['INTERVAL'], { 'Rho': (0.2, 1e-8) })
+
+        matrix = ScoreMetricMatrix.objects.get(score__id='OPGS000002').metrics
+        self.assertEqual([(x['cohort_label'], x['metric'], x['estimate']) for x in matrix if x['cohort_label'] == 'INTERVAL'], [('INTERVAL', 'R2', 0), ('INTERVAL', 'Rho', 0.1)])
+
+
+    def test_metabolite(self):
+        metabolite_columns = { 'Metabolon ID': '35', 'Biochemical Name': 'serotonin', 'Super Pathway': 'Amino Acid', 'Sub Pathway': 'Tryptophan Metabolism' }
+        rows = [
+            self.study_row(11, **metabolite_columns),
+            # Validation metrics missing: no Performance (Metabolomics)
+            self.study_row(12, internal=(0, np.nan), validation=(np.nan, np.nan, np.nan), **{ **metabolite_columns, 'Metabolon ID': '36', 'Biochemical Name': 'tryptophan' })
+        ]
+        self.import_study(MetaboliteParser, 'Metabolomics_Metabolon', rows)
+
+        self.assertEqual(Score.objects.count(), 2)
+        self.assertEqual(Pathway.objects.count(), 2)
+        metabolite = Score.objects.get(id='OPGS000012').metabolites.get()
+        self.assertEqual((metabolite.name, metabolite.external_id, metabolite.external_id_source), ('tryptophan', '36', 'Metabolon'))
+        self.assertEqual((metabolite.pathway_group.name, metabolite.pathway_subgroup.name), ('Amino Acid', 'Tryptophan Metabolism'))
+        self.assertEqual(Performance.objects.count(), 3)
+        self.assertEqual(self.get_metrics('OPGS000012'), { 'INTERVAL': { 'R2': (0, 1e-10) } })
+        self.assertEqual(len(self.get_metrics('OPGS000011')['ORCADES']), 3)
+
+
+    def test_protein_somalogic(self):
+        rows = [
+            self.study_row(21, **{ 'SOMAscan ID': 'SL000001', 'UniProt ID': 'P02649|P04114', 'Protein': 'APOE|APOB', 'Gene': 'APOE|APOB' }),
+            self.study_row(22, internal=(0.6, np.nan), **{ 'SOMAscan ID': np.nan, 'UniProt ID': 'P02649', 'Protein': 'APOE', 'Gene': 'APOE' })
+        ]
+        self.import_study(ProteinParser, 'Proteomics_Somalogic', rows)
+
+        score = Score.objects.get(id='OPGS000021')
+        self.assertEqual(score.name, 'SL000001')
+        self.assertEqual(sorted(score.proteins.values_list('name', 'external_id')), [('APOB', 'P04114'), ('APOE', 'P02649')])
+        self.assertEqual(sorted(score.genes.values_list('name', flat=True)), ['APOB', 'APOE'])
+        score = Score.objects.get(id='OPGS000022')
+        self.assertIsNone(score.name)
+        self.assertEqual(Protein.objects.count(), 2)
+        self.assertEqual(Performance.objects.count(), 4)
+        self.assertEqual(self.get_metrics('OPGS000022')['INTERVAL'], { 'R2': (0.6, 1e-10) })
+
+
+    def test_protein_olink(self):
+        gwas_data = {
+            ProteinParser.olink_neur_label: { 'ORCADES': { 'doi': '10.1/neur' } },
+            ProteinParser.olink_other_label: { 'ORCADES': { 'doi': '10.1/other' } }
+        }
+        rows = [
+            self.study_row(31, **{ 'UniProt ID': 'Q9BZZ2', 'Protein': 'SIGLEC1', 'Gene': 'SIGLEC1' }),
+            self.study_row(32, **{ 'UniProt ID': 'P05231', 'Protein': 'IL6', 'Gene': 'IL6' })
+        ]
+        self.import_study(ProteinParser, 'Proteomics_Olink', rows, gwas_data=gwas_data)
+
+        self.assertEqual(Performance.objects.count(), 4)
+        self.assertEqual(Performance.objects.get(score__id='OPGS000031', cohort_label='ORCADES').source_doi, '10.1/neur')
+        self.assertEqual(Performance.objects.get(score__id='OPGS000032', cohort_label='ORCADES').source_doi, '10.1/other')
+        self.assertIsNone(Performance.objects.get(score__id='OPGS000032', cohort_label='INTERVAL').source_doi)
+        # ORCADES has no Rho p-value (Olink)
+        self.assertEqual(self.get_metrics('OPGS000031')['ORCADES']['Rho'], (0.2, None))
+
+
+    def test_performance_template(self):
+        sample = self.samples_info[1]['sample']
+        platform = Platform.objects.create(name='Olink', type='Proteomics')
+        performance_data = PerformanceData.cohort_template(self.publication, sample, platform, None, 'EV', { 'doi': '10.1/neur' })
+        self.assertEqual(performance_data.data, {
+            'publication': self.publication, 'sample': sample, 'platform': platform, 'efo': None, 'eval_type': 'EV',
+            'source_doi': '10.1/neur', 'cohort_label': 'ORCADES'
+        })
+
+
+class IdentityMapTest(StudyImportTestCase):
+    """ Entities retrieved once from the database per import session, whatever the case of their names/IDs """
+
+    @staticmethod
+    def count_gene_queries(queries):
+        return len([x for x in queries if x['sql'].startswith('SELECT') and 'FROM "omicspred_gene"' in x['sql']])
+
+
+    def test_entity_seen_twice(self):
+        gene = Gene.objects.create(name='APOE', external_id='ENSG00000130203')
+        with CaptureQueriesContext(connection) as queries:
+            with import_session():
+                models = [
+                    GeneData('ENSG00000130203', 'APOE').create_model(),
+                    GeneData(None, 'apoe').create_model(),
+                    # New entity, indexed when saved
+                    GeneData('ENSG00000084674', 'APOB').create_model(),
+                    GeneData('ENSG00000084674', None).create_model()
+                ]
+        self.assertEqual(self.count_gene_queries(queries), 1)
+        self.assertEqual([x.pk for x in models[:2]], [gene.pk, gene.pk])
+        self.assertEqual(models[2].pk, models[3].pk)
+        self.assertEqual(Gene.objects.count(), 2)
+
+        # Without import session: one lookup per entity
+        with CaptureQueriesContext(connection) as queries:
+            GeneData('ENSG00000130203', 'APOE').create_model()
+            GeneData(None, 'apoe').create_model()
+        self.assertEqual(self.count_gene_queries(queries), 2)
+
+
+    def test_import_session(self):
+        rows = [self.study_row(1, **{ 'Ensembl ID': 'ENSG00000130203', 'Gene': 'APOE' })]
+        with CaptureQueriesContext(connection) as queries:
+            with import_session():
+                self.import_study(RNAseqParser, 'Transcriptomics_Illumina_RNAseq', rows)
+                rows.append(self.study_row(2, **{ 'Ensembl ID': 'ENSG00000130203', 'Gene': 'apoe' }))
+                self.import_study(RNAseqParser, 'Transcriptomics_Illumina_RNAseq', rows)
+        # Gene table loaded once for the two imports
+        self.assertEqual(self.count_gene_queries(queries), 1)
+        self.assertEqual(Gene.objects.count(), 1)
+        self.assertEqual(sorted(Score.objects.filter(genes__name='APOE').values_list('id', flat=True)), ['OPGS000001', 'OPGS000002'])
+
+
+class PerformanceBufferTest(StudyImportTestCase):
+    """ Performances and Metrics written in bulk, when the buffer reaches its batch size and when it is flushed at the end of the import """
+
+    @staticmethod
+    def count_inserts(queries, table):
+        return len([x for x in queries if x['sql'].startswith(f'INSERT INTO "{table}"')])
+
+
+    def test_flush(self):
+        self.import_study(RNAseqParser, 'Transcriptomics_Illumina_RNAseq', [self.study_row(1, **{ 'Ensembl ID': 'ENSG00000130203', 'Gene': 'APOE' })])
+        score = Score.objects.get()
+        Performance.objects.all().delete()
+        performance_buffer = PerformanceBuffer(batch_size=2)
+        for i in range(3):
+            performance = Performance(score=score, publication=self.publication, sample=self.samples_info[0]['sample'], platform=score.platform, cohort_label=f'C{i}')
+            performance_buffer.add_model(performance, [MetricData('R2', 0.5, 1e-5), MetricData('Rho', 0.4)])
+            self.assertEqual(Performance.objects.count(), 0 if i == 0 else 2)
+        # Batch size reached: Performances and their Metrics written
+        self.assertEqual(Metric.objects.count(), 4)
+        self.assertEqual(len(performance_buffer.pending), 1)
+
+        performances = performance_buffer.flush()
+        self.assertEqual([x.cohort_label for x in performances], ['C2'])
+        self.assertEqual((performance_buffer.performances_count, performance_buffer.metrics_count), (3, 6))
+        self.assertEqual(Metric.objects.filter(performance=performances[0]).count(), 2)
+        self.assertEqual(len(performance_buffer.pending), 0)
+
+
+    def test_import_chunks(self):
+        rows = [self.study_row(num, **{ 'Ensembl ID': 'ENSG00000130203', 'Gene': 'APOE' }) for num in range(1, 6)]
+        with mock.patch.object(RNAseqParser, 'batch_size', 4):
+            with CaptureQueriesContext(connection) as queries:
+                self.import_study(RNAseqParser, 'Transcriptomics_Illumina_RNAseq', rows)
+        # Chunks of 4 and 1 rows: 8 Performances written when the batch size is reached (2 inserts), 2 by the flush at the end of the last chunk
+        self.assertEqual(self.count_inserts(queries, 'omicspred_performance'), 3)
+        self.assertEqual(Performance.objects.count(), 10)
+        self.assertEqual(Metric.objects.count(), 25)
+
+
+class ImportRunTest(StudyImportTestCase):
+    """ Import of a study resumed from the last committed chunk of rows after a failure, or restarted when the study file changed """
+
+    study = 'Transcriptomics_Illumina_RNAseq'
+    genes = { 'Ensembl ID': 'ENSG00000130203', 'Gene': 'APOE' }
+
+    def import_failed(self, rows):
+        ''' Import a study file by chunks of 2 rows, failing on the second chunk. '''
+        create_performances = RNAseqParser.create_performances
+        calls = []
+        def fail_second_chunk(parser, *args):
+            calls.append(args)
+            if len(calls) == 2:
+                raise ValueError('Import error')
+            return create_performances(parser, *args)
+        with mock.patch.object(RNAseqParser, 'create_performances', autospec=True, side_effect=fail_second_chunk):
+            with self.assertRaises(ValueError):
+                self.import_study(RNAseqParser, self.study, rows)
+
+
+    def assertPerformances(self, score_ids):
+        ''' One Performance per Score and cohort, with its metrics. '''
+        performances = list(Performance.objects.values_list('score__id', 'cohort_label'))
+        self.assertEqual(sorted(performances), sorted([(x, y) for x in score_ids for y in ('INTERVAL', 'ORCADES')]))
+        self.assertEqual(Metric.objects.count(), len(score_ids)*5)
+
+
+    def test_resume(self):
+        rows = [self.study_row(num, **self.genes) for num in range(1, 6)]
+        with mock.patch.object(RNAseqParser, 'batch_size', 2):
+            self.import_failed(rows)
+            import_run = ImportRun.objects.get()
+            self.assertEqual((import_run.status, import_run.last_row, import_run.error), ('F', 2, 'Import error'))
+            self.assertPerformances(['OPGS000001', 'OPGS000002'])
+
+            self.import_study(RNAseqParser, self.study, rows, resume=True)
+        import_run = ImportRun.objects.get()
+        self.assertEqual((import_run.status, import_run.last_row, import_run.error), ('C', 5, None))
+        score_ids = [f'OPGS{num:06d}' for num in range(1, 6)]
+        self.assertPerformances(score_ids)
+        self.assertEqual(sorted(ScoreMetricMatrix.objects.values_list('score__id', flat=True)), score_ids)
+
+        # Completed import: skipped
+        with mock.patch.object(RNAseqParser, 'create_scores') as create_scores:
+            self.import_study(RNAseqParser, self.study, rows, resume=True)
+        create_scores.assert_not_called()
+        self.assertEqual(ImportRun.objects.count(), 1)
+
+
+    def test_file_changed(self):
+        rows = [self.study_row(num, **self.genes) for num in range(1, 6)]
+        with mock.patch.object(RNAseqParser, 'batch_size', 2):
+            self.import_failed(rows)
+            # New row in the study file: import restarted from the first row
+            rows.append(self.study_row(6, **self.genes))
+            self.import_study(RNAseqParser, self.study, rows, resume=True)
+        self.assertEqual(list(ImportRun.objects.order_by('id').values_list('status', 'last_row')), [('F', 2), ('C', 6)])
+        self.assertPerformances([f'OPGS{num:06d}' for num in range(1, 7)])
+
+
+    def test_upsert(self):
+        rows = [self.study_row(1, **self.genes), self.study_row(2, **self.genes)]
+        self.import_study(RNAseqParser, self.study, rows)
+        performance_ids = set(Performance.objects.filter(score__id='OPGS000001').values_list('id', flat=True))
+
+        rows[0] = self.study_row(1, internal=(0.7, 0.6), **{ 'Ensembl ID': 'ENSG00000084674', 'Gene': 'APOB' })
+        self.import_study(RNAseqParser, self.study, rows)
+        self.assertEqual(Score.objects.count(), 2)
+        # Performances and omics entities links of the existing Scores replaced
+        self.assertPerformances(['OPGS000001', 'OPGS000002'])
+        self.assertFalse(performance_ids & set(Performance.objects.values_list('id', flat=True)))
+        self.assertEqual(list(Score.objects.get(id='OPGS000001').genes.values_list('name', flat=True)), ['APOB'])
+        self.assertEqual(list(Score.objects.get(id='OPGS000002').genes.values_list('name', flat=True)), ['APOE'])
+        self.assertEqual(Score.genes.through.objects.count(), 2)
+        self.assertEqual(self.get_metrics('OPGS000001')['INTERVAL'], { 'R2': (0.7, 1e-10), 'Rho': (0.6, 1e-8) })
+
+
+class DeltaImportTest(StudyImportTestCase):
+    """ Delta import of a study: only the new/changed rows of the study file imported, the Scores of the removed rows deleted """
+
+    study = 'Transcriptomics_Illumina_RNAseq'
+
+    def get_matrix(self, score_id):
+        ''' Return type: dictionary of estimates, by cohort label and metric '''
+        matrix = ScoreMetricMatrix.objects.get(score__id=score_id).metrics
+        return { (x['cohort_label'], x['metric']): x['estimate'] for x in matrix }
+
+
+    def test_delta(self):
+        rows = [self.study_row(num, **{ 'Ensembl ID': 'ENSG00000130203', 'Gene': 'APOE' }) for num in range(1, 4)]
+        self.import_study(RNAseqParser, self.study, rows)
+        performance_ids = set(Performance.objects.filter(score__id='OPGS000001').values_list('id', flat=True))
+        fingerprints = dict(ScoreFingerprint.objects.values_list('score__id', 'fingerprint'))
+        self.assertEqual(len(fingerprints), 3)
+
+        # Second row changed, third row removed
+        rows[1] = self.study_row(2, internal=(0.7, 0.6), **{ 'Ensembl ID': 'ENSG00000130203', 'Gene': 'APOE' })
+        self.import_study(RNAseqParser, self.study, rows[:2], delta=True)
+
+        self.assertEqual(sorted(Score.objects.values_list('id', flat=True)), ['OPGS000001', 'OPGS000002'])
+        self.assertFalse(Performance.objects.filter(score__num=3).exists())
+        self.assertEqual(Metric.objects.count(), 10)
+        # Unchanged row not imported again
+        self.assertEqual(set(Performance.objects.filter(score__id='OPGS000001').values_list('id', flat=True)), performance_ids)
+        new_fingerprints = dict(ScoreFingerprint.objects.values_list('score__id', 'fingerprint'))
+        self.assertEqual(new_fingerprints['OPGS000001'], fingerprints['OPGS000001'])
+        self.assertNotEqual(new_fingerprints['OPGS000002'], fingerprints['OPGS000002'])
+        self.assertNotIn('OPGS000003', new_fingerprints)
+
+        self.assertEqual(self.get_metrics('OPGS000002')['INTERVAL'], { 'R2': (0.7, 1e-10), 'Rho': (0.6, 1e-8) })
+        self.assertEqual(sorted(ScoreMetricMatrix.objects.values_list('score__id', flat=True)), ['OPGS000001', 'OPGS000002'])
+        self.assertEqual((self.get_matrix('OPGS000001')[('INTERVAL', 'R2')], self.get_matrix('OPGS000002')[('INTERVAL', 'R2')]), (0.5, 0.7))
+        self.assertEqual(self.get_matrix('OPGS000002')[('ORCADES', 'Rho')], 0.2)
+
+        # Same file: nothing to import
+        with mock.patch.object(RNAseqParser, 'create_scores') as create_scores:
+            self.import_study(RNAseqParser, self.study, rows[:2], delta=True)
+        create_scores.assert_not_called()
+        self.assertEqual(Performance.objects.count(), 4)
+
+
+class ParallelImportTest(StudyImportTestCase):
+    """ Import of several studies by the worker processes (single worker: current process), failed imports reported """
+
+    def test_import_studies(self):
+        studies_info = {
+            'Transcriptomics_Illumina_RNAseq': self.get_data_info('Transcriptomics_Illumina_RNAseq', self.write_study('rnaseq', [
+                self.study_row(1, **{ 'Ensembl ID': 'ENSG00000130203', 'Gene': 'APOE' }),
+                self.study_row(2, **{ 'Ensembl ID': 'ENSG00000084674', 'Gene': 'APOB' })
+            ])),
+            'Metabolomics_Metabolon': self.get_data_info('Metabolomics_Metabolon', self.write_study('metabolon', [
+                self.study_row(11, **{ 'Metabolon ID': '35', 'Biochemical Name': 'serotonin', 'Super Pathway': 'Amino Acid', 'Sub Pathway': 'Tryptophan Metabolism' })
+            ])),
+            # Missing study file
+            'Proteomics_Somalogic': self.get_data_info('Proteomics_Somalogic', os.path.join(self.data_dir, 'missing.csv'))
+        }
+        timings = import_studies_parallel(studies_info, 1)
+
+        self.assertEqual(sorted(timings.keys()), sorted(studies_info.keys()))
+        self.assertIsNone(timings['Proteomics_Somalogic'])
+        self.assertTrue(all(timings[x] >= 0 for x in ('Transcriptomics_Illumina_RNAseq', 'Metabolomics_Metabolon')))
+        self.assertEqual(sorted(Score.objects.values_list('id', 'platform__name')), [
+            ('OPGS000001', 'Illumina RNAseq'), ('OPGS000002', 'Illumina RNAseq'), ('OPGS000011', 'Metabolon')
+        ])
+        self.assertEqual(Performance.objects.count(), 6)
+
+        # REST tables and responses not refreshed from partial data
+        with mock.patch('imports.scripts.test_import.rebuild_table_snapshots') as rebuild, mock.patch('imports.scripts.test_import.invalidate_cache') as invalidate:
+            self.assertEqual(refresh_rest_data(timings), ['Proteomics_Somalogic'])
+            rebuild.assert_not_called()
+            invalidate.assert_not_called()
+            del timings['Proteomics_Somalogic']
+            self.assertEqual(refresh_rest_data(timings), [])
+            rebuild.assert_called_once()
+            invalidate.assert_called_once()
+
+
+class EntityScoreIndexTest(StudyImportTestCase):
+    """ Index of the Scores by omics entity (/rest/score/map), rebuilt after an import run by another process """
+
+    url = '/rest/score/map?type=gene&queries=apoe,ENSG00000084674'
+
+    def setUp(self):
+        StudyImportTestCase.setUp(self)
+        caches[settings.OP_CACHE_ALIAS].clear()
+        entity_score_index.version = None
+
+
+    def import_genes(self, genes):
+        rows = [self.study_row(num, **{ 'Ensembl ID': gene_id, 'Gene': gene_name }) for num, (gene_id, gene_name) in enumerate(genes, 1)]
+        self.import_study(RNAseqParser, 'Transcriptomics_Illumina_RNAseq', rows)
+
+
+    @override_settings(OP_DATA_VERSION_TTL=0)
+    def test_import(self):
+        self.import_genes([('ENSG00000130203', 'APOE')])
+        entity_score_index.get_index()
+        self.assertEqual(self.client.get(self.url).json(), { 'apoe': ['OPGS000001'], 'ENSG00000084674': [] })
+        # Import without invalidating the cache of the web process
+        self.import_genes([('ENSG00000130203', 'APOE'), ('ENSG00000084674', 'APOB'), ('ENSG00000130203', 'APOE')])
+        self.assertEqual(self.client.get(self.url).json(), { 'apoe': ['OPGS000001', 'OPGS000003'], 'ENSG00000084674': ['OPGS000002'] })
+
+
+    def test_data_stamp_ttl(self):
+        self.import_genes([('ENSG00000130203', 'APOE')])
+        self.assertEqual(self.client.get(self.url).json()['apoe'], ['OPGS000001'])
+        self.import_genes([('ENSG00000130203', 'APOE'), ('ENSG00000130203', 'APOE')])
+        # Data stamp kept in the cache (OP_DATA_VERSION_TTL)
+        self.assertEqual(self.client.get(self.url).json()['apoe'], ['OPGS000001'])
+        invalidate_cache()
+        self.assertEqual(self.client.get(self.url).json()['apoe'], ['OPGS000001', 'OPGS000002'])
+
+
+class StubResponse():
+
+    def __init__(self, content):
+        self.content = content
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.content
+
+
+class StubSession():
+    """ HTTP session answering the Europe PMC and GWAS Catalog requests of the PublicationResolver, without network access """
+
+    def __init__(self, pmids, gcst_ids, errors=()):
+        '''
+        - pmids: PubMed IDs, by DOI
+        - gcst_ids: GCST IDs, by PubMed ID
+        - errors: DOIs for which the request fails
+        '''
+        self.pmids = pmids
+        self.gcst_ids = gcst_ids
+        self.errors = errors
+        self.requests = []
+
+    def get(self, url, params=None, timeout=None):
+        if url == PublicationResolver.epmc_url:
+            doi = params['query'].replace('doi:', '')
+            self.requests.append(doi)
+            if doi in self.errors:
+                raise requests.ConnectionError('Connection refused')
+            pmid = self.pmids.get(doi)
+            return StubResponse({ 'resultList': { 'result': [{ 'pubType': 'research-article', 'pmid': pmid }] if pmid else [] } })
+        pmid = params['pubmedId']
+        self.requests.append(pmid)
+        gcst_id = self.gcst_ids.get(pmid)
+        return StubResponse({ '_embedded': { 'studies': [{ 'accessionId': gcst_id }] if gcst_id else [] } })
+
+
+class PublicationResolverTest(SimpleTestCase):
+    """ DOI => PubMed ID => GCST ID lookups: de-duplication, on-disk cache and offline mode """
+
+    pmids = { '10.1/a': '111', '10.1/b': '222' }
+    gcst_ids = { '111': 'GCST000001' }
+
+    def setUp(self):
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        self.cache_path = os.path.join(cache_dir.name, 'resolver.json')
+
+
+    def get_resolver(self, session, offline=False):
+        resolver = PublicationResolver(cache_path=self.cache_path, offline=offline)
+        resolver.session = session
+        return resolver
+
+
+    def test_resolve(self):
+        session = StubSession(self.pmids, self.gcst_ids)
+        results = self.get_resolver(session).resolve(['10.1/a', '10.1/b', ' 10.1/a', np.nan, '', None, '10.1/c'])
+        self.assertEqual(results, {
+            '10.1/a': { 'pmid': '111', 'gcst_id': 'GCST000001' },
+            '10.1/b': { 'pmid': '222', 'gcst_id': None },
+            '10.1/c': { 'pmid': None, 'gcst_id': None }
+        })
+        # Each identifier requested once, the missing DOIs skipped
+        self.assertEqual(sorted(session.requests), ['10.1/a', '10.1/b', '10.1/c', '111', '222'])
+        with open(self.cache_path) as f:
+            cache = json.load(f)
+        self.assertEqual(cache, { 'doi': { '10.1/a': '111', '10.1/b': '222', '10.1/c': None }, 'pmid': { '111': 'GCST000001', '222': None } })
+
+        # Cached lookups, including the "not found" results
+        session = StubSession({}, {})
+        self.assertEqual(self.get_resolver(session).resolve(['10.1/a', '10.1/c']), { x: results[x] for x in ('10.1/a', '10.1/c') })
+        self.assertEqual(session.requests, [])
+
+
+    def test_offline(self):
+        self.get_resolver(StubSession(self.pmids, self.gcst_ids)).resolve(['10.1/a'])
+        session = StubSession(self.pmids, self.gcst_ids)
+        results = self.get_resolver(session, offline=True).resolve(['10.1/a', '10.1/b'])
+        self.assertEqual(results['10.1/a'], { 'pmid': '111', 'gcst_id': 'GCST000001' })
+        self.assertEqual(results['10.1/b'], { 'pmid': None, 'gcst_id': None })
+        self.assertEqual(session.requests, [])
+
+
+    def test_failed_request(self):
+        session = StubSession(self.pmids, self.gcst_ids, errors=['10.1/b'])
+        results = self.get_resolver(session).resolve(['10.1/a', '10.1/b'])
+        self.assertIsNone(results['10.1/b']['pmid'])
+        # The failed lookups are not cached: requested again on the next run
+        session = StubSession(self.pmids, self.gcst_ids)
+        results = self.get_resolver(session).resolve(['10.1/a', '10.1/b'])
+        self.assertEqual(results['10.1/b'], { 'pmid': '222', 'gcst_id': None })
+        self.assertEqual(session.requests, ['10.1/b', '222'])
+
+
+    def test_gwas_parser(self):
+        filepath = os.path.join(os.path.dirname(self.cache_path), 'gwas.csv')
+        pd.DataFrame([
+            { 'Platform': 'Somalogic', 'Cohort': 'FENLAND', 'Covariates adjustment (by linear regression)': 'age, sex', 'Reference (DOI)': 'https://doi.org/10.1/a' },
+            { 'Platform': 'Somalogic', 'Cohort': 'JHS', 'Covariates adjustment (by linear regression)': np.nan, 'Reference (DOI)': np.nan }
+        ]).to_csv(filepath, index=False)
+        session = StubSession(self.pmids, self.gcst_ids)
+        gwas_data = GWASParser([filepath], resolver=self.get_resolver(session))
+        gwas_data.parse_files()
+        self.assertEqual(gwas_data.data['Somalogic'], {
+            'FENLAND': { 'covariates': 'age, sex', 'doi': '10.1/a', 'gcst_id': 'GCST000001' },
+            'JHS': {}
+        })
+        self.assertEqual(session.requests, ['10.1/a', '111'])
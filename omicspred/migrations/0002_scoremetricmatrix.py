@@ -0,0 +1,19 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('omicspred', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScoreMetricMatrix',
+            fields=[
+                ('score', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='metric_matrix', serialize=False, to='omicspred.score', verbose_name='Score')),
+                ('metrics', models.JSONField(default=list, verbose_name='Cohort metric estimates')),
+            ],
+        ),
+    ]
@@ -0,0 +1,52 @@
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('omicspred', '0002_scoremetricmatrix'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='gene',
+            index=models.Index(django.db.models.functions.text.Upper('name'), name='gene_name_upper_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='gene',
+            index=models.Index(django.db.models.functions.text.Upper('external_id'), name='gene_extid_upper_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transcript',
+            index=models.Index(django.db.models.functions.text.Upper('name'), name='transcript_name_upper_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transcript',
+            index=models.Index(django.db.models.functions.text.Upper('external_id'), name='transcript_extid_upper_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='protein',
+            index=models.Index(django.db.models.functions.text.Upper('name'), name='protein_name_upper_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='protein',
+            index=models.Index(django.db.models.functions.text.Upper('external_id'), name='protein_extid_upper_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pathway',
+            index=models.Index(django.db.models.functions.text.Upper('name'), name='pathway_name_upper_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pathway',
+            index=models.Index(django.db.models.functions.text.Upper('external_id'), name='pathway_extid_upper_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='metabolite',
+            index=models.Index(django.db.models.functions.text.Upper('name'), name='metabolite_name_upper_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='metabolite',
+            index=models.Index(django.db.models.functions.text.Upper('external_id'), name='metabolite_extid_upper_idx'),
+        ),
+    ]
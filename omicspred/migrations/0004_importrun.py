@@ -0,0 +1,26 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('omicspred', '0003_omics_upper_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('study', models.CharField(db_index=True, max_length=100, verbose_name='Study')),
+                ('filepath', models.TextField(verbose_name='Study data file')),
+                ('status', models.CharField(choices=[('R', 'Running'), ('C', 'Completed'), ('F', 'Failed')], default='R', max_length=1)),
+                ('rows_count', models.IntegerField(verbose_name='Number of rows in the file')),
+                ('batch_size', models.IntegerField(verbose_name='Number of rows per batch')),
+                ('last_row', models.IntegerField(default=0, verbose_name='Last committed row')),
+                ('error', models.TextField(null=True, verbose_name='Error message')),
+                ('date_started', models.DateTimeField(auto_now_add=True, verbose_name='Start date')),
+                ('date_updated', models.DateTimeField(auto_now=True, verbose_name='Last checkpoint date')),
+            ],
+        ),
+    ]
@@ -0,0 +1,20 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('omicspred', '0004_importrun'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScoreFingerprint',
+            fields=[
+                ('score', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='fingerprint', serialize=False, to='omicspred.score', verbose_name='Score')),
+                ('study', models.CharField(db_index=True, max_length=100, verbose_name='Study')),
+                ('fingerprint', models.CharField(max_length=32, verbose_name='Row fingerprint')),
+            ],
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models.functions import Upper
 from django.core.validators import MaxValueValidator, MinValueValidator
 
 class Publication(models.Model):
@@ -255,6 +256,22 @@ class Omics(models.Model):
 
     class Meta:
         abstract = True
+        # Case insensitive searches on the name and external ID
+        indexes = [
+            models.Index(Upper('name'), name='%(class)s_name_upper_idx'),
+            models.Index(Upper('external_id'), name='%(class)s_extid_upper_idx')
+        ]
+
+    @classmethod
+    def search_ids(cls, value):
+        '''
+        Find the entities matching a name or an external ID (case insensitive), using the UPPER() indexes.
+        Return type: list of entity IDs
+        '''
+        value = value.upper()
+        by_name = cls.objects.annotate(name_upper=Upper('name')).filter(name_upper=value).values_list('id', flat=True)
+        by_external_id = cls.objects.annotate(external_id_upper=Upper('external_id')).filter(external_id_upper=value).values_list('id', flat=True)
+        return list(by_name.union(by_external_id))
 
 
 class Gene(Omics):
@@ -334,14 +351,45 @@ class Score(models.Model):
         self.num = n
         self.id = 'OPGS' + str(n).zfill(6)
 
+    @property
+    def metric_matrix_entries(self):
+        ''' Cohort/metric estimates stored in the ScoreMetricMatrix (None if not populated) '''
+        try:
+            return self.metric_matrix.metrics
+        except ScoreMetricMatrix.DoesNotExist:
+            return None
+
     @property
     def performance_data(self):
         data = {}
+        # Use the denormalised data when available
+        entries = self.metric_matrix_entries
+        if entries is not None:
+            for entry in entries:
+                data[f"{entry['cohort_label']}_{entry['metric']}"] = {
+                    'label': f"{entry['cohort_label']} {entry['metric']}",
+                    'estimate': entry['estimate']
+                }
+            return data
         for perf in self.score_performance.all():
             for cohort in perf.cohort_metrics.keys():
                 data[cohort] = perf.cohort_metrics[cohort]
         return data
 
+class ScoreMetricMatrix(models.Model):
+    """ Class storing the cohort/metric estimates of a Score, denormalised from its Performance and Metric models (populated at import time) """
+    score = models.OneToOneField(Score, on_delete=models.CASCADE, primary_key=True, verbose_name='Score', related_name='metric_matrix')
+    # List of entries like {'cohort': ..., 'cohort_label': ..., 'metric': ..., 'estimate': ...}, ordered by Performance and Metric
+    metrics = models.JSONField('Cohort metric estimates', default=list)
+
+
+class ScoreFingerprint(models.Model):
+    """ Class storing the fingerprint (hash) of the study file row of a Score, to only import the changed rows of a study (delta import) """
+    score = models.OneToOneField(Score, on_delete=models.CASCADE, primary_key=True, verbose_name='Score', related_name='fingerprint')
+    study = models.CharField('Study', max_length=100, db_index=True)
+    fingerprint = models.CharField('Row fingerprint', max_length=32)
+
+
 class Performance(models.Model):
     """ Class for Performance Metric """
     score = models.ForeignKey(Score, on_delete=models.CASCADE, verbose_name='Score', related_name='score_performance') # \Score that the metrics are associated with
@@ -439,7 +487,8 @@ class Metric(models.Model):
             return '%s: %s'%(self.name, s)
 
 
-    def display_value(self,value):
+    @staticmethod
+    def display_value(value):
         # Use the scientific notation
         if (0 < value < 0.00001) or (-0.00001 < value < 0):
             new_value = '{:.2e}'.format(value)
@@ -447,3 +496,28 @@ class Metric(models.Model):
         else:
             new_value = round(value, 5)
         return new_value
+
+
+class ImportRun(models.Model):
+    """ Class tracking the import of a study data file, batch by batch (checkpoint used to resume a failed import) """
+    study = models.CharField('Study', max_length=100, db_index=True)
+    filepath = models.TextField('Study data file')
+
+    STATUS_CHOICES = [
+        ('R', 'Running'),
+        ('C', 'Completed'),
+        ('F', 'Failed')
+    ]
+    status = models.CharField(max_length=1, choices=STATUS_CHOICES, default='R')
+
+    rows_count = models.IntegerField('Number of rows in the file')
+    batch_size = models.IntegerField('Number of rows per batch')
+    # Number of rows committed (all the rows before this index have been imported)
+    last_row = models.IntegerField('Last committed row', default=0)
+    error = models.TextField('Error message', null=True)
+
+    date_started = models.DateTimeField('Start date', auto_now_add=True)
+    date_updated = models.DateTimeField('Last checkpoint date', auto_now=True)
+
+    def __str__(self):
+        return f'{self.study}: {self.last_row}/{self.rows_count} rows ({self.get_status_display()})'
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class RestApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'rest_api'
+
+    def ready(self):
+        # Register the custom lookups
+        from . import lookups
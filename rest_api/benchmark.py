@@ -0,0 +1,192 @@
+import json
+import math
+import queue
+import threading
+import time
+from itertools import cycle
+from django.conf import settings
+from django.db import connections
+from django.test import Client
+from omicspred.models import *
+
+
+def percentile(values, percent):
+    ''' Nearest-rank percentile of a sorted list of values. '''
+    if not values:
+        return None
+    index = max(math.ceil(percent / 100 * len(values)) - 1, 0)
+    return values[index]
+
+
+class ApiBenchmark():
+    """
+    Load benchmark of the REST API endpoints: each endpoint is called a number of times by concurrent clients
+    and the latencies (p50, p95, max) and the throughput are reported by endpoint.
+    The URLs are built with values sampled from the database (platforms, Scores, omics entities, ...).
+    The requests are sent in-process with the Django test client (views, serialisation and database only),
+    or over HTTP to a running server if a base URL is provided (e.g. http://localhost:8000).
+    """
+
+    def __init__(self, requests=100, concurrency=4, warmup=5, base_url=None, cold=False, timeout=60):
+        self.requests = requests
+        self.concurrency = concurrency
+        self.warmup = warmup
+        self.base_url = base_url.rstrip('/') if base_url else None
+        self.cold = cold
+        self.timeout = timeout
+        self.local = threading.local()
+        self.counter = 0
+        self.counter_lock = threading.Lock()
+
+
+    def get_endpoints(self):
+        '''
+        Build the list of requests of each endpoint, from values sampled in the database.
+        Return type: dictionary of lists of tuples (HTTP method, URL, POST data), by route name
+        '''
+        platforms = list(Platform.objects.values_list('name', flat=True).order_by('id')[:10])
+        score_ids = list(Score.objects.values_list('id', flat=True).order_by('num')[:1000])
+        pmids = list(Publication.objects.values_list('pmid', flat=True).order_by('id')[:10])
+        genes = list(Gene.objects.values_list('name', flat=True).order_by('id')[:20])
+        proteins = list(Protein.objects.exclude(external_id=None).values_list('external_id', flat=True).order_by('id')[:20])
+        metabolites = list(Metabolite.objects.values_list('name', flat=True).order_by('id')[:20])
+        platforms_by_type = {}
+        for name, platform_type in Platform.objects.values_list('name', 'type').order_by('id'):
+            platforms_by_type.setdefault(platform_type, []).append(name)
+
+        endpoints = {
+            'getAllCohorts': [('get', '/rest/cohort/all', None)],
+            'getAllPlatforms': [('get', '/rest/platform/all', None)],
+            'getAllPublications': [('get', '/rest/publication/all', None)],
+            'getAllSamples': [('get', '/rest/sample/all', None)],
+            'getAllScores': [('get', f'/rest/score/all?limit=100&offset={x}', None) for x in (0, 100, 200)],
+            'getAllPerformanceMetrics': [('get', f'/rest/performance/all?limit=100&offset={x}', None) for x in (0, 100, 200)],
+            'searchScores': [('get', f'/rest/score/search?platform={x}&limit=100', None) for x in platforms],
+            'searchPerformanceMetrics': [('get', f'/rest/performance/search?platform={x}&limit=100', None) for x in platforms],
+            'searchPublications': [('get', f'/rest/publication/search?pmid={x}', None) for x in pmids],
+            'getScore': [('get', f'/rest/score/{x}', None) for x in score_ids[:50]],
+            'searchScoresByGene': [('get', f'/rest/score/searchbygene/{x}', None) for x in genes],
+            'searchScoresByProtein': [('get', f'/rest/score/searchbyprotein/{x}', None) for x in proteins],
+            'searchScoresByMetabolite': [('get', f'/rest/score/searchbymetabolite/{x}', None) for x in metabolites],
+            'getScoresBatch': [('post', '/rest/score/batch', { 'filter_ids': score_ids })],
+            'mapScoresByEntity': [('post', '/rest/score/map', { 'queries': genes + proteins + metabolites })],
+            'searchTables': [('get', f'/rest/table/search?platform={x}&limit=100', None) for x in platforms],
+            'searchMetaboliteTables': [('get', f'/rest/table/metabolite/search?platform={x}', None) for x in platforms_by_type.get('Metabolomics', [])],
+            'searchProteinTables': [('get', f'/rest/table/protein/search?platform={x}', None) for x in platforms_by_type.get('Proteomics', [])],
+            'searchEnsemblTables': [('get', f'/rest/table/transcript/search?platform={x}', None) for x in platforms_by_type.get('Transcriptomics', [])],
+            'searchPlots': [('get', f'/rest/plot/search?platform={x}', None) for x in platforms]
+        }
+        return { name: requests for name, requests in endpoints.items() if requests }
+
+
+    def get_client(self):
+        ''' HTTP session or Django test client, one per thread. '''
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            if self.base_url:
+                import requests
+                client = requests.Session()
+            else:
+                hosts = [x.lstrip('.') for x in settings.ALLOWED_HOSTS if '*' not in x]
+                client = Client(raise_request_exception=False, HTTP_HOST=hosts[0] if hosts else 'localhost')
+            self.local.client = client
+        return client
+
+
+    def get_url(self, url):
+        ''' Add a unique parameter to the URL in "cold" mode, so the response is not served from the cache. '''
+        if not self.cold:
+            return url
+        with self.counter_lock:
+            self.counter += 1
+            counter = self.counter
+        return f'{url}{"&" if "?" in url else "?"}_benchmark={counter}'
+
+
+    def send(self, method, url, data):
+        '''
+        Send a request and read the whole response.
+        Return type: tuple (latency in seconds, HTTP status code)
+        '''
+        client = self.get_client()
+        url = self.get_url(url)
+        start_time = time.perf_counter()
+        if self.base_url:
+            if method == 'post':
+                response = client.post(self.base_url+url, json=data, timeout=self.timeout)
+            else:
+                response = client.get(self.base_url+url, timeout=self.timeout)
+            response.content
+            status_code = response.status_code
+        else:
+            if method == 'post':
+                response = client.post(url, json.dumps(data), content_type='application/json')
+            else:
+                response = client.get(url)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            else:
+                response.content
+            status_code = response.status_code
+        return time.perf_counter() - start_time, status_code
+
+
+    def worker(self, calls, results):
+        ''' Send the requests of the queue, until it is empty. '''
+        try:
+            while True:
+                try:
+                    method, url, data = calls.get_nowait()
+                except queue.Empty:
+                    break
+                results.append(self.send(method, url, data))
+        finally:
+            self.local.client = None
+            if not self.base_url:
+                connections.close_all()
+
+
+    def run_endpoint(self, requests):
+        '''
+        Call the requests of an endpoint, "self.requests" times in total, with "self.concurrency" concurrent clients.
+        Return type: dictionary of statistics (latencies in milliseconds)
+        '''
+        for method, url, data in requests[:self.warmup]:
+            self.send(method, url, data)
+        calls = queue.Queue()
+        for request, _ in zip(cycle(requests), range(self.requests)):
+            calls.put(request)
+        results = []
+        threads = [threading.Thread(target=self.worker, args=(calls, results)) for _ in range(self.concurrency)]
+        start_time = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        duration = time.perf_counter() - start_time
+
+        latencies = sorted([x[0] * 1000 for x in results])
+        return {
+            'requests': len(results),
+            'errors': len([x for x in results if x[1] >= 400]),
+            'p50': round(percentile(latencies, 50), 2),
+            'p95': round(percentile(latencies, 95), 2),
+            'max': round(latencies[-1], 2),
+            'throughput': round(len(results) / duration, 2)
+        }
+
+
+    def run(self, endpoint_names=None, callback=None):
+        '''
+        Run the benchmark on the selected endpoints (default: all).
+        Return type: dictionary of statistics, by route name
+        '''
+        endpoints = self.get_endpoints()
+        if endpoint_names:
+            endpoints = { name: endpoints[name] for name in endpoint_names if name in endpoints }
+        report = {}
+        for name, requests in endpoints.items():
+            report[name] = self.run_endpoint(requests)
+            if callback:
+                callback(name, report[name])
+        return report
@@ -0,0 +1,206 @@
+import hashlib
+from datetime import datetime, timezone
+from functools import wraps
+from urllib.parse import urlencode
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Count, Max
+from django.views.decorators.http import condition
+from omicspred.models import Score, ImportRun
+from .compression import accepts_encoding
+
+
+cache_prefix = 'rest'
+generation_key = f'{cache_prefix}:generation'
+data_stamp_key = f'{cache_prefix}:data_stamp'
+stats_key = f'{cache_prefix}:stats'
+stats_types = ('hit', 'miss')
+
+
+def get_cache():
+    return caches[settings.OP_CACHE_ALIAS]
+
+
+def get_route_ttl(route_name):
+    ''' Cache timeout (in seconds) of a route, from the OP_CACHE_TTL settings. '''
+    ttl_map = settings.OP_CACHE_TTL
+    return ttl_map.get(route_name, ttl_map['default'])
+
+
+def get_generation():
+    '''
+    Current generation of the cached responses.
+    The generation is part of the cache keys, so bumping it invalidates all the cached responses.
+    '''
+    cache = get_cache()
+    generation = cache.get(generation_key)
+    if generation is None:
+        cache.add(generation_key, 1, timeout=None)
+        generation = cache.get(generation_key, 1)
+    return generation
+
+
+def get_data_stamp(refresh=False):
+    '''
+    Stamp of the catalogue data, read from the database so all the processes (web workers, imports) see the same one:
+    number and highest number of the Scores, latest release date and date of the last import run (see ImportRun).
+    The stamp is kept in the cache for OP_DATA_VERSION_TTL seconds: the data changed by another process are seen
+    within this delay, even if the cache of the current process is not invalidated.
+    - refresh: read the stamp from the database, even if it is in the cache (e.g. right after an import)
+    Return type: dictionary with the 'token' (string), the 'release' date and the 'imported' datetime (or None)
+    '''
+    cache = get_cache()
+    stamp = None if refresh else cache.get(data_stamp_key)
+    if stamp is None:
+        scores = Score.objects.aggregate(count=Count('num'), last_num=Max('num'), release=Max('date_released'))
+        imported = ImportRun.objects.aggregate(imported=Max('date_updated'))['imported']
+        values = (scores['count'], scores['last_num'], scores['release'], imported)
+        stamp = {
+            'token': hashlib.sha1(repr(values).encode('utf-8')).hexdigest()[:16],
+            'release': scores['release'],
+            'imported': imported
+        }
+        if settings.OP_DATA_VERSION_TTL:
+            cache.set(data_stamp_key, stamp, settings.OP_DATA_VERSION_TTL)
+    return stamp
+
+
+def invalidate_cache():
+    ''' Invalidate all the cached REST responses (e.g. after a data import or a new release). '''
+    cache = get_cache()
+    cache.delete(data_stamp_key)
+    get_generation()
+    try:
+        generation = cache.incr(generation_key)
+    except ValueError:
+        generation = 2
+        cache.set(generation_key, generation, timeout=None)
+    return generation
+
+
+def get_cache_namespace():
+    '''
+    Prefix of the cache keys of the responses and counts: cache generation (bumped by invalidate_cache) and data stamp
+    (see get_data_stamp), so the entries cached by a process are not served after an import run by another process.
+    '''
+    return f'{cache_prefix}:{get_generation()}:{get_data_stamp()["token"]}'
+
+
+def normalise_cache_key(request, route_name):
+    '''
+    Build the cache key of a request, independently of the optional trailing slash
+    and of the order of the query parameters.
+    '''
+    path = request.path.rstrip('/')
+    params = urlencode(sorted(request.GET.lists()), doseq=True)
+    # Responses can differ depending on the requested format and encoding
+    accept = 'html' if 'text/html' in request.headers.get('Accept', '') else 'json'
+    encoding = 'gzip' if accepts_encoding(request, 'gzip') else 'identity'
+    return f'{get_cache_namespace()}:{route_name}:{accept}:{encoding}:{path}?{params}'
+
+
+def count_cache_request(route_name, stat_type):
+    '''
+    Increment the hit/miss counter of a route.
+    The counters are approximate: "incr" is not atomic on every cache backend (e.g. the file-based cache shared
+    by several processes), so concurrent requests can lose increments.
+    '''
+    cache = get_cache()
+    key = f'{stats_key}:{route_name}:{stat_type}'
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=None)
+
+
+def get_cache_stats(route_names):
+    ''' Return the (approximate) hit/miss counters of the given routes. '''
+    cache = get_cache()
+    keys = [f'{stats_key}:{name}:{stat_type}' for name in route_names for stat_type in stats_types]
+    values = cache.get_many(keys)
+    stats = {}
+    for name in route_names:
+        route_stats = { stat_type: values.get(f'{stats_key}:{name}:{stat_type}', 0) for stat_type in stats_types }
+        if route_stats['hit'] or route_stats['miss']:
+            route_stats['ttl'] = get_route_ttl(name)
+            stats[name] = route_stats
+    return stats
+
+
+def cache_route(route_name, content_func=None):
+    '''
+    Cache the successful GET responses of a view, using the timeout set for the route in OP_CACHE_TTL.
+    Replacement of "cache_page" with normalised keys, hit/miss counters and invalidation on import.
+    - content_func: function returning the precomputed content served for a request (e.g. table snapshot), or None.
+      The version of the content is part of the cache key.
+    '''
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapped_view(request, *args, **kwargs):
+            ttl = get_route_ttl(route_name)
+            if not ttl or request.method not in ('GET', 'HEAD'):
+                return view_func(request, *args, **kwargs)
+
+            cache = get_cache()
+            cache_key = normalise_cache_key(request, route_name)
+            content = content_func(request) if content_func else None
+            if content:
+                cache_key = f'{cache_key}:{content["version"]}'
+            response = cache.get(cache_key)
+            if response is not None:
+                count_cache_request(route_name, 'hit')
+                return response
+            count_cache_request(route_name, 'miss')
+
+            response = view_func(request, *args, **kwargs)
+            if response.status_code == 200 and not response.streaming:
+                if hasattr(response, 'render') and callable(response.render):
+                    response.add_post_render_callback(lambda r: cache.set(cache_key, r, ttl))
+                else:
+                    cache.set(cache_key, response, ttl)
+            return response
+        return wrapped_view
+    return decorator
+
+
+def get_data_version(content=None):
+    '''
+    Version of the catalogue data, from the data stamp (see get_data_stamp): the same in all the processes, and
+    the conditional requests only query the database when the stamp has expired from the cache.
+    - content: precomputed content served (e.g. table snapshot), with its 'version' and 'created' date (ISO format),
+      added to the version so a content rebuilt from the same data gets a new ETag
+    Return type: dictionary with the 'etag' and the 'last_modified' datetime (or None)
+    '''
+    stamp = get_data_stamp()
+    release = stamp['release']
+    last_modified = datetime(release.year, release.month, release.day, tzinfo=timezone.utc) if release else None
+    # Date of the last import (if more recent than the release)
+    imported = stamp['imported']
+    if imported and (not last_modified or imported > last_modified):
+        last_modified = imported
+    token = stamp['token']
+    if content:
+        token = f'{token}-{content["version"][:16]}'
+        created = datetime.fromisoformat(content['created'])
+        if not last_modified or created > last_modified:
+            last_modified = created
+    return {
+        # Weak ETag: same data, whatever the encoding of the response
+        'etag': f'W/"{token}"',
+        'last_modified': last_modified
+    }
+
+
+def conditional_route(view_func, content_func=None):
+    '''
+    Conditional GET on the data version (see get_data_version): ETag and Last-Modified headers,
+    and "304 Not Modified" responses sent without calling the view.
+    - content_func: function returning the precomputed content served for a request (e.g. table snapshot), or None
+    '''
+    def get_version(request):
+        return get_data_version(content_func(request) if content_func else None)
+    return condition(
+        etag_func=lambda request, *args, **kwargs: get_version(request)['etag'],
+        last_modified_func=lambda request, *args, **kwargs: get_version(request)['last_modified']
+    )(view_func)
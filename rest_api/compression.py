@@ -0,0 +1,75 @@
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def accepts_encoding(request, encoding):
+    '''
+    Check if the client accepts a content encoding (e.g. "gzip"), from the "Accept-Encoding" header and its q-values:
+    "gzip;q=0" refuses gzip, "*" accepts the encodings which are not listed.
+    Return type: boolean
+    '''
+    qvalues = {}
+    for item in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        name, _, params = item.partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        qvalue = 1.0
+        for param in params.split(';'):
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    qvalue = float(value)
+                except ValueError:
+                    qvalue = 0.0
+        qvalues[name] = qvalue
+    qvalue = qvalues.get(encoding, qvalues.get('*', 0.0))
+    return qvalue > 0
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    Compression of the responses: Brotli for the JSON responses (if the "brotli" package is installed
+    and the client accepts it), gzip otherwise (GZipMiddleware), according to the q-values of the "Accept-Encoding" header.
+    Brotli is not used for the HTML pages, which are only protected against BREACH by the gzip middleware.
+    """
+
+    # Fast compression level: the large JSON payloads are compressed on each request
+    brotli_quality = 5
+    min_length = 200
+
+    def use_brotli(self, request, response):
+        return (
+            brotli is not None and not response.streaming and
+            accepts_encoding(request, 'br') and
+            response.get('Content-Type', '').startswith('application/json') and
+            not response.has_header('Content-Encoding') and len(response.content) >= self.min_length
+        )
+
+
+    def process_response(self, request, response):
+        if not self.use_brotli(request, response):
+            if not accepts_encoding(request, 'gzip'):
+                # GZipMiddleware doesn't check the q-values (e.g. "gzip;q=0")
+                if not response.streaming and len(response.content) >= self.min_length:
+                    patch_vary_headers(response, ('Accept-Encoding',))
+                return response
+            return super().process_response(request, response)
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        compressed_content = brotli.compress(response.content, quality=self.brotli_quality)
+        if len(compressed_content) >= len(response.content):
+            return response
+        response.content = compressed_content
+        response.headers['Content-Length'] = str(len(response.content))
+        # Weak ETag, like GZipMiddleware
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = 'br'
+        return response
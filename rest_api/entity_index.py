@@ -0,0 +1,81 @@
+import threading
+from omicspred.models import Score, Gene, Protein, Metabolite
+from .cache import get_data_stamp
+
+
+class EntityScoreIndex():
+    """
+    In-memory inverted index of the Scores, by omics entity name and external ID (case insensitive).
+    The index is built from the Score/entity many-to-many tables on the first search of the process (not when the
+    WSGI application is loaded, so a worker starts even if the database is unavailable), and rebuilt when the data stamp
+    changes (i.e. after an import, see get_data_stamp in rest_api/cache.py).
+    """
+
+    # Entity type => (Score field, entity model)
+    entity_types = {
+        'gene': ('genes', Gene),
+        'protein': ('proteins', Protein),
+        'metabolite': ('metabolites', Metabolite)
+    }
+
+    def __init__(self):
+        self.index = {}
+        self.version = None
+        self.lock = threading.Lock()
+
+
+    @staticmethod
+    def normalise(value):
+        return str(value).strip().upper()
+
+
+    def build(self):
+        '''
+        Build the index, with one query per entity type.
+        Return type: dictionary of dictionaries (normalised name/ID => tuple of Score IDs), by entity type
+        '''
+        index = {}
+        for entity_type, (field_name, model) in self.entity_types.items():
+            through = Score._meta.get_field(field_name).remote_field.through
+            entity_field = model._meta.model_name
+            rows = through.objects.values_list(f'{entity_field}__name', f'{entity_field}__external_id', 'score__id').order_by('score_id')
+            type_index = {}
+            for name, external_id, score_id in rows.iterator(chunk_size=10000):
+                for value in (name, external_id):
+                    if value:
+                        type_index.setdefault(self.normalise(value), {})[score_id] = None
+            index[entity_type] = { key: tuple(score_ids.keys()) for key, score_ids in type_index.items() }
+        return index
+
+
+    def get_index(self):
+        ''' Return the index, (re)built if the data changed since the last build. '''
+        version = get_data_stamp()['token']
+        if self.version != version:
+            with self.lock:
+                if self.version != version:
+                    self.index = self.build()
+                    self.version = version
+        return self.index
+
+
+    def search(self, queries, entity_type=None):
+        '''
+        Map a list of entity names/external IDs to the associated Scores.
+        - entity_type: 'gene', 'protein' or 'metabolite' (default: all the types)
+        Return type: dictionary of lists of Score IDs, by query
+        '''
+        index = self.get_index()
+        types = [entity_type] if entity_type else self.entity_types.keys()
+        results = {}
+        for query in queries:
+            key = self.normalise(query)
+            score_ids = {}
+            for type_name in types:
+                for score_id in index[type_name].get(key, ()):
+                    score_ids[score_id] = None
+            results[query] = sorted(score_ids.keys())
+        return results
+
+
+entity_score_index = EntityScoreIndex()
@@ -0,0 +1,181 @@
+import csv
+from itertools import islice
+from django.db.models import Prefetch
+from django.http import StreamingHttpResponse
+from rest_framework.utils.encoders import JSONEncoder
+from omicspred.models import *
+from .serializers import ScoreSerializer, PerformanceSerializer, SampleSerializer
+
+
+export_formats = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv'
+}
+
+
+def get_scores_export_queryset():
+    return Score.objects.select_related('publication','platform').prefetch_related(
+        Prefetch('genes', queryset=Gene.objects.all().order_by('id')),
+        Prefetch('transcripts', queryset=Transcript.objects.all().order_by('id')),
+        Prefetch('proteins', queryset=Protein.objects.all().order_by('id')),
+        Prefetch('metabolites', queryset=Metabolite.objects.select_related('pathway_group','pathway_subgroup').all().order_by('id'))
+    ).all().order_by('num')
+
+
+def get_performances_export_queryset():
+    return Performance.objects.select_related('score','publication','sample','platform','efo').prefetch_related(
+        'sample__cohorts',
+        Prefetch('performance_metric', queryset=Metric.objects.all().order_by('id'))
+    ).all().order_by('id')
+
+
+def get_samples_export_queryset():
+    return Sample.objects.prefetch_related('cohorts').all().order_by('id')
+
+
+# Export type => queryset, serializer, platform filter and CSV columns (paths in the serialized data)
+export_types = {
+    'score': {
+        'queryset': get_scores_export_queryset,
+        'serializer': ScoreSerializer,
+        'platform_filter': 'platform__name__iexact',
+        'columns': ['id', 'name', 'trait_reported', 'method_name', 'variants_number', 'variants_genomebuild',
+                    'publication.pmid', 'publication.doi', 'platform.name', 'platform.type',
+                    'genes.name', 'genes.external_id', 'transcripts.name', 'transcripts.external_id',
+                    'proteins.name', 'proteins.external_id', 'metabolites.name', 'metabolites.external_id',
+                    'date_release']
+    },
+    'performance': {
+        'queryset': get_performances_export_queryset,
+        'serializer': PerformanceSerializer,
+        'platform_filter': 'platform__name__iexact',
+        'columns': ['id', 'associated_pgs_id', 'evaluation_type', 'platform.name', 'efo.id', 'efo.label',
+                    'sample.cohorts.name_short', 'sample.sample_number', 'sample.ancestry_broad',
+                    'performance_metrics.name_short', 'performance_metrics.estimate', 'performance_metrics.p_value',
+                    'performance_additional', 'covariates', 'publication.pmid']
+    },
+    'sample': {
+        'queryset': get_samples_export_queryset,
+        'serializer': SampleSerializer,
+        'platform_filter': None,
+        'columns': ['cohorts.name_short', 'sample_number', 'sample_percent_male', 'sample_age', 'sample_age_sd',
+                    'ancestry_broad', 'ancestry_free', 'ancestry_country', 'ancestry_additional',
+                    'source_gwas_catalog', 'source_pmid', 'source_doi', 'cohorts_additional', 'tissue_name']
+    }
+}
+
+
+class ExportWriter():
+    """ Pseudo file, returning the written line, so the csv writer can be used as a generator """
+
+    def write(self, value):
+        return value
+
+
+def get_column_value(data, path):
+    '''
+    Extract a value from the serialized data, following a path like "sample.cohorts.name_short".
+    The values of the lists are joined with "|".
+    '''
+    values = [data]
+    for key in path.split('.'):
+        next_values = []
+        for value in values:
+            if isinstance(value, list):
+                next_values.extend([x.get(key) for x in value if isinstance(x, dict)])
+            elif isinstance(value, dict):
+                next_values.append(value.get(key))
+        values = next_values
+    flat_values = []
+    for value in values:
+        if isinstance(value, list):
+            flat_values.extend(value)
+        else:
+            flat_values.append(value)
+    return '|'.join(['' if x is None else str(x) for x in flat_values])
+
+
+class CatalogueExport():
+    """
+    Export all the entries of a model, serialized in NDJSON (one JSON object per line) or CSV.
+    The entries are fetched with a server-side cursor, by chunk, so the memory usage doesn't depend on the size of the catalogue.
+    """
+
+    chunk_size = 2000
+
+    def __init__(self, export_type, export_format='ndjson', platform=None):
+        self.export_type = export_type
+        self.export_format = export_format
+        self.config = export_types[export_type]
+        self.queryset = self.config['queryset']()
+        if platform and self.config['platform_filter']:
+            self.queryset = self.queryset.filter(**{ self.config['platform_filter']: platform })
+
+
+    def iter_chunks(self):
+        ''' Serialize the entries, by chunk of models. '''
+        models = self.queryset.iterator(chunk_size=self.chunk_size)
+        while True:
+            chunk = list(islice(models, self.chunk_size))
+            if not chunk:
+                break
+            yield self.config['serializer'](chunk, many=True).data
+
+
+    def iter_ndjson(self):
+        encoder = JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+        for chunk in self.iter_chunks():
+            yield ''.join([encoder.encode(entry)+'\n' for entry in chunk])
+
+
+    def iter_csv(self):
+        writer = csv.writer(ExportWriter())
+        columns = self.config['columns']
+        yield writer.writerow(columns)
+        for chunk in self.iter_chunks():
+            yield ''.join([writer.writerow([get_column_value(entry, column) for column in columns]) for entry in chunk])
+
+
+    def get_response(self):
+        ''' Return type: StreamingHttpResponse '''
+        if self.export_format == 'csv':
+            content = self.iter_csv()
+        else:
+            content = self.iter_ndjson()
+        response = StreamingHttpResponse(content, content_type=export_formats[self.export_format])
+        response['Content-Disposition'] = f'attachment; filename="omicspred_{self.export_type}s.{self.export_format}"'
+        return response
+
+
+class ScoreBatch():
+    """
+    Retrieve a large list of Scores by OmicsPred ID, streamed as a JSON object ('results', 'size' and the IDs 'not_found').
+    The IDs are resolved by chunk, with a single "id = ANY(array)" query per chunk (see lookups.py),
+    and the results keep the order of the requested IDs.
+    """
+
+    chunk_size = 1000
+
+    def __init__(self, ids):
+        self.ids = list(dict.fromkeys(ids))
+
+
+    def iter_json(self):
+        encoder = JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+        found_ids = set()
+        yield '{"results":['
+        for start in range(0, len(self.ids), self.chunk_size):
+            chunk_ids = self.ids[start:start+self.chunk_size]
+            scores = { x.id: x for x in get_scores_export_queryset().filter(id__any=chunk_ids) }
+            models = [scores[x] for x in chunk_ids if x in scores]
+            if models:
+                separator = ',' if found_ids else ''
+                yield separator + ','.join([encoder.encode(entry) for entry in ScoreSerializer(models, many=True).data])
+                found_ids.update(scores.keys())
+        not_found = [x for x in self.ids if x not in found_ids]
+        yield f'],"size":{len(found_ids)},"not_found":{encoder.encode(not_found)}}}'
+
+
+    def get_response(self):
+        ''' Return type: StreamingHttpResponse '''
+        return StreamingHttpResponse(self.iter_json(), content_type='application/json')
@@ -0,0 +1,24 @@
+from django.core.exceptions import EmptyResultSet
+from django.db.models import CharField, IntegerField, Lookup
+
+
+@CharField.register_lookup
+@IntegerField.register_lookup
+class AnyLookup(Lookup):
+    """
+    Lookup "<field>__any=<list>", sending the list of values as a single array parameter on PostgreSQL
+    ("<field> = ANY(%s)"), so the query doesn't depend on the number of values.
+    The other databases use a "<field> IN (...)" clause.
+    """
+    lookup_name = 'any'
+    prepare_rhs = False
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        values = list(self.rhs)
+        if connection.vendor == 'postgresql':
+            return f'{lhs} = ANY(%s)', [*lhs_params, values]
+        if not values:
+            raise EmptyResultSet
+        placeholders = ', '.join(['%s'] * len(values))
+        return f'{lhs} IN ({placeholders})', [*lhs_params, *values]
@@ -0,0 +1,42 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from rest_api.benchmark import ApiBenchmark
+
+
+class Command(BaseCommand):
+    help = 'Measure the latency (p50/p95) and the throughput of the REST API endpoints under concurrent requests'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=100, help='Number of requests per endpoint (default: 100)')
+        parser.add_argument('--concurrency', type=int, default=4, help='Number of concurrent clients (default: 4)')
+        parser.add_argument('--warmup', type=int, default=5, help='Number of requests sent before the measure, per endpoint (default: 5)')
+        parser.add_argument('--endpoint', action='append', help='Route name to benchmark, e.g. getAllScores (default: all)')
+        parser.add_argument('--base-url', help='URL of a running server (default: requests sent in-process)')
+        parser.add_argument('--cold', action='store_true', help='Bypass the cache of the responses')
+        parser.add_argument('--output', help='Save the results in a JSON file')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError('--requests and --concurrency should be positive numbers')
+        benchmark = ApiBenchmark(
+            requests=options['requests'], concurrency=options['concurrency'], warmup=options['warmup'],
+            base_url=options['base_url'], cold=options['cold']
+        )
+        endpoints = benchmark.get_endpoints()
+        for name in options['endpoint'] or []:
+            if name not in endpoints:
+                raise CommandError(f'Unknown endpoint "{name}" (or no data to build its requests): {", ".join(endpoints.keys())}')
+
+        self.stdout.write(f'{"Endpoint":<26}{"Requests":>9}{"Errors":>8}{"p50 (ms)":>11}{"p95 (ms)":>11}{"Max (ms)":>11}{"Req/s":>10}')
+        def print_stats(name, stats):
+            self.stdout.write(f'{name:<26}{stats["requests"]:>9}{stats["errors"]:>8}{stats["p50"]:>11}{stats["p95"]:>11}{stats["max"]:>11}{stats["throughput"]:>10}')
+        report = benchmark.run(options['endpoint'], callback=print_stats)
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({ 'settings': { x: options[x] for x in ('requests', 'concurrency', 'base_url', 'cold') }, 'endpoints': report }, f, indent=1)
+        errors = sum([x['errors'] for x in report.values()])
+        if errors:
+            self.stdout.write(self.style.WARNING(f'{errors} request(s) failed'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'{len(report)} endpoint(s) benchmarked'))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+from rest_api.snapshots import table_snapshots, table_types
+from rest_api.cache import invalidate_cache
+
+
+class Command(BaseCommand):
+    help = 'Regenerate the precomputed table snapshots served by the "/rest/table/<type>/search" endpoints'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--table', action='append', choices=table_types.keys(), help='Table type to rebuild (default: all)')
+        parser.add_argument('--platform', action='append', help='Platform name to rebuild (default: all)')
+
+    def handle(self, *args, **options):
+        versions = table_snapshots.rebuild(options['table'], options['platform'], verbose=options['verbosity'] > 1)
+        if not versions:
+            raise CommandError('No snapshot generated: no platform found')
+        invalidate_cache()
+        for key, version in versions.items():
+            self.stdout.write(f'{key}: {version}')
+        self.stdout.write(self.style.SUCCESS(f'{len(versions)} snapshot(s) generated in {table_snapshots.directory}'))
@@ -1,14 +1,81 @@
+import hashlib
+from django.core.exceptions import EmptyResultSet
+from django.db import connections
+from django.db.models.query import QuerySet
 from rest_framework.pagination import LimitOffsetPagination
 from rest_framework.response import Response
 from rest_framework.serializers import ValidationError
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 from collections import OrderedDict
+from .cache import get_cache, get_cache_namespace, get_route_ttl
+
+
+def get_cached_count(queryset, route_name=None):
+    '''
+    Exact number of results of a queryset, cached per SQL query (and per data generation and stamp, see rest_api/cache.py).
+    Return type: integer
+    '''
+    if not isinstance(queryset, QuerySet):
+        return len(queryset)
+    try:
+        sql, params = queryset.query.sql_with_params()
+    except EmptyResultSet:
+        return 0
+    ttl = get_route_ttl(route_name)
+    if not ttl:
+        return queryset.count()
+    query_hash = hashlib.sha1(repr((queryset.db, sql, params)).encode('utf-8')).hexdigest()
+    cache_key = f'{get_cache_namespace()}:count:{query_hash}'
+    cache = get_cache()
+    count = cache.get(cache_key)
+    if count is None:
+        count = queryset.count()
+        cache.set(cache_key, count, ttl)
+    return count
+
+
+def get_estimated_count(queryset):
+    '''
+    Estimated number of rows of an unfiltered queryset, from the PostgreSQL statistics (pg_class.reltuples).
+    Return type: integer, or None if there is no estimate (filtered queryset, other database or table never analysed)
+    '''
+    if not isinstance(queryset, QuerySet) or queryset.query.where or queryset.query.distinct:
+        return None
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [queryset.model._meta.db_table])
+        row = cursor.fetchone()
+    if not row or row[0] < 0:
+        return None
+    return row[0]
 
 
 class CustomPagination(LimitOffsetPagination):
+    """
+    Limit/Offset pagination, with an opt-in cursor (keyset) mode for the views
+    defining a "pagination_cursor_field" (unique and ordered field, e.g. 'num' for the Scores).
+    The cursor mode is used when the URL parameter 'cursor' is present (empty for the first page):
+    the pages are fetched with "WHERE <field> > <cursor>" instead of an offset and without counting the results,
+    so the cost of a page doesn't depend on its position.
+    The previous pages are fetched with the URL parameter 'cursor_before' ("WHERE <field> < <cursor_before>", in reverse order).
+
+    Count of the results (Limit/Offset mode):
+     - 'count=false' URL parameter: the results are not counted ('count' is null)
+     - views with "pagination_count_estimate": estimate from the database statistics when the queryset is unfiltered (PostgreSQL only)
+     - otherwise: exact count, cached per query
+    The next page is detected by fetching one extra result, so it doesn't depend on the count.
+    """
 
     min_limit = 1
     max_limit = 500
     #max_limit = 250
+    cursor_query_param = 'cursor'
+    cursor_before_query_param = 'cursor_before'
+    cursor_field = None
+    count_query_param = 'count'
+    has_next = False
 
 
     def get_paginated_response(self, data):
@@ -37,4 +104,114 @@ class CustomPagination(LimitOffsetPagination):
                 error_dict['limit'] = error_msg
                 raise ValidationError(error_dict)
 
-        return super(self.__class__, self).paginate_queryset(queryset, request, view)
+        cursor_field = getattr(view, 'pagination_cursor_field', None)
+        cursor_params = (self.cursor_query_param, self.cursor_before_query_param)
+        if cursor_field and any(x in request.query_params for x in cursor_params) and isinstance(queryset, QuerySet):
+            return self.paginate_queryset_by_cursor(queryset, request, cursor_field)
+
+        self.request = request
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+        self.offset = self.get_offset(request)
+        self.count = self.get_results_count(queryset, request, view)
+        if self.count is not None and self.count > self.limit and self.template is not None:
+            self.display_page_controls = True
+        if self.count == 0:
+            return []
+
+        # Fetch one extra result to know if there is a next page
+        page = list(queryset[self.offset:self.offset + self.limit + 1])
+        self.has_next = len(page) > self.limit
+        return page[:self.limit]
+
+
+    def get_results_count(self, queryset, request, view=None):
+        '''
+        Count the results, depending on the count strategy (see class description).
+        Return type: integer or None
+        '''
+        if request.query_params.get(self.count_query_param, '').lower() == 'false':
+            return None
+        if getattr(view, 'pagination_count_estimate', False):
+            count = get_estimated_count(queryset)
+            if count is not None:
+                return count
+        route_name = request.resolver_match.url_name if request.resolver_match else None
+        return get_cached_count(queryset, route_name)
+
+
+    def get_cursor(self, request, param):
+        ''' Value of a cursor URL parameter. Return type: integer, or None if missing/empty '''
+        cursor = request.query_params.get(param)
+        if not cursor:
+            return None
+        try:
+            return int(cursor)
+        except ValueError:
+            raise ValidationError({ param: f'URL parameter \'{param}\' should be an integer' })
+
+
+    def paginate_queryset_by_cursor(self, queryset, request, cursor_field):
+        ''' Fetch the page of results following (or preceding) the cursor value (keyset pagination) '''
+        self.request = request
+        self.limit = self.get_limit(request)
+        self.cursor_field = cursor_field
+        self.next_cursor = None
+        self.previous_cursor = None
+        # Not counted in cursor mode
+        self.count = None
+
+        cursor = self.get_cursor(request, self.cursor_query_param)
+        cursor_before = self.get_cursor(request, self.cursor_before_query_param)
+        if cursor_before is not None:
+            # Previous page: fetched in reverse order, with one extra result to know if there is a previous page
+            queryset = queryset.filter(**{ f'{cursor_field}__lt': cursor_before })
+            page = list(queryset.order_by(f'-{cursor_field}')[:self.limit + 1])
+            if len(page) > self.limit:
+                page = page[:self.limit]
+                self.previous_cursor = getattr(page[-1], cursor_field)
+            page.reverse()
+            if page:
+                self.next_cursor = getattr(page[-1], cursor_field)
+            return page
+
+        if cursor is not None:
+            queryset = queryset.filter(**{ f'{cursor_field}__gt': cursor })
+        # Fetch one extra result to know if there is a next page
+        page = list(queryset.order_by(cursor_field)[:self.limit + 1])
+        if len(page) > self.limit:
+            page = page[:self.limit]
+            self.next_cursor = getattr(page[-1], cursor_field)
+        # Previous page: only the first page has no cursor value
+        if cursor is not None and page:
+            self.previous_cursor = getattr(page[0], cursor_field)
+        return page
+
+
+    def get_next_link(self):
+        if not self.cursor_field:
+            if not self.has_next:
+                return None
+            url = self.request.build_absolute_uri()
+            url = replace_query_param(url, self.limit_query_param, self.limit)
+            return replace_query_param(url, self.offset_query_param, self.offset + self.limit)
+        if self.next_cursor is None:
+            return None
+        url = self.get_cursor_url(self.cursor_before_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+
+    def get_previous_link(self):
+        if not self.cursor_field:
+            return super().get_previous_link()
+        if self.previous_cursor is None:
+            return None
+        url = self.get_cursor_url(self.cursor_query_param)
+        return replace_query_param(url, self.cursor_before_query_param, self.previous_cursor)
+
+
+    def get_cursor_url(self, param):
+        ''' URL of the current page, without the offset and the given cursor parameter '''
+        url = remove_query_param(self.request.build_absolute_uri(), self.offset_query_param)
+        return remove_query_param(url, param)
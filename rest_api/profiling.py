@@ -0,0 +1,167 @@
+import json
+import logging
+import random
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.db import connections
+
+
+logger = logging.getLogger(__name__)
+
+# Profile of the current request (None if the request is not sampled)
+current_profile = ContextVar('rest_profile', default=None)
+
+
+class RequestProfile():
+    """
+    Timings of a request, by phase, and number/duration of the SQL queries (recorded with a connection execute wrapper).
+    Phases recorded by the middleware:
+     - sql: execution of the queries (evaluation of the querysets)
+     - serialize: time spent in the view, excluding the SQL queries (building of the models, serializers, ...)
+     - render: rendering of the response content (e.g. JSONRenderer)
+    Other phases can be recorded in the view with "profile_phase" (e.g. a pivot of the results): like "serialize",
+    their duration excludes the SQL queries, and is not counted in "serialize".
+    """
+
+    def __init__(self):
+        self.start_time = time.perf_counter()
+        self.total_time = None
+        self.queries = 0
+        self.sql_time = 0
+        # Phase name => (start time, SQL time at start) for the running phases, (duration, SQL time) for the ended phases
+        self.running = {}
+        self.phases = {}
+
+
+    def __call__(self, execute, sql, params, many, context):
+        start_time = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - start_time
+            self.queries += 1
+
+
+    def start_phase(self, name):
+        self.running[name] = (time.perf_counter(), self.sql_time)
+
+
+    def end_phase(self, name):
+        if name in self.running:
+            start_time, sql_start = self.running.pop(name)
+            duration, sql_time = self.phases.get(name, (0, 0))
+            self.phases[name] = (duration + time.perf_counter() - start_time, sql_time + self.sql_time - sql_start)
+
+
+    def stop(self):
+        for name in list(self.running.keys()):
+            self.end_phase(name)
+        self.total_time = time.perf_counter() - self.start_time
+
+
+    def get_timings(self):
+        '''
+        Return type: dictionary of durations in milliseconds, by phase name
+        '''
+        timings = { 'total': self.total_time, 'sql': self.sql_time }
+        view_time = 0
+        for name, (duration, sql_time) in self.phases.items():
+            if name == 'view':
+                view_time += duration - sql_time
+            elif name == 'render':
+                timings[name] = duration
+            else:
+                # Phases recorded in the view
+                timings[name] = duration - sql_time
+                view_time -= timings[name]
+        if 'view' in self.phases:
+            timings['serialize'] = max(view_time, 0)
+        return { name: round(duration * 1000, 2) for name, duration in timings.items() }
+
+
+    def get_server_timing(self):
+        ''' Value of the "Server-Timing" header. '''
+        metrics = []
+        for name, duration in self.get_timings().items():
+            metric = f'{name};dur={duration}'
+            if name == 'sql':
+                metric += f';desc="{self.queries} queries"'
+            metrics.append(metric)
+        return ', '.join(metrics)
+
+
+@contextmanager
+def profile_phase(name):
+    ''' Record the duration of a block of code in the profile of the current request (if sampled). '''
+    profile = current_profile.get()
+    if profile is None:
+        yield
+        return
+    profile.start_phase(name)
+    try:
+        yield
+    finally:
+        profile.end_phase(name)
+
+
+class ProfilingMiddleware():
+    """
+    Profile a sample of the REST API requests (OP_PROFILING_RATE, between 0 and 1):
+    the timings by phase and the number of SQL queries are sent in the "Server-Timing" header
+    and logged as a JSON object (logger "rest_api.profiling").
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+
+    def is_sampled(self, request):
+        rate = settings.OP_PROFILING_RATE
+        return rate > 0 and request.path.startswith(settings.OP_PROFILING_PATH) and random.random() < rate
+
+
+    def __call__(self, request):
+        if not self.is_sampled(request):
+            return self.get_response(request)
+
+        profile = RequestProfile()
+        token = current_profile.set(profile)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(profile))
+                response = self.get_response(request)
+        finally:
+            current_profile.reset(token)
+        profile.stop()
+
+        response['Server-Timing'] = profile.get_server_timing()
+        resolver_match = getattr(request, 'resolver_match', None)
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.get_full_path(),
+            'route': resolver_match.url_name if resolver_match else None,
+            'status': response.status_code,
+            'streaming': response.streaming,
+            'queries': profile.queries,
+            'timings': profile.get_timings()
+        }))
+        return response
+
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        profile = current_profile.get()
+        if profile is not None:
+            profile.start_phase('view')
+
+
+    def process_template_response(self, request, response):
+        ''' The DRF responses are rendered after this hook: the post-render callback ends the "render" phase. '''
+        profile = current_profile.get()
+        if profile is not None:
+            profile.end_phase('view')
+            profile.start_phase('render')
+            response.add_post_render_callback(lambda r: profile.end_phase('render'))
+        return response
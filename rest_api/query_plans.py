@@ -0,0 +1,62 @@
+from functools import lru_cache
+from django.db.models.query import QuerySet
+from rest_framework.serializers import ListSerializer, ModelSerializer
+
+
+@lru_cache(maxsize=None)
+def get_query_plan(serializer_class, prefix='', in_prefetch=False):
+    '''
+    Build the list of related models to fetch with the queryset of a serializer:
+     - nested serializers: "select_related" for the foreign keys and "prefetch_related" for the many-to-many/reverse relations
+       (relations nested in a prefetched relation are also prefetched)
+     - relations used by the model properties, declared in the "query_plan" attribute of the serializer,
+       e.g. query_plan = { 'select_related': ['score'], 'prefetch_related': ['performance_metric'] }
+    Return type: tuple (list of "select_related" lookups, list of "prefetch_related" lookups)
+    '''
+    select = []
+    prefetch = []
+
+    declared_plan = getattr(serializer_class, 'query_plan', {})
+    for lookup in declared_plan.get('select_related', []):
+        (prefetch if in_prefetch else select).append(prefix+lookup)
+    for lookup in declared_plan.get('prefetch_related', []):
+        prefetch.append(prefix+lookup)
+
+    for field in serializer_class().fields.values():
+        many = isinstance(field, ListSerializer)
+        nested_serializer = field.child if many else field
+        if not isinstance(nested_serializer, ModelSerializer) or field.source == '*':
+            continue
+        lookup = prefix+field.source.replace('.', '__')
+        if many or in_prefetch:
+            prefetch.append(lookup)
+        else:
+            select.append(lookup)
+        nested_select, nested_prefetch = get_query_plan(type(nested_serializer), f'{lookup}__', in_prefetch or many)
+        select.extend(nested_select)
+        prefetch.extend(nested_prefetch)
+
+    return list(dict.fromkeys(select)), list(dict.fromkeys(prefetch))
+
+
+def apply_query_plan(queryset, serializer_class):
+    ''' Add the "select_related" and "prefetch_related" lookups needed by the serializer to the queryset. '''
+    if not isinstance(queryset, QuerySet):
+        return queryset
+    select, prefetch = get_query_plan(serializer_class)
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    return queryset
+
+
+class QueryPlanMixin():
+    """
+    Mixin for the generic views, applying the query plan of the serializer to the queryset,
+    so the serialization of the results doesn't trigger a query per result.
+    """
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        return apply_query_plan(queryset, self.get_serializer_class())
@@ -178,6 +178,12 @@ class PerformanceSerializer(serializers.ModelSerializer):
 
     evaluation_type = serializers.SerializerMethodField('get_eval_type_label')
 
+    # Relations used by the properties "associated_pgs_id" and "performance_metrics"
+    query_plan = {
+        'select_related': ['score'],
+        'prefetch_related': ['performance_metric']
+    }
+
     class Meta:
         model = Performance
         meta_fields = ('id', 'associated_pgs_id','publication','sample', 'platform', 'efo',
@@ -192,6 +198,12 @@ class PerformanceSerializer(serializers.ModelSerializer):
 
 class PerformanceLightSerializer(serializers.ModelSerializer):
     sample = SampleSerializer(many=False, read_only=True)
+
+    # Relation used by the property "performance_metrics"
+    query_plan = {
+        'prefetch_related': ['performance_metric']
+    }
+
     class Meta:
         model = Performance
         meta_fields = ('sample', 'performance_metrics', 'performance_additional', 'eval_type', 'covariates')
@@ -0,0 +1,173 @@
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+from datetime import datetime, timezone
+from django.conf import settings
+from django.http import HttpResponse
+from omicspred.models import Platform
+from .cache import cache_route, conditional_route, get_data_stamp
+from .compression import accepts_encoding
+from .tables import build_metabolite_table, build_protein_table, build_transcript_table, platform_key
+
+
+# Table type => (table builder, Platform type)
+table_types = {
+    'metabolite': (build_metabolite_table, 'Metabolomics'),
+    'protein': (build_protein_table, 'Proteomics'),
+    'transcript': (build_transcript_table, 'Transcriptomics')
+}
+
+
+class TableSnapshotStore():
+    """
+    Store of the precomputed table payloads, one gzipped JSON file per platform and table type.
+    An index file keeps the version (hash of the content), creation date and data stamp (see cache.get_data_stamp)
+    of each snapshot: a snapshot built from older data is not served.
+    """
+
+    index_filename = 'index.json'
+
+    def __init__(self, directory=None):
+        self.directory = directory if directory else settings.OP_SNAPSHOT_DIR
+
+
+    def snapshot_key(self, table_type, platform):
+        ''' Normalised key of a snapshot, e.g. "protein__somalogic". '''
+        return f'{table_type}__{platform_key(platform)}'
+
+
+    def load_index(self):
+        try:
+            with open(os.path.join(self.directory, self.index_filename)) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+
+    def write_file(self, filename, content):
+        ''' Write the file atomically, so the views never read a partial snapshot. '''
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, os.path.join(self.directory, filename))
+
+
+    def write(self, table_type, platform, data, index=None):
+        '''
+        Serialise, compress and store the table payload.
+        Return type: snapshot version (hash of the content)
+        '''
+        content = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        version = hashlib.sha1(content).hexdigest()
+        key = self.snapshot_key(table_type, platform)
+        filename = f'{key}.json.gz'
+        self.write_file(filename, gzip.compress(content, mtime=0))
+
+        save_index = index is None
+        if save_index:
+            index = self.load_index()
+        index[key] = {
+            'file': filename,
+            'version': version,
+            'created': datetime.now(timezone.utc).isoformat(),
+            'data_stamp': get_data_stamp()['token']
+        }
+        if save_index:
+            self.write_file(self.index_filename, json.dumps(index, indent=1).encode('utf-8'))
+        return version
+
+
+    def get_entry(self, table_type, platform):
+        '''
+        Index entry of a snapshot, if it was built from the current data.
+        Return type: dictionary with the file, version, creation date and data stamp of the snapshot, or None
+        '''
+        if not platform:
+            return None
+        entry = self.load_index().get(self.snapshot_key(table_type, platform))
+        if not entry or entry.get('data_stamp') != get_data_stamp()['token']:
+            return None
+        return entry
+
+
+    def read(self, table_type, platform):
+        '''
+        Fetch a stored snapshot, if it was built from the current data.
+        Return type: dictionary with the compressed payload and its version, or None
+        '''
+        entry = self.get_entry(table_type, platform)
+        if not entry:
+            return None
+        try:
+            with open(os.path.join(self.directory, entry['file']), 'rb') as f:
+                content = f.read()
+        except FileNotFoundError:
+            return None
+        return { 'content': content, 'version': entry['version'] }
+
+
+    def rebuild(self, table_types_list=None, platforms_list=None, verbose=False):
+        '''
+        Regenerate the snapshots from the database.
+        - table_types_list: list of table types (default: all of them)
+        - platforms_list: list of platform names (default: all the platforms of the corresponding type)
+        Return type: dictionary of the snapshot versions, by snapshot key
+        '''
+        versions = {}
+        index = self.load_index()
+        # Stamp of the data the snapshots are built from
+        get_data_stamp(refresh=True)
+        for table_type in (table_types_list or table_types.keys()):
+            table_builder, platform_type = table_types[table_type]
+            platforms = Platform.objects.filter(type__iexact=platform_type).values_list('name', flat=True).order_by('name')
+            for platform in platforms:
+                if platforms_list and platform_key(platform) not in [platform_key(x) for x in platforms_list]:
+                    continue
+                version = self.write(table_type, platform, table_builder(platform), index)
+                versions[self.snapshot_key(table_type, platform)] = version
+                if verbose:
+                    print(f'  > {table_type} table for {platform}: {version}')
+        self.write_file(self.index_filename, json.dumps(index, indent=1).encode('utf-8'))
+        return versions
+
+
+table_snapshots = TableSnapshotStore()
+
+
+def snapshot_response(request, snapshot):
+    '''
+    Serve a stored snapshot, compressed when the client accepts it.
+    The conditional requests (ETag/Last-Modified on the data and snapshot versions) are handled by the route (see cache.conditional_route).
+    Return type: HttpResponse
+    '''
+    if accepts_encoding(request, 'gzip'):
+        response = HttpResponse(snapshot['content'], content_type='application/json')
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = HttpResponse(gzip.decompress(snapshot['content']), content_type='application/json')
+    response['Vary'] = 'Accept-Encoding'
+    return response
+
+
+def snapshot_route(route_name, table_type, view_func):
+    '''
+    Cached and conditional route of a table served from its snapshot (see cache.cache_route and cache.conditional_route),
+    the version of the snapshot being part of the cache key and of the ETag.
+    '''
+    def get_entry(request):
+        # Index entry read once per request
+        if not hasattr(request, 'table_snapshot'):
+            request.table_snapshot = table_snapshots.get_entry(table_type, request.GET.get('platform'))
+        return request.table_snapshot
+    return conditional_route(cache_route(route_name, get_entry)(view_func), get_entry)
+
+
+def rebuild_table_snapshots(verbose=True):
+    ''' Regenerate all the table snapshots (e.g. after a data import). '''
+    if verbose:
+        print("# Rebuild table snapshots")
+    return table_snapshots.rebuild(verbose=verbose)
@@ -0,0 +1,225 @@
+import re
+from django.db.models import Prefetch, prefetch_related_objects
+from omicspred.models import *
+
+
+only_fields = ['id','name','platform_id','variants_number','platform__id','platform__name','metric_matrix__score_id','metric_matrix__metrics']
+metabolite_fields = ['id','name','external_id','pathway_group_id','pathway_subgroup_id','pathway_group__id','pathway_group__name','pathway_subgroup__id','pathway_subgroup__name']
+
+table_prefetch = {
+    'performances': Prefetch('score_performance', queryset=Performance.objects.only('id','score_id','sample_id').select_related('sample').all().prefetch_related('sample__cohorts','performance_metric').order_by('id')),
+    'metabolites': Prefetch('metabolites', queryset=Metabolite.objects.only(*metabolite_fields).select_related('pathway_group','pathway_subgroup').all().order_by('id')),
+    'proteins': Prefetch('proteins', queryset=Protein.objects.only('id','name','external_id').all().order_by('id')),
+    'genes': Prefetch('genes', queryset=Gene.objects.only('id','name','external_id','external_id_source').all().order_by('id'))
+}
+
+
+def platform_key(platform):
+    ''' Normalised platform name, insensitive to the case and punctuation (e.g. "Illumina RNAseq" => "illumina_rnaseq"). '''
+    return re.sub(r'[^a-z0-9]+', '_', platform.strip().lower())
+
+
+def get_platform_name(platform):
+    '''
+    Name of the Platform matching a "platform" URL parameter, compared with the same normalisation as the table snapshots.
+    Return type: Platform name or None
+    '''
+    if not platform:
+        return None
+    key = platform_key(platform)
+    for name in Platform.objects.values_list('name', flat=True).order_by('id'):
+        if platform_key(name) == key:
+            return name
+    return None
+
+
+class ColumnarTable():
+    """
+    Column oriented table, built in a single pass over the rows.
+    Each column holds a preallocated array of values (one cell per row), the missing
+    cells being already set to the default value, so no backfilling is needed.
+    """
+
+    def __init__(self, size, missing=''):
+        self.size = size
+        self.missing = missing
+        self.columns = {}
+        self.columns_names = []
+
+
+    def add_column(self, colname, label=None, **extra):
+        '''
+        Add a new column (if it doesn't exist yet) and return its array of values.
+        - colname: column identifier
+        - label: column name displayed (default: colname)
+        - extra: additional column information (e.g. title, type)
+        '''
+        if colname not in self.columns:
+            column = { "name": label if label is not None else colname }
+            column.update(extra)
+            column["data"] = [self.missing] * self.size
+            self.columns[colname] = column
+            self.columns_names.append(colname)
+        return self.columns[colname]["data"]
+
+
+    def set_value(self, colname, idx, value, label=None, **extra):
+        ''' Set the value of a cell, creating the column if needed. '''
+        self.add_column(colname, label, **extra)[idx] = value
+
+
+    def to_list(self):
+        ''' Return the list of columns, with the data indexed by row number. '''
+        data = []
+        for colname in self.columns_names:
+            column = dict(self.columns[colname])
+            column["data"] = dict(enumerate(column["data"]))
+            data.append(column)
+        return data
+
+
+def fetch_table_scores(platform, prefetch_list):
+    ''' Retrieve the list of Scores (with their related data) for a given platform (name of the Platform, see get_platform_name). '''
+    if not platform:
+        return []
+    queryset = Score.objects.only(*only_fields).select_related('platform','metric_matrix').filter(platform__name=platform).prefetch_related(*prefetch_list).order_by('num')
+    scores = list(queryset)
+    # Scores without denormalised cohort/metric estimates: fetch their Performance metrics instead
+    missing_matrix = [x for x in scores if x.metric_matrix_entries is None]
+    if missing_matrix:
+        prefetch_related_objects(missing_matrix, table_prefetch['performances'])
+    return scores
+
+
+def add_cohort_metrics(table, idx, score):
+    ''' Add the Performance Metric estimates of a Score, one column per cohort/metric. '''
+    entries = score.metric_matrix_entries
+    if entries is not None:
+        for entry in entries:
+            table.set_value(f"{entry['cohort']}_{entry['metric']}", idx, entry['estimate'], f"{entry['cohort']} {entry['metric']}")
+        return
+    for perf in score.score_performance.all():
+        cohort_name = perf.sample.cohorts.all()[0].name_short
+        for metric in perf.performance_metric.all():
+            metric_name = metric.name_short
+            table.set_value(f'{cohort_name}_{metric_name}', idx, metric.display_value(metric.estimate), f'{cohort_name} {metric_name}')
+
+
+def build_metabolite_table(platform):
+    ''' Build the table of Metabolite Scores for a given platform. '''
+    platform = get_platform_name(platform)
+    scores = fetch_table_scores(platform, [table_prefetch['metabolites']])
+    table = ColumnarTable(len(scores))
+
+    score_col = table.add_column('score', 'OMICSPRED ID')
+    metabolon_col = None
+    if platform == 'Metabolon':
+        metabolon_col = table.add_column('metabolon', 'Metabolon ID')
+    metabo_col = table.add_column('metabolite', 'Biochemical Name')
+    pathway_grp_col = table.add_column('pathway_group', 'Pathway Group')
+    pathway_subgrp_col = table.add_column('pathway_subgroup', 'Pathway Subgroup')
+    variants_nb_col = table.add_column('variants_number', '#SNP')
+
+    for idx, score in enumerate(scores):
+        score_col[idx] = score.id
+        # Metabolite Information
+        metabolite = score.metabolites.all()[0]
+        if metabolon_col:
+            metabolon_col[idx] = metabolite.external_id
+        metabo_col[idx] = metabolite.name
+        pathway_grp_col[idx] = metabolite.pathway_group.name if metabolite.pathway_group else None
+        pathway_subgrp_col[idx] = metabolite.pathway_subgroup.name if metabolite.pathway_subgroup else None
+        # #SNP
+        variants_nb_col[idx] = score.variants_number
+        # Cohorts
+        add_cohort_metrics(table, idx, score)
+
+    return table.to_list()
+
+
+def build_protein_table(platform):
+    ''' Build the table of Protein Scores for a given platform. '''
+    platform = get_platform_name(platform)
+    scores = fetch_table_scores(platform, [table_prefetch['genes'],table_prefetch['proteins']])
+    table = ColumnarTable(len(scores))
+
+    score_col = table.add_column('score', 'OMICSPRED ID')
+    somascan_col = None
+    if platform == 'Somalogic':
+        somascan_col = table.add_column('somascan', 'SOMAscan ID')
+    uniprot_col = table.add_column('uniprot', 'UniProt ID')
+    gene_col = table.add_column('gene', 'Gene')
+    protein_col = table.add_column('protein', 'Protein')
+    variants_nb_col = table.add_column('variants_number', '#SNP')
+
+    for idx, score in enumerate(scores):
+        score_col[idx] = score.id
+        if somascan_col:
+            somascan_col[idx] = score.name
+        # Protein Information
+        # Sorting here instead of using the queryset method "order_by" to avoid generating more SQL queries
+        proteins = score.proteins.all()
+        uniprot_col[idx] = ';'.join(sorted(set([x.external_id for x in proteins if x.external_id])))
+        protein_col[idx] = ';'.join(sorted(set([x.name for x in proteins if x.name])))
+        # Gene information
+        gene_col[idx] = ';'.join(sorted(set([x.name for x in score.genes.all() if x.name])))
+        # #SNP
+        variants_nb_col[idx] = score.variants_number
+        # Cohorts
+        add_cohort_metrics(table, idx, score)
+
+    return table.to_list()
+
+
+def build_transcript_table(platform):
+    ''' Build the table of Transcript Scores for a given platform. '''
+    platform = get_platform_name(platform)
+    scores = fetch_table_scores(platform, [table_prefetch['genes']])
+    table = ColumnarTable(len(scores))
+
+    score_col = table.add_column('score', 'OMICSPRED ID')
+    ensembl_col = table.add_column('ensembl', 'Ensembl ID')
+    gene_col = table.add_column('gene', 'Gene')
+    variants_nb_col = table.add_column('variants_number', '#SNP')
+
+    for idx, score in enumerate(scores):
+        score_col[idx] = score.id
+        # Gene information
+        genes = score.genes.all()
+        ensembl_col[idx] = ';'.join(sorted(set([x.external_id for x in genes if x.external_id and x.external_id_source == 'Ensembl'])))
+        gene_col[idx] = ';'.join(sorted(set([x.name for x in genes if x.name])))
+        # #SNP
+        variants_nb_col[idx] = score.variants_number
+        # Cohorts
+        add_cohort_metrics(table, idx, score)
+
+    return table.to_list()
+
+
+def build_plot_table(platform):
+    '''
+    Build the table of the Performance Metric estimates of the Scores of a given platform, one column per cohort/metric,
+    for the plots. The estimates are fetched with a single flat query (Metric/Performance/Sample cohorts)
+    and pivoted in one pass, with the Scores in the order of their IDs.
+    '''
+    platform = get_platform_name(platform)
+    if not platform:
+        return []
+    score_ids = Performance.objects.filter(platform__name=platform).values_list('score_id', flat=True).distinct().order_by('score_id')
+    score_idx = { score_id: idx for idx, score_id in enumerate(score_ids) }
+    rows = Metric.objects.filter(performance__platform__name=platform).values_list(
+        'id', 'performance__score_id', 'performance__sample__cohorts__name_short', 'name_short', 'estimate'
+    ).order_by('performance__score_id', 'performance_id', 'id', 'performance__sample__cohorts__id')
+
+    table = ColumnarTable(len(score_idx), missing=None)
+    previous_metric_id = None
+    for metric_id, score_id, cohort_name, metric_name, estimate in rows.iterator(chunk_size=10000):
+        # Only the first cohort of the Sample is used
+        if metric_id == previous_metric_id or cohort_name is None:
+            continue
+        previous_metric_id = metric_id
+        cohort_name = cohort_name.replace(' ','_')
+        colname = f'{cohort_name}_{metric_name}'
+        table.set_value(colname, score_idx[score_id], Metric.display_value(estimate), cohort_name, title=colname, type=f'_{metric_name}')
+
+    return table.to_list()
@@ -1,3 +1,801 @@
-from django.test import TestCase
+import csv
+import datetime
+import decimal
+import io
+import json
+import os
+import random
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+from unittest import mock
+from django.core.cache import caches
+from django.conf import settings
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils.translation import gettext_lazy
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from imports.synthetic import SyntheticDataGenerator
+from omicspred.models import *
+from .cache import get_data_stamp, invalidate_cache, normalise_cache_key
+from .compression import accepts_encoding
+from .entity_index import entity_score_index
+from .export import CatalogueExport, ScoreBatch, export_types
+from .pagination import CustomPagination, get_estimated_count
+from .renderers import FastJSONRenderer
+from .snapshots import table_snapshots, table_types as snapshot_table_types
+from .tables import ColumnarTable, build_plot_table
+from .urls import urlpatterns
 
-# Create your tests here.
+
+class QueryCounter():
+    """
+    Count the database queries and their execution time, using a connection execute wrapper
+    (not limited by the size of the Django queries log).
+    """
+
+    def __init__(self):
+        self.queries = []
+        self.sql_time = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        start_time = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - start_time
+            self.queries.append(sql)
+
+    def __len__(self):
+        return len(self.queries)
+
+
+class QueryBudgetTestMixin():
+    """ Assertion on the maximum number of database queries run by a block of code """
+
+    @contextmanager
+    def assertQueryBudget(self, budget, label=''):
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            yield counter
+        if len(counter) > budget:
+            queries = '\n'.join([f'  {i+1}. {x}' for i, x in enumerate(counter.queries[:50])])
+            self.fail(f'{label}: {len(counter)} queries run, over the budget of {budget} queries\n{queries}')
+
+    def clear_cache(self):
+        ''' Clear the cached responses, keeping the data stamp (read from the database once per OP_DATA_VERSION_TTL seconds) '''
+        caches[settings.OP_CACHE_ALIAS].clear()
+        get_data_stamp()
+
+
+class PerformanceQueryPlanTest(QueryBudgetTestMixin, TestCase):
+    """ Number of queries of the Performance endpoints, which shouldn't depend on the number of results """
+
+    scores_count = 40
+    # Count + Performances + Metrics + Sample Cohorts
+    budget = 4
+
+    @classmethod
+    def setUpTestData(cls):
+        publication = Publication.objects.create(pmid=1, doi='10.1/test', journal='Journal', firstauthor='Author A', authors='Author A', title='Title', date_publication='2023-01-01')
+        platform = Platform.objects.create(name='Somalogic', full_name='SomaScan', version='v4', technic='Aptamer', type='Proteomics')
+        efo = EFO.objects.create(id='UBERON_0001969', label='blood plasma', url='http://purl.obolibrary.org/obo/UBERON_0001969')
+        samples = []
+        for cohort_name in ['INTERVAL', 'ORCADES', 'UKB']:
+            cohort = Cohort.objects.create(name_short=cohort_name, name_full=cohort_name)
+            sample = Sample.objects.create(sample_number=1000, ancestry_broad='European')
+            sample.cohorts.set([cohort])
+            samples.append(sample)
+        for num in range(1, cls.scores_count+1):
+            score = Score()
+            score.set_score_ids(num)
+            score.trait_reported = f'Protein {num}'
+            score.method_name = 'Bayesian Ridge'
+            score.variants_number = num
+            score.publication = publication
+            score.platform = platform
+            score.save()
+            for sample in samples:
+                performance = Performance.objects.create(score=score, publication=publication, sample=sample, platform=platform, efo=efo, eval_type='IV')
+                Metric.objects.create(performance=performance, performance_type='PC', name='Pearson correlation coefficient (r)', name_short='R2', estimate=0.5)
+                Metric.objects.create(performance=performance, performance_type='SC', name="Spearman's rank correlation", name_short='Rho', estimate=0.4, pvalue=0.001)
+
+
+    def setUp(self):
+        # Cached responses and counts
+        self.clear_cache()
+
+
+    def test_list_performances(self):
+        for limit in (5, 100):
+            url = f'/rest/performance/all?limit={limit}'
+            with self.assertQueryBudget(self.budget, url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+            results = response.json()['results']
+            self.assertEqual(len(results), limit)
+            self.assertEqual(results[0]['associated_pgs_id'], 'OPGS000001')
+            self.assertEqual(len(results[0]['performance_metrics']), 2)
+            self.assertEqual(results[0]['sample']['cohorts'][0]['name_short'], 'INTERVAL')
+
+
+    def test_search_performances(self):
+        for url in ('/rest/performance/search?platform=Somalogic&limit=100', '/rest/performance/search?opgs_id=OPGS000002'):
+            with self.assertQueryBudget(self.budget, url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.json()['results'])
+
+
+class ProfilingMiddlewareTest(TestCase):
+    """ Server-Timing header of the profiled requests """
+
+    def setUp(self):
+        caches[settings.OP_CACHE_ALIAS].clear()
+        Cohort.objects.create(name_short='INTERVAL', name_full='INTERVAL')
+
+
+    def test_server_timing(self):
+        with override_settings(OP_PROFILING_RATE=1), self.assertLogs('rest_api.profiling') as logs:
+            response = self.client.get('/rest/cohort/all')
+        metrics = [x.split(';')[0] for x in response['Server-Timing'].split(', ')]
+        self.assertEqual(metrics, ['total', 'sql', 'render', 'serialize'])
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['route'], 'getAllCohorts')
+        self.assertGreater(record['queries'], 0)
+
+
+    def test_not_sampled(self):
+        with override_settings(OP_PROFILING_RATE=0):
+            response = self.client.get('/rest/cohort/all')
+        self.assertFalse(response.has_header('Server-Timing'))
+
+
+class CacheRouteTest(TestCase):
+    """ Cached responses: keys independent of the trailing slash and parameters order, routes disabled by OP_CACHE_TTL, hit/miss counters and invalidation """
+
+    url = '/rest/cohort/all'
+
+    @classmethod
+    def setUpTestData(cls):
+        for name in ('INTERVAL', 'ORCADES'):
+            Cohort.objects.create(name_short=name, name_full=name)
+
+
+    def setUp(self):
+        caches[settings.OP_CACHE_ALIAS].clear()
+
+
+    def get_stats(self, route_name):
+        return self.client.get('/rest/cache/stats').json()['routes'].get(route_name)
+
+
+    def get_cohorts(self):
+        return [x['name_short'] for x in self.client.get(self.url).json()['results']]
+
+
+    def test_normalised_key(self):
+        factory = RequestFactory()
+        self.assertEqual(
+            normalise_cache_key(factory.get('/x/?b=1&a=2'), 'route'),
+            normalise_cache_key(factory.get('/x?a=2&b=1'), 'route')
+        )
+        self.client.get(self.url+'/?limit=10&offset=0')
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url+'?offset=0&limit=10')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get_stats('getAllCohorts'), { 'hit': 1, 'miss': 1, 'ttl': settings.OP_CACHE_TTL['getAllCohorts'] })
+
+
+    def test_disabled_route(self):
+        with override_settings(OP_CACHE_TTL={ **settings.OP_CACHE_TTL, 'getAllCohorts': 0 }):
+            self.assertEqual(self.get_cohorts(), ['INTERVAL', 'ORCADES'])
+            Cohort.objects.create(name_short='UKB', name_full='UKB')
+            self.assertEqual(self.get_cohorts(), ['INTERVAL', 'ORCADES', 'UKB'])
+        self.assertIsNone(self.get_stats('getAllCohorts'))
+
+
+    def test_invalidate(self):
+        self.assertEqual(self.get_cohorts(), ['INTERVAL', 'ORCADES'])
+        Cohort.objects.create(name_short='UKB', name_full='UKB')
+        self.assertEqual(self.get_cohorts(), ['INTERVAL', 'ORCADES'])
+        self.assertEqual(self.get_stats('getAllCohorts'), { 'hit': 1, 'miss': 1, 'ttl': settings.OP_CACHE_TTL['getAllCohorts'] })
+        invalidate_cache()
+        self.assertEqual(self.get_cohorts(), ['INTERVAL', 'ORCADES', 'UKB'])
+        self.assertEqual(self.get_stats('getAllCohorts')['miss'], 2)
+
+
+class FastJSONRendererTest(TestCase):
+    """ Same output as the DRF JSONRenderer, including the types encoded by the DRF encoder and the fallback on the stdlib "json" """
+
+    def assertSameRendering(self, data):
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+
+    def test_render(self):
+        self.assertSameRendering({
+            'decimal': decimal.Decimal('1.50'),
+            'lazy': gettext_lazy('Score'),
+            'datetime': datetime.datetime(2023, 3, 29, 12, 30, 15, 250000, tzinfo=datetime.timezone.utc),
+            'date': datetime.date(2023, 3, 29),
+            'time': datetime.time(12, 30),
+            'uuid': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+            'unicode': 'Johansson \u00c5, line\u2028separator\u2029',
+            'data': { 0: 'OPGS000001', 1: None },
+            'floats': [0.1, 1e-10, 0, -2.5],
+            'queryset': Cohort.objects.none()
+        })
+
+
+    def test_fallback(self):
+        # Integer over 64 bits (not encoded by orjson)
+        self.assertSameRendering({ 'value': 2**70, 'text': '\u2028' })
+        self.assertEqual(FastJSONRenderer().render({ 'value': 2**70 }), b'{"value":1180591620717411303424}')
+        self.assertEqual(FastJSONRenderer().render(None), b'')
+
+
+class ConditionalGetTest(QueryBudgetTestMixin, TestCase):
+    """ Data-aware ETag of the catalogue endpoints: "304 Not Modified" without database query, until the data stamp changes """
+
+    url = '/rest/plot/search?platform=Somalogic'
+
+    def setUp(self):
+        caches[settings.OP_CACHE_ALIAS].clear()
+
+
+    def test_not_modified(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        with self.assertQueryBudget(0, self.url):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        # Same data: the ETag is still valid after the invalidation of the cache
+        invalidate_cache()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+
+    @override_settings(OP_DATA_VERSION_TTL=0)
+    def test_data_changed(self):
+        response = self.client.get(self.url)
+        etag = response['ETag']
+        # Import run by another process: the cache of this process is not invalidated
+        ImportRun.objects.create(study='Study', filepath='study.csv', rows_count=1, batch_size=1)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+
+class ScoreMetricMatrixTest(QueryBudgetTestMixin, TestCase):
+    """ Same performance data from the ScoreMetricMatrix and from the Performance metrics (Scores without matrix), in a fixed number of queries """
+
+    url = '/rest/test/protein/?platform=Somalogic&limit=100'
+    # Count + Scores + Proteins + Genes + fallback Performances + Metrics
+    budget = 6
+
+    @classmethod
+    def setUpTestData(cls):
+        SyntheticDataGenerator(scores_per_platform=10).generate()
+
+
+    def setUp(self):
+        self.clear_cache()
+
+
+    def test_performance_data_fallback(self):
+        with self.assertQueryBudget(self.budget, self.url):
+            results = self.client.get(self.url).json()['results']
+        self.assertTrue(all(x['performance_data'] for x in results))
+
+        ScoreMetricMatrix.objects.filter(score__platform__name='Somalogic', score__id__in=[x['id'] for x in results[::2]]).delete()
+        self.clear_cache()
+        with self.assertQueryBudget(self.budget, self.url):
+            fallback_results = self.client.get(self.url).json()['results']
+        self.assertEqual(fallback_results, results)
+
+
+class RouteQueryBudgetTest(QueryBudgetTestMixin, TestCase):
+    """
+    Call every route of the REST API against a synthetic database (SyntheticDataGenerator) and compare the number of queries
+    with the budgets stored in "query_budgets.json".
+    - Record the budgets (e.g. after adding a route): OP_RECORD_QUERY_BUDGETS=1 python manage.py test rest_api
+    - Save the report of the queries count, SQL time and wall time of each route: OP_QUERY_REPORT=<filepath>
+    """
+
+    budgets_file = os.path.join(os.path.dirname(__file__), 'query_budgets.json')
+    scores_per_platform = 400
+
+    # Route name => (HTTP method, URL, POST data)
+    route_requests = {
+        'getAllCohorts': ('get', '/rest/cohort/all', None),
+        'getAllPerformanceMetrics': ('get', '/rest/performance/all?limit=500', None),
+        'searchPerformanceMetrics': ('get', '/rest/performance/search?platform=Somalogic&limit=500', None),
+        'getAllPublications': ('get', '/rest/publication/all', None),
+        'searchPublications': ('get', '/rest/publication/search?pmid=99999999', None),
+        'getAllSamples': ('get', '/rest/sample/all', None),
+        'getAllScores': ('get', '/rest/score/all?limit=500', None),
+        'searchScoresByGene': ('get', '/rest/score/searchbygene/illug1', None),
+        'searchScoresByProtein': ('get', '/rest/score/searchbyprotein/S00001', None),
+        'searchScoresByMetabolite': ('get', '/rest/score/searchbymetabolite/META1', None),
+        'searchScores': ('get', '/rest/score/search?platform=Olink&limit=500', None),
+        'getScoresBatch': ('post', '/rest/score/batch', { 'filter_ids': [f'OPGS{x:06d}' for x in range(1, 2001, 2)] }),
+        'mapScoresByEntity': ('post', '/rest/score/map', { 'queries': ['ILLUG1', 'S00001', 'META1', 'unknown'] }),
+        'getScore': ('get', '/rest/score/OPGS000001', None),
+        'getAllPlatforms': ('get', '/rest/platform/all', None),
+        'searchTables': ('get', '/rest/table/search?platform=Nightingale&limit=500', None),
+        'searchMetaboliteTables': ('get', '/rest/table/metabolite/search?platform=Metabolon', None),
+        'searchProteinTables': ('get', '/rest/table/protein/search?platform=Somalogic', None),
+        'searchEnsemblTables': ('get', '/rest/table/transcript/search?platform=Illumina RNAseq', None),
+        'searchPlots': ('get', '/rest/plot/search?platform=Somalogic', None),
+        'exportCatalogue': ('get', '/rest/export/performance', None),
+        'getCacheStats': ('get', '/rest/cache/stats', None),
+        'searchTestMetabolite': ('get', '/rest/test/metabolite/?platform=Metabolon&limit=500', None),
+        'searchTestProtein': ('get', '/rest/test/protein/?platform=Somalogic&limit=500', None),
+        'searchTestTranscript': ('get', '/rest/test/transcript/?platform=Illumina RNAseq&limit=500', None)
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        SyntheticDataGenerator(scores_per_platform=cls.scores_per_platform).generate()
+
+
+    def setUp(self):
+        # Uncached responses and live tables
+        self.clear_cache()
+        entity_score_index.version = None
+        self.snapshot_dir = tempfile.TemporaryDirectory()
+        self.snapshot_dir_default = table_snapshots.directory
+        table_snapshots.directory = self.snapshot_dir.name
+
+
+    def tearDown(self):
+        table_snapshots.directory = self.snapshot_dir_default
+        self.snapshot_dir.cleanup()
+
+
+    def load_budgets(self):
+        try:
+            with open(self.budgets_file) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+
+    def call_route(self, method, url, data):
+        '''
+        Call a route and measure its queries.
+        Return type: dictionary with the response status code, the number of queries, the SQL time and the wall time
+        '''
+        counter = QueryCounter()
+        start_time = time.perf_counter()
+        with connection.execute_wrapper(counter):
+            if method == 'post':
+                response = self.client.post(url, data, content_type='application/json')
+            else:
+                response = self.client.get(url)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        return {
+            'status_code': response.status_code,
+            'queries': len(counter),
+            'sql_time': round(counter.sql_time, 4),
+            'wall_time': round(time.perf_counter() - start_time, 4)
+        }
+
+
+    def test_routes_have_requests(self):
+        route_names = [x.name for x in urlpatterns if x.name]
+        self.assertEqual(sorted(route_names), sorted(self.route_requests.keys()))
+
+
+    def test_routes_query_budgets(self):
+        budgets = self.load_budgets()
+        record = os.getenv('OP_RECORD_QUERY_BUDGETS')
+        report = {}
+        for route_name, (method, url, data) in self.route_requests.items():
+            with self.subTest(route=route_name):
+                stats = self.call_route(method, url, data)
+                report[route_name] = stats
+                self.assertEqual(stats['status_code'], 200, url)
+                if record:
+                    continue
+                self.assertIn(route_name, budgets, f'No query budget recorded for the route {route_name}')
+                budget = budgets[route_name]['queries']
+                self.assertLessEqual(stats['queries'], budget, f'{route_name} ({url}): {stats["queries"]} queries run, over the budget of {budget} queries')
+
+        if record:
+            with open(self.budgets_file, 'w') as f:
+                json.dump({ name: { 'queries': stats['queries'] } for name, stats in report.items() }, f, indent=1, sort_keys=True)
+                f.write('\n')
+        report_file = os.getenv('OP_QUERY_REPORT')
+        if report_file:
+            with open(report_file, 'w') as f:
+                json.dump(report, f, indent=1)
+
+
+class TableSnapshotTest(TestCase):
+    """ Same table payload from the snapshots and from the live table builders, whatever the case of the platform name """
+
+    url = '/rest/table/protein/search?platform='
+
+    @classmethod
+    def setUpTestData(cls):
+        SyntheticDataGenerator(scores_per_platform=5).generate()
+
+
+    def setUp(self):
+        caches[settings.OP_CACHE_ALIAS].clear()
+        self.snapshot_dir = tempfile.TemporaryDirectory()
+        self.snapshot_dir_default = table_snapshots.directory
+        table_snapshots.directory = self.snapshot_dir.name
+
+
+    def tearDown(self):
+        table_snapshots.directory = self.snapshot_dir_default
+        self.snapshot_dir.cleanup()
+
+
+    def test_platform_name(self):
+        platforms = ('Somalogic', 'somalogic', ' SOMALOGIC')
+        live_tables = [self.client.get(self.url+x).json() for x in platforms]
+        self.assertIn('SOMAscan ID', [x['name'] for x in live_tables[0]])
+        for table in live_tables[1:]:
+            self.assertEqual(table, live_tables[0])
+
+        table_snapshots.rebuild(['protein'])
+        caches[settings.OP_CACHE_ALIAS].clear()
+        for platform in platforms:
+            self.assertEqual(self.client.get(self.url+platform).json(), live_tables[0])
+
+
+    def test_snapshot_etag(self):
+        live_etag = self.client.get(self.url+'Somalogic')['ETag']
+        table_snapshots.rebuild(['protein'])
+        response = self.client.get(self.url+'Somalogic')
+        etag = response['ETag']
+        # Data version and snapshot version
+        self.assertTrue(etag.startswith(live_etag[:-1]+'-'))
+        self.assertEqual(self.client.get(self.url+'Somalogic', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # Snapshot content changed (e.g. new table builder), same data
+        table = response.json()
+        with mock.patch.dict(snapshot_table_types, { 'protein': (lambda platform: table[:1], 'Proteomics') }):
+            table_snapshots.rebuild(['protein'])
+        response = self.client.get(self.url+'Somalogic', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json(), table[:1])
+
+
+    @override_settings(OP_DATA_VERSION_TTL=0)
+    def test_stale_snapshot(self):
+        table_snapshots.rebuild(['protein'])
+        self.assertIsNotNone(table_snapshots.read('protein', 'Somalogic'))
+        # Data changed without rebuilding the snapshots: live table
+        score = Score.objects.filter(platform__name='Somalogic').order_by('num').last()
+        score.delete()
+        self.assertIsNone(table_snapshots.read('protein', 'Somalogic'))
+        table = self.client.get(self.url+'Somalogic').json()
+        self.assertNotIn(score.id, table[0]['data'].values())
+        self.assertEqual(len(table[0]['data']), Score.objects.filter(platform__name='Somalogic').count())
+
+
+    def test_table_shape(self):
+        # Same JSON shape as the tables built row by row: list of columns, with the cells indexed by row number
+        scores = list(Score.objects.filter(platform__name='Somalogic').order_by('num').values_list('id', 'name'))
+        table = self.client.get(self.url+'Somalogic').json()
+        self.assertTrue(all(list(x.keys()) == ['name', 'data'] for x in table))
+        self.assertEqual([x['name'] for x in table[:6]], ['OMICSPRED ID', 'SOMAscan ID', 'UniProt ID', 'Gene', 'Protein', '#SNP'])
+        self.assertEqual(sorted([x['name'] for x in table[6:]]), sorted([f'{x} {y}' for x in ('INTERVAL', 'FENLAND', 'MEC') for y in ('R2', 'Rho')]))
+        for column in table:
+            self.assertEqual(list(column['data'].keys()), [str(x) for x in range(len(scores))])
+        self.assertEqual(list(table[0]['data'].values()), [x[0] for x in scores])
+        self.assertEqual(list(table[1]['data'].values()), [x[1] for x in scores])
+
+        # Missing cells filled with the default value
+        table = ColumnarTable(2)
+        table.set_value('INTERVAL_R2', 1, 0.5, 'INTERVAL R2')
+        self.assertEqual(table.to_list(), [{ 'name': 'INTERVAL R2', 'data': { 0: '', 1: 0.5 } }])
+
+
+    def test_snapshot_encoding(self):
+        table_snapshots.rebuild(['protein'])
+        response = self.client.get(self.url+'Somalogic', HTTP_ACCEPT_ENCODING='gzip;q=0, identity')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        response = self.client.get(self.url+'Somalogic', HTTP_ACCEPT_ENCODING='gzip;q=0.5')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+
+    def test_accepts_encoding(self):
+        factory = RequestFactory()
+        cases = [
+            ('gzip', True), ('GZIP, br', True), ('gzip;q=0', False), ('gzip; q=0.0, br', False),
+            ('br;q=1.0, gzip;q=0.8', True), ('*', True), ('*;q=0', False), ('identity', False), ('', False)
+        ]
+        for header, accepted in cases:
+            with self.subTest(header=header):
+                request = factory.get('/', HTTP_ACCEPT_ENCODING=header)
+                self.assertEqual(accepts_encoding(request, 'gzip'), accepted)
+
+
+class PlotTableTest(TestCase):
+    """ Plot data: one column per cohort/metric (in the order of the Scores and their metrics), one row per Score (by Score ID) """
+
+    @classmethod
+    def setUpTestData(cls):
+        publication = Publication.objects.create(pmid=1, doi='10.1/test', journal='Journal', firstauthor='Author A', authors='Author A', title='Title', date_publication='2023-01-01')
+        platform = Platform.objects.create(name='Somalogic', type='Proteomics')
+        samples = {}
+        for cohort_name in ['INTERVAL', 'FENLAND STUDY']:
+            cohort = Cohort.objects.create(name_short=cohort_name, name_full=cohort_name)
+            samples[cohort_name] = Sample.objects.create(sample_number=1000, ancestry_broad='European')
+            samples[cohort_name].cohorts.set([cohort])
+        # Score number => list of (cohort, metric, estimate), the Scores created in reverse order
+        metrics = {
+            3: [('INTERVAL', 'R2', 0.000001)],
+            2: [('FENLAND STUDY', 'Rho', 0.25)],
+            1: [('INTERVAL', 'R2', 0.5), ('INTERVAL', 'Rho', 0.123456789), ('FENLAND STUDY', 'R2', 0.3)]
+        }
+        for num, score_metrics in metrics.items():
+            score = Score(trait_reported='Protein', method_name='Bayesian Ridge', variants_number=10, publication=publication, platform=platform)
+            score.set_score_ids(num)
+            score.save()
+            performances = {}
+            for cohort_name, metric_name, estimate in score_metrics:
+                if cohort_name not in performances:
+                    performances[cohort_name] = Performance.objects.create(score=score, publication=publication, sample=samples[cohort_name], platform=platform, eval_type='IV')
+                Metric.objects.create(performance=performances[cohort_name], performance_type='PC', name=metric_name, name_short=metric_name, estimate=estimate)
+
+
+    def test_plot_table(self):
+        table = build_plot_table('somalogic')
+        self.assertEqual([(x['name'], x['title'], x['type']) for x in table], [
+            ('INTERVAL', 'INTERVAL_R2', '_R2'),
+            ('INTERVAL', 'INTERVAL_Rho', '_Rho'),
+            ('FENLAND_STUDY', 'FENLAND_STUDY_R2', '_R2'),
+            ('FENLAND_STUDY', 'FENLAND_STUDY_Rho', '_Rho')
+        ])
+        # Rows by Score ID, missing cells set to None
+        self.assertEqual([x['data'] for x in table], [
+            { 0: 0.5, 1: None, 2: '1.00e-06' },
+            { 0: 0.12346, 1: None, 2: None },
+            { 0: 0.3, 1: None, 2: None },
+            { 0: None, 1: 0.25, 2: None }
+        ])
+        self.assertEqual(build_plot_table('Olink'), [])
+        self.assertEqual(self.client.get('/rest/plot/search?platform=Somalogic').json()[0]['data'], { '0': 0.5, '1': None, '2': '1.00e-06' })
+
+
+class PaginationTest(TestCase):
+    """ Cursor (keyset) pagination and count strategies of the paginated responses """
+
+    @classmethod
+    def setUpTestData(cls):
+        SyntheticDataGenerator(scores_per_platform=10).generate()
+
+
+    def setUp(self):
+        caches[settings.OP_CACHE_ALIAS].clear()
+
+
+    def follow(self, url, link):
+        '''
+        Follow the "next" or "previous" links from a URL.
+        Return type: list of pages (list of result IDs)
+        '''
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            content = response.json()
+            self.assertIsNone(content['count'])
+            pages.append([x['id'] for x in content['results']])
+            url = content[link]
+        return pages
+
+
+    def check_cursor_pages(self, url, expected_ids, limit):
+        pages = self.follow(url, 'next')
+        self.assertEqual([x for page in pages for x in page], expected_ids)
+        self.assertTrue(all(len(page) == limit for page in pages[:-1]))
+        self.assertIsNone(self.client.get(url).json()['previous'])
+
+        # Back to the first page, from the last page
+        last_page = self.client.get(url).json()
+        while last_page['next']:
+            last_page = self.client.get(last_page['next']).json()
+        self.assertEqual(self.follow(last_page['previous'], 'previous'), pages[-2::-1])
+
+
+    def test_cursor_num(self):
+        expected_ids = list(Score.objects.order_by('num').values_list('id', flat=True))
+        self.check_cursor_pages('/rest/score/all?limit=7&cursor=', expected_ids, 7)
+
+
+    def test_cursor_id(self):
+        expected_ids = list(Performance.objects.filter(platform__name='Somalogic').order_by('id').values_list('id', flat=True))
+        self.check_cursor_pages('/rest/performance/search?platform=Somalogic&limit=9&cursor=', expected_ids, 9)
+
+
+    def test_cursor_invalid(self):
+        for param in ('cursor', 'cursor_before'):
+            response = self.client.get(f'/rest/score/all?{param}=OPGS000001')
+            self.assertEqual(response.status_code, 400)
+
+
+    def test_has_next(self):
+        url = '/rest/score/search?platform=Somalogic&count=false&limit='
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            content = self.client.get(url+'9').json()
+        # One extra result fetched, without counting the results
+        self.assertTrue(any('LIMIT 10' in x for x in counter.queries))
+        self.assertFalse(any('COUNT(' in x for x in counter.queries))
+        self.assertEqual((content['size'], content['count']), (9, None))
+        self.assertIn('offset=9', content['next'])
+        content = self.client.get(url+'10').json()
+        self.assertEqual(content['size'], 10)
+        self.assertIsNone(content['next'])
+
+
+    def test_count_strategies(self):
+        url = '/rest/performance/search?platform=Somalogic&limit=5'
+        count = Performance.objects.filter(platform__name='Somalogic').count()
+        # Not counted
+        self.assertIsNone(self.client.get(url+'&count=false').json()['count'])
+        # Exact count, cached per query
+        self.assertEqual(self.client.get(url).json()['count'], count)
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            content = self.client.get(url+'&offset=5').json()
+        self.assertEqual(content['count'], count)
+        self.assertFalse(any('COUNT(' in x for x in counter.queries))
+
+        # Estimate from the database statistics (PostgreSQL only), for the unfiltered querysets of the views using it
+        self.assertIsNone(get_estimated_count(Score.objects.all()))
+        self.assertIsNone(get_estimated_count(Score.objects.filter(platform__name='Somalogic')))
+        with mock.patch('rest_api.pagination.get_estimated_count', return_value=1000):
+            self.assertEqual(self.client.get('/rest/score/all?limit=5').json()['count'], 1000)
+            self.assertEqual(self.client.get('/rest/score/search?platform=Somalogic&limit=5').json()['count'], 10)
+        self.assertEqual(self.client.get('/rest/score/all?limit=5&offset=5').json()['count'], Score.objects.count())
+
+
+    def test_subclass(self):
+        class SubPagination(CustomPagination):
+            pass
+        paginator = SubPagination()
+        request = Request(RequestFactory().get('/rest/score/all?limit=5&offset=10'))
+        page = paginator.paginate_queryset(Score.objects.order_by('num'), request)
+        self.assertEqual(len(page), 5)
+        self.assertIn('offset=5', paginator.get_previous_link())
+
+
+class ExportTest(TestCase):
+    """ Streamed catalogue exports (NDJSON/CSV) and batch retrieval of Scores by ID """
+
+    batch_url = '/rest/score/batch'
+
+    @classmethod
+    def setUpTestData(cls):
+        SyntheticDataGenerator(scores_per_platform=10).generate()
+
+
+    def get_content(self, response):
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode('utf-8')
+
+
+    def test_export(self):
+        models = {
+            'score': Score.objects.order_by('num').values_list('id', flat=True),
+            'performance': Performance.objects.order_by('id').values_list('id', flat=True),
+            'sample': Sample.objects.order_by('id').values_list('sample_number', flat=True)
+        }
+        # Several chunks of entries
+        with mock.patch.object(CatalogueExport, 'chunk_size', 7):
+            for export_type, values in models.items():
+                with self.subTest(export_type=export_type):
+                    url = f'/rest/export/{export_type}'
+                    response = self.client.get(url)
+                    self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+                    self.assertEqual(response['Content-Disposition'], f'attachment; filename="omicspred_{export_type}s.ndjson"')
+                    entries = [json.loads(x) for x in self.get_content(response).splitlines()]
+                    key = 'sample_number' if export_type == 'sample' else 'id'
+                    self.assertEqual([x[key] for x in entries], list(values))
+
+                    response = self.client.get(url+'?output=CSV')
+                    self.assertEqual(response['Content-Type'], 'text/csv')
+                    rows = list(csv.reader(io.StringIO(self.get_content(response))))
+                    columns = export_types[export_type]['columns']
+                    self.assertEqual(rows[0], columns)
+                    self.assertEqual([x[columns.index(key)] for x in rows[1:]], [str(x) for x in values])
+
+
+    def test_export_platform(self):
+        content = self.get_content(self.client.get('/rest/export/score?output=csv&platform=somalogic'))
+        rows = list(csv.DictReader(io.StringIO(content)))
+        self.assertEqual([x['id'] for x in rows], list(Score.objects.filter(platform__name='Somalogic').order_by('num').values_list('id', flat=True)))
+        self.assertEqual(set(x['platform.name'] for x in rows), {'Somalogic'})
+        # One field per list of entities, the values joined with "|"
+        score = Score.objects.filter(platform__name='Somalogic').order_by('num').first()
+        self.assertEqual(rows[0]['proteins.external_id'], '|'.join(score.proteins.order_by('id').values_list('external_id', flat=True)))
+
+
+    def test_export_format(self):
+        response = self.client.get('/rest/export/score?output=xml')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get('/rest/export/metric').status_code, 404)
+
+
+    def test_batch(self):
+        score_ids = list(Score.objects.values_list('id', flat=True))
+        missing_ids = [f'OPGS{x:06d}' for x in range(900001, 902500)]
+        ids = score_ids + missing_ids
+        random.Random(42).shuffle(ids)
+        # Duplicated and lower case IDs
+        ids = ids + [ids[0], ids[1].lower()]
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            response = self.client.post(self.batch_url, { 'filter_ids': ids }, content_type='application/json')
+            content = json.loads(self.get_content(response))
+        self.assertEqual([x['id'] for x in content['results']], [x for x in ids[:-2] if x in score_ids])
+        self.assertEqual(content['size'], len(score_ids))
+        self.assertEqual(content['not_found'], [x for x in ids[:-2] if x in missing_ids])
+        # One Score query per chunk of 1000 IDs
+        score_queries = [x for x in counter.queries if x.startswith('SELECT "omicspred_score"."num"')]
+        self.assertEqual(len(score_queries), 3)
+        self.assertEqual(max(x.count('%s') for x in score_queries), ScoreBatch.chunk_size)
+
+
+    def test_batch_limit(self):
+        ids = [f'OPGS{x:06d}' for x in range(1, 50001)]
+        response = self.client.post(self.batch_url, { 'filter_ids': ids }, content_type='application/json')
+        self.assertEqual(json.loads(self.get_content(response))['size'], Score.objects.count())
+        response = self.client.post(self.batch_url, { 'filter_ids': ids+['OPGS050001'] }, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        for filter_ids in ('OPGS000001', [1, 2]):
+            response = self.client.post(self.batch_url, { 'filter_ids': filter_ids }, content_type='application/json')
+            self.assertEqual(response.status_code, 400)
+
+
+    def test_any_lookup(self):
+        ids = ['OPGS000001', 'OPGS000002', 'OPGS000003']
+        queryset = Score.objects.filter(id__any=ids)
+        self.assertEqual(sorted(queryset.values_list('id', flat=True)), ids)
+        sql, params = queryset.query.sql_with_params()
+        self.assertIn('"omicspred_score"."id" IN (%s, %s, %s)', sql)
+        self.assertEqual(list(params), ids)
+        self.assertEqual(list(Score.objects.filter(id__any=[])), [])
+        # PostgreSQL: the list of values is sent as a single array parameter
+        with mock.patch.object(connection, 'vendor', 'postgresql'):
+            sql, params = queryset.query.sql_with_params()
+        self.assertIn('"omicspred_score"."id" = ANY(%s)', sql)
+        self.assertEqual(list(params), [ids])
+
+
+class SearchByEntityTest(TestCase):
+    """ Case insensitive search of the Scores by omics entity name or external ID (UPPER() indexes) """
+
+    @classmethod
+    def setUpTestData(cls):
+        SyntheticDataGenerator(scores_per_platform=5).generate()
+
+
+    def test_search_by_entity(self):
+        for entity_type, model in { 'gene': Gene, 'protein': Protein, 'metabolite': Metabolite }.items():
+            related_name = f'{entity_type}_score'
+            entity = model.objects.filter(**{ f'{related_name}__isnull': False }).exclude(name=None).exclude(external_id=None).order_by('id').first()
+            expected_ids = sorted(getattr(entity, related_name).values_list('id', flat=True))
+            self.assertTrue(expected_ids)
+            for value in (entity.name, entity.name.lower(), entity.name.swapcase(), entity.external_id.lower()):
+                with self.subTest(entity_type=entity_type, value=value):
+                    counter = QueryCounter()
+                    with connection.execute_wrapper(counter):
+                        results = self.client.get(f'/rest/score/searchby{entity_type}/{value}').json()['results']
+                    self.assertEqual(sorted(x['id'] for x in results), expected_ids)
+                    self.assertTrue(any(f'UPPER("omicspred_{entity_type}"."name")' in x for x in counter.queries))
+            self.assertEqual(self.client.get(f'/rest/score/searchby{entity_type}/{entity.name}X').json()['results'], [])
@@ -7,26 +7,31 @@ from rest_framework.serializers import ValidationError
 from django.db.models import Prefetch, Q
 from omicspred.models import *
 from .serializers import *
+from .tables import build_metabolite_table, build_protein_table, build_transcript_table, build_plot_table
+from .snapshots import table_snapshots, snapshot_response
+from .cache import get_cache_stats, get_generation
+from .export import CatalogueExport, ScoreBatch, export_formats
+from .entity_index import entity_score_index
+from .query_plans import QueryPlanMixin
+from .profiling import profile_phase
 
 
 generic_defer = ['curation_notes']
 only_dict = {
-    'scores_table': ['id','platform_id','variants_number','platform__id','platform__name'],
+    'scores_matrix': ['id','platform_id','variants_number','platform__id','platform__name','metric_matrix__score_id','metric_matrix__metrics'],
     'metabolite': ['id','name','external_id','pathway_group_id','pathway_subgroup_id','pathway_group__id','pathway_group__name','pathway_subgroup__id','pathway_subgroup__name']
 }
 
-performance_metric = [Prefetch('performance_metric', queryset=Metric.objects.only('id','performance_id','name_short','estimate').all())]
 related_dict = {
     'metabolites': [Prefetch('metabolites', queryset=Metabolite.objects.only(*only_dict['metabolite']).select_related('pathway_group','pathway_subgroup').all().order_by('id'))],
     'proteins': [Prefetch('proteins', queryset=Protein.objects.only('id','name','external_id').all().order_by('id'))],
     'genes': [Prefetch('genes', queryset=Gene.objects.only('id','name','external_id').all().order_by('id'))],
     'genes_sources': [Prefetch('genes', queryset=Gene.objects.only('id','name','external_id','external_id_source').all().order_by('id'))],
-    'performances': [Prefetch('score_performance', queryset=Performance.objects.defer('publication','efo').select_related('sample').all().prefetch_related('sample__cohorts','performance_metric').order_by('id'))],
-    'performance_cohorts': [Prefetch('score_performance', queryset=Performance.objects.only('id','score_id','cohort_label').all().prefetch_related(*performance_metric).order_by('id'))],
+    # Performances of the Scores without ScoreMetricMatrix only (fallback of Score.performance_data)
+    'performances_fallback': [Prefetch('score_performance', queryset=Performance.objects.only('id','score_id','cohort_label').filter(score__metric_matrix__isnull=True).prefetch_related('performance_metric').order_by('id'))],
     'perf_select': ['score', 'publication', 'platform', 'efo'],
     'publication_defer': [*generic_defer,'curation_status']
 }
-missing_index = 0
 
 def custom_exception_handler(exc, context):
     # Call REST framework's default exception handler first,
@@ -82,6 +87,17 @@ def get_ids_list(object):
     return ids_list
 
 
+def search_scores_by_entity(model, field_name, value):
+    '''
+    Search the Scores associated with an omics entity (name or external ID).
+    The entity IDs are resolved first, then the Scores are selected through the many-to-many table.
+    '''
+    entity_ids = model.search_ids(value)
+    through = Score._meta.get_field(field_name).remote_field.through
+    score_ids = through.objects.filter(**{ f'{model._meta.model_name}_id__in': entity_ids }).values('score_id')
+    return Score.objects.select_related('publication','platform').filter(num__in=score_ids).order_by('num')
+
+
 ## Cohorts ##
 
 class RestListCohorts(generics.ListAPIView):
@@ -104,19 +120,22 @@ class RestListCohorts(generics.ListAPIView):
 
 ## Performance metrics ##
 
-class RestListPerformances(generics.ListAPIView):
+class RestListPerformances(QueryPlanMixin, generics.ListAPIView):
     """
     Retrieve the PGS Performance Metrics
     """
     queryset = Performance.objects.all().order_by('id')
     serializer_class = PerformanceSerializer
+    pagination_cursor_field = 'id'
+    pagination_count_estimate = True
 
 
-class RestPerformanceSearch(generics.ListAPIView):
+class RestPerformanceSearch(QueryPlanMixin, generics.ListAPIView):
     """
     Retrieve the Performance metric(s) using query
     """
     serializer_class = PerformanceSerializer
+    pagination_cursor_field = 'id'
 
 
     def get_queryset(self):
@@ -234,6 +253,8 @@ class RestListScores(generics.ListAPIView):
     Retrieve the Polygenic Scores
     """
     serializer_class = ScoreSerializer
+    pagination_cursor_field = 'num'
+    pagination_count_estimate = True
 
     def get_queryset(self):
         # Fetch all the Scores
@@ -264,6 +285,57 @@ class RestScore(generics.RetrieveAPIView):
         return Response(serializer.data)
 
 
+class RestScoreBatch(APIView):
+    """
+    Retrieve a large list of Polygenic Scores, with a POST request (JSON object with the list of IDs in "filter_ids")
+    """
+    max_ids = 50000
+
+    def post(self, request):
+        ids_list = request.data.get('filter_ids') if hasattr(request.data, 'get') else None
+        if not isinstance(ids_list, list) or not all(isinstance(x, str) for x in ids_list):
+            raise ValidationError({'filter_ids': 'The parameter \'filter_ids\' should be a list of OmicsPred IDs'})
+        if len(ids_list) > self.max_ids:
+            raise ValidationError({'filter_ids': f'The parameter \'filter_ids\' should contain less than or equal to {self.max_ids} IDs'})
+        return ScoreBatch(get_ids_list(self)).get_response()
+
+
+class RestScoreMapping(APIView):
+    """
+    Map a list of gene/protein/metabolite names or external IDs to the associated Polygenic Score IDs.
+    The list is provided in the URL parameter "queries" (comma separated) or in a JSON object (POST request), with an optional "type".
+    """
+    max_queries = 50000
+
+    def get_queries(self, request):
+        queries = request.query_params.get('queries')
+        if queries:
+            return [x for x in queries.split(',') if x]
+        queries = request.data.get('queries') if hasattr(request.data, 'get') else None
+        if not isinstance(queries, list) or not all(isinstance(x, str) for x in queries):
+            raise ValidationError({'queries': 'The parameter \'queries\' should be a list of omics entity names or IDs'})
+        return queries
+
+    def get_type(self, request):
+        entity_type = request.query_params.get('type')
+        if not entity_type and hasattr(request.data, 'get'):
+            entity_type = request.data.get('type')
+        if entity_type:
+            entity_type = str(entity_type).lower()
+            if entity_type not in entity_score_index.entity_types:
+                raise ValidationError({'type': f'The parameter \'type\' should be one of: {", ".join(entity_score_index.entity_types.keys())}'})
+        return entity_type
+
+    def get(self, request):
+        return self.post(request)
+
+    def post(self, request):
+        queries = self.get_queries(request)
+        if len(queries) > self.max_queries:
+            raise ValidationError({'queries': f'The parameter \'queries\' should contain less than or equal to {self.max_queries} values'})
+        return Response(entity_score_index.search(queries, self.get_type(request)))
+
+
 class RestScoreSearchByGene(generics.ListAPIView):
     """
     Search the Polygenic Score(s) using gene name/id
@@ -274,7 +346,7 @@ class RestScoreSearchByGene(generics.ListAPIView):
         try:
             gene = self.kwargs['gene']
             # Database filtering
-            queryset = Score.objects.select_related('publication','platform').filter(Q(genes__name__iexact=gene) | Q(genes__external_id__iexact=gene)).prefetch_related('genes').order_by('num')
+            queryset = search_scores_by_entity(Gene, 'genes', gene).prefetch_related('genes')
         except Score.DoesNotExist:
             queryset = []
         return queryset
@@ -290,7 +362,7 @@ class RestScoreSearchByProtein(generics.ListAPIView):
         try:
             protein = self.kwargs['protein']
             # Database filtering
-            queryset = Score.objects.select_related('publication','platform').filter(Q(proteins__name__iexact=protein) | Q(proteins__external_id__iexact=protein)).prefetch_related('proteins').order_by('num')
+            queryset = search_scores_by_entity(Protein, 'proteins', protein).prefetch_related('proteins')
         except Score.DoesNotExist:
             queryset = []
         return queryset
@@ -306,8 +378,7 @@ class RestScoreSearchByMetabolite(generics.ListAPIView):
         try:
             metabolite = self.kwargs['metabolite']
             # Database filtering
-            queryset = Score.objects.select_related('publication','platform').filter(Q(metabolites__name__iexact=metabolite) | Q(metabolites__external_id__iexact=metabolite)).prefetch_related('metabolites').order_by('num')
-            print(queryset.query)
+            queryset = search_scores_by_entity(Metabolite, 'metabolites', metabolite).prefetch_related('metabolites')
         except Score.DoesNotExist:
             queryset = []
         return queryset
@@ -318,6 +389,7 @@ class RestScoreSearch(generics.ListAPIView):
     Search the Polygenic Score(s) using query
     """
     serializer_class = ScoreSerializer
+    pagination_cursor_field = 'num'
 
     def get_queryset(self):
         queryset = Score.objects.select_related('publication','platform').all().order_by('num')
@@ -373,314 +445,34 @@ class RestTableSearch(generics.ListAPIView):
 class RestMetaboliteTableSearch(generics.RetrieveAPIView):
 
     def get(self,request):
-        #queryset = Score.objects.select_related('platform').all().prefetch_related('metabolites').order_by('num')
-        queryset = Score.objects.only(*only_dict['scores_table']).select_related('platform').all().prefetch_related(*related_dict['performances'],*related_dict['metabolites']).order_by('num')
-
-        # Search by platform
         platform = self.request.query_params.get('platform')
-        if platform and platform is not None:
-            queryset = queryset.filter(platform__name__iexact=platform)
-        else:
-            queryset = []
-
-        data = []
-        score_col = { "name": "OMICSPRED ID", "data": {} }
-
-        if platform == 'Metabolon':
-            metabolon_col = { "name": "Metabolon ID", "data": {} }
-        else:
-            metabolon_col = None
-
-        metabo_col = { "name": "Biochemical Name", "data": {} }
-        pathway_grp_col = { "name": "Pathway Group", "data": {} }
-        pathway_subgrp_col = { "name": "Pathway Subgroup", "data": {} }
-        variants_nb_col = { "name": "#SNP", "data": {} }
-        cohort_cols = {}
-        cohort_cols_names = []
-
-        idx = 0
-        for score in queryset:
-            # OMICPRED ID
-            score_col["data"][idx] = score.id
-
-            # Metabolite Information
-            metabolite = score.metabolites.all()[0]
-            # - Metabolon ID
-            if metabolon_col:
-                metabolon_col["data"][idx] = metabolite.external_id
-            # - Biochemical Name
-            metabo_col["data"][idx] = metabolite.name
-            # - Pathway Group
-            pathway_group = None
-            if metabolite.pathway_group:
-                pathway_group = metabolite.pathway_group.name
-            pathway_grp_col["data"][idx] = pathway_group
-            # - Pathway Subgroup
-            pathway_subgroup = None
-            if metabolite.pathway_subgroup:
-                pathway_subgroup = metabolite.pathway_subgroup.name
-            pathway_subgrp_col["data"][idx] = pathway_subgroup
-
-            # #SNP
-            variants_nb_col["data"][idx] = score.variants_number
-
-            for perf in score.score_performance.all():
-                cohort_name = perf.sample.cohorts.all()[0].name_short
-                for metric in perf.performance_metrics:
-                    metric_name = metric['name_short']
-                    if 'estimate' in metric.keys():
-                        estimate = metric['estimate']
-                    else:
-                        estimate = ''
-
-                    colname = f'{cohort_name}_{metric_name}'
-                    collabel = f'{cohort_name} {metric_name}'
-                    # Cohort estimate
-                    if colname not in cohort_cols_names:
-                        cohort_cols[colname] = { "name": collabel, "data": {} }
-                        cohort_cols_names.append(colname)
-                    cohort_cols[colname]["data"][idx] = estimate
-                    # Cohort pvalue
-                    # if 'pvalue' in metric.keys():
-                    #     pvalue = metric['pvalue']
-                    # else:
-                    #     pvalue = ''
-                    # pval_colname = f'{colname}_pvalue'
-                    # pval_collabel = f'{colname} (p-value)'
-                    # if pval_colname not in cohort_cols_names:
-                    #     cohort_cols[pval_colname] = { "name": pval_collabel, "data": {} }
-                    #     cohort_cols_names.append(pval_colname)
-                    # cohort_cols[pval_colname]["data"][idx] = pvalue
-            for col in cohort_cols.keys():
-                if idx not in cohort_cols[col]["data"].keys():
-                    cohort_cols[col]["data"][idx] = ''
-                if idx != 0:
-                    if missing_index not in cohort_cols[col]["data"].keys():
-                        cohort_cols[col]["data"][missing_index] = ''
-            idx += 1
-
-        data.append(score_col)
-        if metabolon_col:
-            data.append(metabolon_col)
-        data.append(metabo_col)
-        data.append(pathway_grp_col)
-        data.append(pathway_subgrp_col)
-        data.append(variants_nb_col)
-
-        for colname in cohort_cols_names:
-            data.append(cohort_cols[colname])
-
-        return Response(data)
+        # Serve the precomputed table, when available
+        snapshot = table_snapshots.read('metabolite', platform)
+        if snapshot:
+            return snapshot_response(request, snapshot)
+        return Response(build_metabolite_table(platform))
 
 
 class RestProteinTableSearch(generics.RetrieveAPIView):
-    def get(self,request):
-        queryset = Score.objects.only(*only_dict['scores_table']).select_related('platform').all().prefetch_related(*related_dict['performances'],*related_dict['genes'],*related_dict['proteins']).order_by('num')
 
-        # Search by platform
+    def get(self,request):
         platform = self.request.query_params.get('platform')
-        if platform and platform is not None:
-            queryset = queryset.filter(platform__name__iexact=platform)
-        else:
-            queryset = []
-
-        data = []
-        score_col = { "name": "OMICSPRED ID", "data": {} }
-
-        if platform == 'Somalogic':
-            somascan_col = { "name": "SOMAscan ID", "data": {} }
-        else:
-            somascan_col = None
-
-        uniprot_col = { "name": "UniProt ID", "data": {} }
-        gene_col = { "name": "Gene", "data": {} }
-        protein_col = { "name": "Protein", "data": {} }
-        variants_nb_col = { "name": "#SNP", "data": {} }
-        cohort_cols = {}
-        cohort_cols_names = []
-
-        idx = 0
-        for score in queryset:
-            # idx = f'"{idx}"'
-            # OMICPRED ID
-            score_col["data"][idx] = score.id
-            # SOMAscan ID
-            if somascan_col:
-                somascan_col["data"][idx] = score.name
-
-            # Protein Information
-            # Sorting later instead of using the queryset method "order_by" to avoid generating more SQL queries
-            proteins = [x for x in score.proteins.all()]
-            # - UniProt ID(s)
-            uniprot_ids = set()
-            for protein_id in sorted([x.external_id for x in proteins]):
-                if protein_id:
-                    uniprot_ids.add(protein_id)
-            uniprot_col["data"][idx] = ';'.join(uniprot_ids)
-            # - Protein name(s)
-            protein_names = set()
-            for protein_name in sorted([x.name for x in proteins]):
-                if protein_name:
-                    protein_names.add(protein_name)
-            protein_col["data"][idx] = ';'.join(protein_names)
-
-            # Gene informatiom
-            gene_names = set()
-            # Sorting later instead of using the queryset method "order_by" to avoid generating more SQL queries
-            for gene_name in sorted([x.name for x in score.genes.all()]):
-                if gene_name:
-                    gene_names.add(gene_name)
-            gene_col["data"][idx] = ';'.join(gene_names)
-
-            # #SNP
-            variants_nb_col["data"][idx] = score.variants_number
-
-            for perf in score.score_performance.all():
-                cohort_name = perf.sample.cohorts.all()[0].name_short
-                for metric in perf.performance_metrics:
-                    metric_name = metric['name_short']
-                    if 'estimate' in metric.keys():
-                        estimate = metric['estimate']
-                    else:
-                        estimate = ''
-
-                    colname = f'{cohort_name}_{metric_name}'
-                    collabel = f'{cohort_name} {metric_name}'
-                    # Cohort estimate
-                    if colname not in cohort_cols_names:
-                        cohort_cols[colname] = { "name": collabel, "data": {} }
-                        cohort_cols_names.append(colname)
-                    cohort_cols[colname]["data"][idx] = estimate
-            #         # Cohort pvalue
-            #         # if 'pvalue' in metric.keys():
-            #         #     pvalue = metric['pvalue']
-            #         # else:
-            #         #     pvalue = ''
-            #         # pval_colname = f'{colname}_pvalue'
-            #         # pval_collabel = f'{colname} (p-value)'
-            #         # if pval_colname not in cohort_cols_names:
-            #         #     cohort_cols[pval_colname] = { "name": pval_collabel, "data": {} }
-            #         #     cohort_cols_names.append(pval_colname)
-            #         # cohort_cols[pval_colname]["data"][idx] = pvalue
-            for col in cohort_cols.keys():
-                if idx not in cohort_cols[col]["data"].keys():
-                    cohort_cols[col]["data"][idx] = ''
-                if idx != 0:
-                    if missing_index not in cohort_cols[col]["data"].keys():
-                        cohort_cols[col]["data"][missing_index] = ''
-            idx += 1
-
-        data.append(score_col)
-        if somascan_col:
-            data.append(somascan_col)
-        data.append(uniprot_col)
-        data.append(gene_col)
-        data.append(protein_col)
-        data.append(variants_nb_col)
-
-        for colname in cohort_cols_names:
-            data.append(cohort_cols[colname])
-
-        return Response(data)
+        # Serve the precomputed table, when available
+        snapshot = table_snapshots.read('protein', platform)
+        if snapshot:
+            return snapshot_response(request, snapshot)
+        return Response(build_protein_table(platform))
 
 
 class RestTranscriptTableSearch(generics.RetrieveAPIView):
 
     def get(self,request):
-        # queryset = Score.objects.select_related('platform').all().prefetch_related('genes').order_by('num')
-        queryset = Score.objects.only(*only_dict['scores_table']).select_related('platform').all().prefetch_related(*related_dict['performances'],*related_dict['genes_sources']).order_by('num') # transcripts
-
-        # Search by platform
         platform = self.request.query_params.get('platform')
-        if platform and platform is not None:
-            queryset = queryset.filter(platform__name__iexact=platform)
-        else:
-            queryset = []
-
-        data = []
-        score_col = { "name": "OMICSPRED ID", "data": {} }
-
-        ensembl_col = { "name": "Ensembl ID", "data": {} }
-        gene_col = { "name": "Gene", "data": {} }
-        # transcript_col = { "name": "Transcript", "data": {} }
-        variants_nb_col = { "name": "#SNP", "data": {} }
-        cohort_cols = {}
-        cohort_cols_names = []
-
-        idx = 0
-        for score in queryset:
-            # idx = f"{idx}"
-            # OMICPRED ID
-            score_col["data"][idx] = score.id
-
-            # Gene informatiom
-            ensembl_ids = set()
-            gene_names = set()
-            # Sorting later instead of using the queryset method "order_by" to avoid generating more SQL queries
-            genes = score.genes.all()
-            for gene in sorted(genes, key=lambda x: x.name):
-                if gene.external_id and gene.external_id_source == 'Ensembl':
-                        ensembl_ids.add(gene.external_id)
-                if gene.name:
-                    gene_names.add(gene.name)
-            ensembl_col["data"][idx] = ';'.join(ensembl_ids)
-            gene_col["data"][idx] = ';'.join(gene_names)
-
-            # # Transcript informatiom
-            # transcript_names = set()
-            # for transcript in score.transcripts.all().order_by('name'):
-            #     if transcript.name:
-            #         transcript_names.add(transcript.name)
-            # transcript_col["data"][idx] = ';'.join(transcript_names)
-            # #SNP
-            variants_nb_col["data"][idx] = score.variants_number
-
-            for perf in score.score_performance.all():
-                cohort_name = perf.sample.cohorts.all()[0].name_short
-                for metric in perf.performance_metrics:
-                    metric_name = metric['name_short']
-                    if 'estimate' in metric.keys():
-                        estimate = metric['estimate']
-                    else:
-                        estimate = ''
-
-                    colname = f'{cohort_name}_{metric_name}'
-                    collabel = f'{cohort_name} {metric_name}'
-                    # Cohort estimate
-                    if colname not in cohort_cols_names:
-                        cohort_cols[colname] = { "name": collabel, "data": {} }
-                        cohort_cols_names.append(colname)
-                    cohort_cols[colname]["data"][idx] = estimate
-
-                    # Cohort pvalue
-                    # if 'pvalue' in metric.keys():
-                    #     pvalue = metric['pvalue']
-                    # else:
-                    #     pvalue = ''
-                    # pval_colname = f'{colname}_pvalue'
-                    # pval_collabel = f'{colname} (p-value)'
-                    # if pval_colname not in cohort_cols_names:
-                    #     cohort_cols[pval_colname] = { "name": pval_collabel, "data": {} }
-                    #     cohort_cols_names.append(pval_colname)
-                    # cohort_cols[pval_colname]["data"][idx] = pvalue
-
-            for col in cohort_cols.keys():
-                if idx not in cohort_cols[col]["data"].keys():
-                    cohort_cols[col]["data"][idx] = ''
-                if idx != 0:
-                    if missing_index not in cohort_cols[col]["data"].keys():
-                        cohort_cols[col]["data"][missing_index] = ''
-            idx += 1
-
-        data.append(score_col)
-        data.append(ensembl_col)
-        data.append(gene_col)
-        data.append(variants_nb_col)
-
-        for colname in cohort_cols_names:
-            data.append(cohort_cols[colname])
-
-        return Response(data)
+        # Serve the precomputed table, when available
+        snapshot = table_snapshots.read('transcript', platform)
+        if snapshot:
+            return snapshot_response(request, snapshot)
+        return Response(build_transcript_table(platform))
 
 
 ## Plots ##
@@ -688,71 +480,46 @@ class RestTranscriptTableSearch(generics.RetrieveAPIView):
 class RestPlotSearch(generics.RetrieveAPIView):
 
     def get(self,request):
-        # score_performance = [Prefetch('score_performance', queryset=Score.objects.only('num').all())]
-        #queryset = Score.objects.only('num','platform_id','platform__id','platform__name','score_performance').select_related('platform').all().order_by('num')
-        #print(Performance.objects.only('score_id','platform_id','platform__id','platform__name','sample_id','sample__id').select_related('platform','sample').all().order_by('score_id').query)
+        platform = self.request.query_params.get('platform')
+        with profile_phase('pivot'):
+            data = build_plot_table(platform)
+        return Response(data)
 
-        queryset = Performance.objects.only('score_id','platform_id','platform__id','platform__name','sample_id','sample__id').select_related('platform','sample').all().prefetch_related('sample__cohorts').order_by('score_id')
-        # print(Performance.objects.only('score_id','platform_id','platform__id','platform__name','sample_id','sample__cohort').select_related('platform','sample').all().order_by('score_id').query)
-        params = 0
 
-        # Search by platform
-        platform = self.request.query_params.get('platform')
-        if platform and platform is not None:
-            queryset = queryset.filter(platform__name__iexact=platform)
-            params += 1
+## Gene ##
 
-        if params == 0:
-            queryset = []
 
-        data = []
-        cohort_cols = {}
-        cohort_cols_names = []
-
-        score_ids_list = [x.score_id for x in queryset]
-        score_ids = set(score_ids_list)
-        # print(score_ids)
-        score_idx = {}
-        new_score_ids = list(score_ids)
-        for idx, score_id in enumerate(new_score_ids):
-            # print(f'{idx}: {score_id}')
-            score_idx[score_id] = idx
-        # print(score_idx)
-        # for score in queryset:
-        for perf in queryset:
-            perf_score_id = perf.score_id
-            idx = score_idx[perf_score_id]
-            #print(score.score_performance.all().query)
-        # for perf in score.score_performance.all():
-            cohort_name = perf.sample.cohorts.all()[0].name_short
-            cohort_name = cohort_name.replace(' ','_')
-            for metric in perf.performance_metrics:
-                metric_name = metric['name_short']
-                if 'estimate' in metric.keys():
-                    estimate = metric['estimate']
-                else:
-                    estimate = None
-                colname = f'{cohort_name}_{metric_name}'
-                # Cohort estimate
-                if colname not in cohort_cols_names:
-                    cohort_cols[colname] = { "name": cohort_name, "title": colname, "type": f'_{metric_name}' ,  "data": {} }
-                    cohort_cols_names.append(colname)
-                cohort_cols[colname]["data"][idx] = estimate
-            for col in cohort_cols.keys():
-                if idx not in cohort_cols[col]["data"].keys():
-                    cohort_cols[col]["data"][idx] = None
-                if idx != 0:
-                    if missing_index not in cohort_cols[col]["data"].keys():
-                        cohort_cols[col]["data"][missing_index] = None
-
-        for colname in cohort_cols_names:
-            data.append(cohort_cols[colname])
 
-        return Response(data)
+## Export ##
 
+class RestExport(APIView):
+    """
+    Stream all the Scores, Performance metrics or Samples, in NDJSON (default) or CSV (URL parameter "output=csv").
+    The Scores and Performance metrics can be filtered by platform (URL parameter "platform").
+    """
 
-## Gene ##
+    def get(self, request, export_type):
+        export_format = request.query_params.get('output', 'ndjson').lower()
+        if export_format not in export_formats:
+            raise ValidationError({'output': f'URL parameter \'output\' should be one of: {", ".join(export_formats.keys())}'})
+        platform = request.query_params.get('platform')
+        return CatalogueExport(export_type, export_format, platform).get_response()
+
+
+## Cache ##
+
+class RestCacheStats(APIView):
+    """
+    Retrieve the hit/miss counters of the cached REST endpoints (approximate counts, see cache.count_cache_request)
+    """
 
+    def get(self, request):
+        from .urls import urlpatterns
+        route_names = [x.name for x in urlpatterns if x.name]
+        return Response({
+            'generation': get_generation(),
+            'routes': get_cache_stats(route_names)
+        })
 
 
 ## Tests ##
@@ -760,7 +527,7 @@ class RestTestMetabolite(generics.ListAPIView):
     serializer_class = ScoreMetaboliteSerializer
 
     def get_queryset(self):
-        queryset = Score.objects.only(*only_dict['scores_table']).select_related('platform').all().prefetch_related(*related_dict['metabolites'],*related_dict['performance_cohorts']).order_by('num')
+        queryset = Score.objects.only(*only_dict['scores_matrix']).select_related('platform','metric_matrix').all().prefetch_related(*related_dict['metabolites'],*related_dict['performances_fallback']).order_by('num')
 
         # Search by platform
         platform = self.request.query_params.get('platform')
@@ -775,7 +542,7 @@ class RestTestProtein(generics.ListAPIView):
     serializer_class = ScoreProteinSerializer
 
     def get_queryset(self):
-        queryset = Score.objects.only(*only_dict['scores_table']).select_related('platform').all().prefetch_related(*related_dict['proteins'],*related_dict['genes'],*related_dict['performance_cohorts']).order_by('num')
+        queryset = Score.objects.only(*only_dict['scores_matrix']).select_related('platform','metric_matrix').all().prefetch_related(*related_dict['proteins'],*related_dict['genes'],*related_dict['performances_fallback']).order_by('num')
 
         # Search by platform
         platform = self.request.query_params.get('platform')
@@ -791,7 +558,7 @@ class RestTestTranscript(generics.ListAPIView):
     serializer_class = ScoreTranscriptSerializer
 
     def get_queryset(self):
-        queryset = Score.objects.only(*only_dict['scores_table']).select_related('platform').all().prefetch_related(*related_dict['genes'],*related_dict['performance_cohorts']).order_by('num')
+        queryset = Score.objects.only(*only_dict['scores_matrix']).select_related('platform','metric_matrix').all().prefetch_related(*related_dict['genes'],*related_dict['performances_fallback']).order_by('num')
 
         # Search by platform
         platform = self.request.query_params.get('platform')